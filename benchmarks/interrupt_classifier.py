@@ -0,0 +1,83 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""Time finding the interrupt type of interrupt payloads, for agents declaring
+dozens of interrupt types.
+
+    PYTHONPATH=src python benchmarks/interrupt_classifier.py [n_types ...]
+
+Compares validating the payload against every interrupt schema in turn with
+the InterruptClassifier built at agent load."""
+
+import sys
+import timeit
+
+import jsonschema
+
+from agent_workflow_server.agents.validators import compile_agent_validators
+from agent_workflow_server.generated.models.agent_acp_spec import AgentACPSpec
+
+
+def make_specs(n_types: int) -> AgentACPSpec:
+    return AgentACPSpec.model_validate(
+        {
+            "capabilities": {},
+            "input": {},
+            "output": {},
+            "config": {},
+            "interrupts": [
+                {
+                    "interrupt_type": f"step_{i}",
+                    "interrupt_payload": {
+                        "type": "object",
+                        "required": ["kind", "question", "options"],
+                        "properties": {
+                            "kind": {"const": f"step_{i}"},
+                            "question": {"type": "string"},
+                            "options": {"type": "array", "items": {"type": "string"}},
+                        },
+                    },
+                    "resume_payload": {"type": "object"},
+                }
+                for i in range(n_types)
+            ],
+        }
+    )
+
+
+def try_every_schema(specs: AgentACPSpec, payload: dict) -> str:
+    """Matching before the classifier"""
+    for interrupt in specs.interrupts:
+        try:
+            jsonschema.validate(instance=payload, schema=interrupt.interrupt_payload)
+            return interrupt.interrupt_type
+        except jsonschema.ValidationError:
+            continue
+    raise ValueError("No interrupt type matches")
+
+
+def main(sizes):
+    print(
+        f"{'types':>6} {'every schema (us)':>18} {'classifier (us)':>16} {'speedup':>8}"
+    )
+    for n_types in sizes:
+        specs = make_specs(n_types)
+        classifier = compile_agent_validators(specs).interrupt_classifier
+        # The last declared type is the worst case of trying every schema
+        payload = {
+            "kind": f"step_{n_types - 1}",
+            "question": "Proceed?",
+            "options": ["yes", "no"],
+        }
+        assert try_every_schema(specs, payload) == classifier.classify(payload)
+
+        number = max(10, 2000 // n_types)
+        before = timeit.timeit(lambda: try_every_schema(specs, payload), number=number)
+        after = timeit.timeit(lambda: classifier.classify(payload), number=number)
+        print(
+            f"{n_types:>6} {before / number * 1e6:>18.1f} {after / number * 1e6:>16.1f} {before / after:>7.0f}x"
+        )
+
+
+if __name__ == "__main__":
+    main([int(n) for n in sys.argv[1:]] or [1, 10, 50, 100])
@@ -0,0 +1,73 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""Time loading many agents at startup, with the test agent and ACP spec.
+
+    PYTHONPATH=src:. python benchmarks/load_agents.py [n_agents]
+
+Compares generating every OpenAPI spec from the ACP spec file, as before,
+with sharing the parsed base spec, with loading the agents concurrently,
+with the specs cached on disk and with the agents loaded on first use."""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+from agent_workflow_server.agents import load, oas_generator
+from tests.mock import MockAdapter
+
+original_get_base_spec = oas_generator._get_base_spec
+
+
+def read_spec_every_time():
+    """Base spec read and validated for every agent, as before"""
+    oas_generator._base_spec = None
+    return original_get_base_spec()
+
+
+def timed_load(agents_ref: str, env: dict, per_agent_base_spec=False) -> float:
+    load.AGENTS.clear()
+    oas_generator._base_spec = None
+    with (
+        mock.patch.dict(os.environ, env),
+        mock.patch.object(
+            oas_generator,
+            "_get_base_spec",
+            read_spec_every_time if per_agent_base_spec else original_get_base_spec,
+        ),
+    ):
+        started = time.perf_counter()
+        load.load_agents(agents_ref, ["tests/mock_manifest.json"])
+        return time.perf_counter() - started
+
+
+def main(n_agents: int):
+    os.environ["ACP_SPEC_PATH"] = "tests/test_openapi.json"
+    load.ADAPTERS = [MockAdapter()]
+    agents_ref = json.dumps(
+        {str(uuid.uuid4()): "tests.mock:mock_agent" for _ in range(n_agents)}
+    )
+    with tempfile.TemporaryDirectory() as cache_dir:
+        serial = {"AGWS_LOAD_CONCURRENCY": "1", "AGWS_OAPI_CACHE_DIR": ""}
+        concurrent = {"AGWS_LOAD_CONCURRENCY": "8", "AGWS_OAPI_CACHE_DIR": ""}
+        cached = {"AGWS_LOAD_CONCURRENCY": "8", "AGWS_OAPI_CACHE_DIR": cache_dir}
+        lazy = {"AGWS_LOAD_CONCURRENCY": "8", "AGWS_AGENTS_LAZY": "True"}
+        timed_load(agents_ref, cached)  # fills the cache
+        results = [
+            ("serial, spec read per agent", timed_load(agents_ref, serial, True)),
+            ("serial, shared base spec", timed_load(agents_ref, serial)),
+            ("concurrent, shared base spec", timed_load(agents_ref, concurrent)),
+            ("concurrent, cached specs", timed_load(agents_ref, cached)),
+            ("lazy", timed_load(agents_ref, lazy)),
+        ]
+    print(f"loading {n_agents} agents")
+    for name, seconds in results:
+        print(f"{name:<32} {seconds:>8.2f} s")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
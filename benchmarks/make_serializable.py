@@ -0,0 +1,96 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""Time make_serializable on agent states of realistic sizes: LangGraph like
+states with a message history, retrieved documents and a few models.
+
+    PYTHONPATH=src python benchmarks/make_serializable.py
+
+Compares the recursive copy used before with the current implementation,
+on states that are already plain JSON and on states holding models."""
+
+import timeit
+import tracemalloc
+from enum import Enum
+from typing import Any
+
+from pydantic import BaseModel, ConfigDict
+
+from agent_workflow_server.utils.tools import make_serializable
+
+
+class Role(Enum):
+    USER = "user"
+    AI = "ai"
+
+
+class ToolCall(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    name: str
+    args: dict
+
+
+def copy_everything(v: Any):
+    """make_serializable before the dispatch table"""
+    if isinstance(v, list):
+        return [copy_everything(vv) for vv in v]
+    elif isinstance(v, dict):
+        return {kk: copy_everything(vv) for kk, vv in v.items()}
+    elif isinstance(v, BaseModel):
+        return v.model_dump(mode="json")
+    elif isinstance(v, Enum):
+        return v.value
+    return v
+
+
+def make_state(n_messages: int, n_documents: int, with_models: bool) -> dict:
+    tool_call = ToolCall(name="search", args={"query": "weather", "limit": 5})
+    messages = [
+        {
+            "id": f"msg-{i}",
+            "role": (Role.AI if i % 2 else Role.USER) if with_models else "user",
+            "content": "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4,
+            "additional_kwargs": {"tool_calls": [tool_call] if with_models else []},
+            "response_metadata": {"tokens": {"input": 120, "output": 48}},
+        }
+        for i in range(n_messages)
+    ]
+    documents = [
+        {
+            "page_content": "Sed do eiusmod tempor incididunt ut labore. " * 20,
+            "metadata": {"source": f"doc-{i}.pdf", "page": i, "score": 0.5},
+        }
+        for i in range(n_documents)
+    ]
+    return {"messages": messages, "documents": documents, "step": 3, "done": False}
+
+
+def measure(fn, state) -> tuple[float, int]:
+    number = 50
+    seconds = timeit.timeit(lambda: fn(state), number=number) / number
+    tracemalloc.start()
+    fn(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak
+
+
+def main():
+    print(
+        f"{'state':<28} {'before (ms)':>12} {'after (ms)':>11} {'before (KiB)':>13} {'after (KiB)':>12}"
+    )
+    for n_messages, n_documents in ((20, 5), (200, 20), (1000, 100)):
+        for with_models in (False, True):
+            state = make_state(n_messages, n_documents, with_models)
+            assert copy_everything(state) == make_serializable(state)
+            before_s, before_mem = measure(copy_everything, state)
+            after_s, after_mem = measure(make_serializable, state)
+            name = f"{n_messages} msgs {n_documents} docs{' +models' if with_models else ''}"
+            print(
+                f"{name:<28} {before_s * 1e3:>12.2f} {after_s * 1e3:>11.2f} {before_mem / 1024:>13.0f} {after_mem / 1024:>12.0f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
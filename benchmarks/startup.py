@@ -0,0 +1,50 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""Measure the import time and the memory of the server application, before
+any agent is loaded, in fresh interpreters.
+
+    PYTHONPATH=src python benchmarks/startup.py [runs]
+
+Also lists the agent frameworks imported by then."""
+
+import json
+import subprocess
+import sys
+
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import agent_workflow_server.main
+elapsed = time.perf_counter() - started
+print(json.dumps({
+    "import_s": elapsed,
+    "max_rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    "frameworks": sorted(
+        m for m in ("langgraph", "langchain_core", "llama_index") if m in sys.modules
+    ),
+}))
+"""
+
+
+def main(runs: int):
+    results = [
+        json.loads(
+            subprocess.run(
+                [sys.executable, "-c", PROBE],
+                capture_output=True,
+                check=True,
+                text=True,
+            ).stdout.splitlines()[-1]
+        )
+        for _ in range(runs)
+    ]
+    import_s = sorted(r["import_s"] for r in results)[runs // 2]
+    max_rss = sorted(r["max_rss_mib"] for r in results)[runs // 2]
+    print(f"import: {import_s * 1e3:.0f} ms (median of {runs})")
+    print(f"max RSS: {max_rss:.1f} MiB")
+    print(f"frameworks imported: {', '.join(results[0]['frameworks']) or 'none'}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
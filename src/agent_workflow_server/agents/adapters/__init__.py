@@ -1,3 +1,12 @@
 # Copyright AGNTCY Contributors (https://github.com/agntcy)
 # SPDX-License-Identifier: Apache-2.0
 
+from typing import Dict
+
+# Adapters of this package, by framework_type of the manifest deployment
+# framework_config, as "module:class". Their modules import the framework,
+# so they are only imported when an agent needs them (see agents/load.py).
+ADAPTER_REGISTRY: Dict[str, str] = {
+    "langgraph": "agent_workflow_server.agents.adapters.langgraph:LangGraphAdapter",
+    "llamaindex": "agent_workflow_server.agents.adapters.llamaindex:LlamaIndexAdapter",
+}
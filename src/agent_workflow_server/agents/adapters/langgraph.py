@@ -4,6 +4,7 @@
 from typing import Optional
 
 from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.postgres import PostgresSaver
 from langgraph.constants import INTERRUPT
 from langgraph.graph.graph import CompiledGraph, Graph
@@ -20,6 +21,7 @@ from agent_workflow_server.generated.manifest.models.agent_deployment import (
 )
 from agent_workflow_server.services.message import Message
 from agent_workflow_server.services.thread_state import ThreadState
+from agent_workflow_server.services.tracing import StepSpans
 from agent_workflow_server.storage.models import Run
 
 
@@ -66,15 +68,19 @@ class LangGraphAgent(BaseAgent):
         if "interrupt" in run and "user_data" in run["interrupt"]:
             input = Command(resume=run["interrupt"]["user_data"])
 
+        steps = StepSpans("langgraph.node")
         async for event in self.agent.astream(
             input=input,
             config=RunnableConfig(
                 configurable=configurable,
                 tags=config["tags"],
                 recursion_limit=config["recursion_limit"],
+                # Recorded in the checkpoint metadata, used by rollback
+                metadata={"run_id": run["run_id"]},
             ),
         ):
             for k, v in event.items():
+                steps.step(k)
                 if k == INTERRUPT:
                     yield Message(
                         type="interrupt",
@@ -153,3 +159,28 @@ class LangGraphAgent(BaseAgent):
                 ) from e
             else:
                 raise e
+
+    def has_volatile_state(self) -> bool:
+        # Like the threads, only the Postgres checkpoints are considered persistent
+        return isinstance(self.agent.checkpointer, BaseCheckpointSaver) and (
+            not isinstance(self.agent.checkpointer, PostgresSaver)
+        )
+
+    async def rollback(self, run):
+        """Moves the thread back to its last checkpoint before the run, or deletes
+        the thread if the run created it."""
+        if not self.agent.checkpointer:
+            return
+        config = RunnableConfig(configurable={"thread_id": run["thread_id"]}, tags=None)
+
+        before = None
+        async for item in self.agent.aget_state_history(config=config):
+            if (item.metadata or {}).get("run_id") != run["run_id"]:
+                before = item
+                break
+
+        if before is None:
+            await self.agent.checkpointer.adelete_thread(run["thread_id"])
+        else:
+            # Fork the thread from the checkpoint: it becomes the latest one
+            await self.agent.aupdate_state(config=before.config, values=None)
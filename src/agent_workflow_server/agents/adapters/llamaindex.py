@@ -19,6 +19,7 @@ from agent_workflow_server.generated.manifest.models.agent_deployment import (
 )
 from agent_workflow_server.services.message import Message
 from agent_workflow_server.services.thread_state import ThreadState
+from agent_workflow_server.services.tracing import StepSpans
 from agent_workflow_server.storage.models import Run
 from agent_workflow_server.utils.tools import load_from_module
 
@@ -113,7 +114,9 @@ class LlamaIndexAgent(BaseAgent):
             event = self.interrupts_dict[interrupt_name].resume_event
             handler.ctx.send_event(event.model_validate(user_data))
 
+        steps = StepSpans("llamaindex.step")
         async for event in handler.stream_events():
+            steps.step(type(event).__name__)
             if checkpoints is None:
                 checkpoints = []
 
@@ -146,6 +149,9 @@ class LlamaIndexAgent(BaseAgent):
             data=final_result,
         )
 
+    def has_volatile_state(self) -> bool:
+        return bool(self.checkpoints)
+
     async def get_agent_state(self, thread_id):
         checkpoints = self.checkpoints.get(thread_id)
         # If there are no checkpoints, return None
@@ -44,6 +44,16 @@ class BaseAgent(ABC):
         """Updates the thread state associated with the agent."""
         pass
 
+    async def rollback(self, run: Run) -> None:
+        """Deletes the state (e.g. checkpoints) written by the run. Called when a run
+        is cancelled with the rollback action. Agents without state do nothing."""
+        pass
+
+    def has_volatile_state(self) -> bool:
+        """Whether the agent keeps thread state (e.g. checkpoints) in memory only.
+        It would be lost if the agent was unloaded, see agents/lazy.py."""
+        return False
+
 
 class BaseAdapter(ABC):
     @abstractmethod
@@ -0,0 +1,197 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import logging
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+)
+
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.thread_state import ThreadState
+from agent_workflow_server.storage.models import Run
+from agent_workflow_server.storage.storage import DB
+
+from .base import BaseAgent
+
+logger = logging.getLogger(__name__)
+
+
+class LazyLoadingPolicy(NamedTuple):
+    # Import the agents on first use rather than at startup
+    enabled: bool
+    # Seconds after their last use the agents are unloaded, None to keep them
+    idle_ttl: Optional[float]
+
+    @property
+    def interval(self) -> float:
+        """Seconds between two checks for idle agents"""
+        return max(1.0, self.idle_ttl / 4)
+
+
+def load_lazy_loading_policy() -> LazyLoadingPolicy:
+    """Read the lazy loading policy from the environment"""
+    idle_ttl = os.getenv("AGWS_AGENTS_IDLE_TTL")
+    if idle_ttl and float(idle_ttl) <= 0:
+        raise ValueError(
+            f"Invalid AGWS_AGENTS_IDLE_TTL {idle_ttl}. Must be a number of seconds."
+        )
+    return LazyLoadingPolicy(
+        enabled=os.getenv("AGWS_AGENTS_LAZY", "False").lower() in ("true", "1"),
+        idle_ttl=float(idle_ttl) if idle_ttl else None,
+    )
+
+
+class LazyAgent(BaseAgent):
+    """Agent whose module is imported and loaded by its adapter on first use,
+    then unloaded by unload_idle_agents once not used for a while. Agents
+    holding state in memory, or with interrupted runs, are never unloaded.
+
+    `load` returns the loaded agent, `unload` is called once it is dropped
+    (e.g. to remove its module from sys.modules)."""
+
+    def __init__(
+        self,
+        agent_id: str,
+        load: Callable[[], BaseAgent],
+        unload: Optional[Callable[[], None]] = None,
+    ):
+        self.agent_id = agent_id
+        self._load = load
+        self._unload = unload
+        self._agent: Optional[BaseAgent] = None
+        # Calls in progress, the agent is not unloaded while > 0
+        self._in_use = 0
+        self._last_used = time.monotonic()
+        # Held while loading or unloading, loading runs in a thread
+        self._lock = threading.Lock()
+        self.loads = 0
+        self.unloads = 0
+
+    @property
+    def loaded(self) -> bool:
+        return self._agent is not None
+
+    def _materialize(self) -> BaseAgent:
+        with self._lock:
+            if self._agent is None:
+                started = time.perf_counter()
+                self._agent = self._load()
+                self.loads += 1
+                logger.info(
+                    f"Loaded agent '{self.agent_id}' on first use in {time.perf_counter() - started:.2f}s"
+                )
+            return self._agent
+
+    @asynccontextmanager
+    async def _use(self) -> AsyncIterator[BaseAgent]:
+        self._in_use += 1
+        try:
+            agent = self._agent
+            if agent is None:
+                # Importing the agent module may take seconds
+                agent = await asyncio.to_thread(self._materialize)
+            yield agent
+        finally:
+            self._in_use -= 1
+            self._last_used = time.monotonic()
+
+    def unload_if_idle(self, idle_ttl: float, now: Optional[float] = None) -> bool:
+        """Drop the agent if not used for idle_ttl seconds. True if unloaded."""
+        now = time.monotonic() if now is None else now
+        if self._agent is None or self._in_use > 0:
+            return False
+        # Called on the event loop: never wait for a load in progress, the
+        # agent is about to be used anyway
+        if not self._lock.acquire(blocking=False):
+            return False
+        try:
+            if (
+                self._agent is None
+                or self._in_use > 0
+                or now - self._last_used < idle_ttl
+            ):
+                return False
+            if self._agent.has_volatile_state() or DB.search_run(
+                {"agent_id": self.agent_id, "status": "interrupted"}
+            ):
+                # Resuming the runs and reading the threads need the agent state
+                return False
+            self._agent = None
+            self.unloads += 1
+            if self._unload is not None:
+                self._unload()
+        finally:
+            self._lock.release()
+        logger.info(f"Unloaded agent '{self.agent_id}', idle for {idle_ttl}s")
+        return True
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.loaded,
+            "in_use": self._in_use,
+            "idle_s": None
+            if self._in_use
+            else round(time.monotonic() - self._last_used, 3),
+            "loads": self.loads,
+            "unloads": self.unloads,
+        }
+
+    async def astream(self, run: Run) -> AsyncGenerator[Message, None]:
+        async with self._use() as agent:
+            async for message in agent.astream(run):
+                yield message
+
+    async def get_agent_state(self, thread_id: str) -> Optional[ThreadState]:
+        async with self._use() as agent:
+            return await agent.get_agent_state(thread_id)
+
+    async def get_history(
+        self, thread_id: str, limit: int, before: int
+    ) -> List[ThreadState]:
+        async with self._use() as agent:
+            return await agent.get_history(thread_id, limit, before)
+
+    async def update_agent_state(
+        self, thread_id: str, state: ThreadState
+    ) -> Optional[ThreadState]:
+        async with self._use() as agent:
+            return await agent.update_agent_state(thread_id, state)
+
+    async def rollback(self, run: Run) -> None:
+        async with self._use() as agent:
+            await agent.rollback(run)
+
+
+def unload_idle_agents(agents: Iterable[BaseAgent], idle_ttl: float) -> int:
+    """Unload the lazy agents not used for idle_ttl seconds, returns how many"""
+    now = time.monotonic()
+    return sum(
+        agent.unload_if_idle(idle_ttl, now)
+        for agent in agents
+        if isinstance(agent, LazyAgent)
+    )
+
+
+async def start_agent_unloader(
+    agents: Callable[[], Iterable[BaseAgent]], policy: LazyLoadingPolicy
+):
+    logger.info(f"Starting idle agent unloader (idle ttl: {policy.idle_ttl}s)")
+    while True:
+        await asyncio.sleep(policy.interval)
+        try:
+            unload_idle_agents(agents(), policy.idle_ttl)
+        except Exception as e:
+            logger.exception(f"Unloading idle agents failed: {e}")
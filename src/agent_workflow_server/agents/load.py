@@ -5,10 +5,23 @@ import importlib.util
 import json
 import logging
 import os
-import pkgutil
-from typing import Any, Dict, Hashable, List, Mapping, NamedTuple, Optional
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import (
+    Any,
+    Dict,
+    Hashable,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
 
-import agent_workflow_server.agents.adapters
+from agent_workflow_server.agents.adapters import ADAPTER_REGISTRY
 from agent_workflow_server.agents.oas_generator import generate_agent_oapi
 from agent_workflow_server.generated.manifest.models.agent_deployment import (
     AgentDeployment,
@@ -27,9 +40,16 @@ from agent_workflow_server.generated.models.agent_search_request import (
 from agent_workflow_server.storage.storage import DB
 
 from .base import BaseAdapter, BaseAgent
+from .lazy import LazyAgent, load_lazy_loading_policy
+from .validators import AgentValidators, compile_agent_validators
 
 logger = logging.getLogger(__name__)
 
+# Manifest annotation setting the max number of concurrent runs of the agent
+MAX_CONCURRENCY_ANNOTATION = "agws.max_concurrency"
+
+DEFAULT_LOAD_CONCURRENCY = 8
+
 
 def _make_acp_descriptor(manifest: AgentManifest) -> AgentACPDescriptor:
     """Create an AgentACPDescriptor from a AgentManifest"""
@@ -53,35 +73,69 @@ def _make_acp_descriptor(manifest: AgentManifest) -> AgentACPDescriptor:
 class AgentInfo(NamedTuple):
     agent: BaseAgent
     acp_descriptor: AgentACPDescriptor
-    schema: Mapping[Hashable, Any]
+    # None for the agents loaded lazily, until first requested
+    schema: Optional[Mapping[Hashable, Any]]
     deployment: AgentDeployment
+    # Compiled once at load, see services/validation.py
+    validators: AgentValidators
+    max_concurrency: Optional[int] = None
 
 
-def _load_adapters() -> List[BaseAdapter]:
-    adapters = []
-    package = agent_workflow_server.agents.adapters
-    for _, module_name, _ in pkgutil.iter_modules(package.__path__):
-        if not module_name.startswith("_"):
-            # Use the package's name to construct the full module path
-            module_path = f"{package.__name__}.{module_name}"
+def _import_adapter(ref: str) -> Optional[BaseAdapter]:
+    """Adapter of a "module:class" reference, imported on first call"""
+    with _imported_adapters_lock:
+        if ref not in _IMPORTED_ADAPTERS:
+            module_path, class_name = ref.split(":", 1)
             try:
                 module = importlib.import_module(module_path)
-                for attr_name in dir(module):
-                    attr = getattr(module, attr_name)
-                    if (
-                        isinstance(attr, type)
-                        and issubclass(attr, BaseAdapter)
-                        and attr is not BaseAdapter
-                    ):
-                        adapters.append(attr())
+                _IMPORTED_ADAPTERS[ref] = getattr(module, class_name)()
             except ImportError as e:
                 logger.error(f"Could not import adapter from {module_path}: {e}")
+                _IMPORTED_ADAPTERS[ref] = None
+        return _IMPORTED_ADAPTERS[ref]
 
-    return adapters
+
+def _framework_types(deployment: AgentDeployment) -> List[str]:
+    """framework_type of the deployment options of a manifest, in order"""
+    framework_types = []
+    for option in deployment.deployment_options or []:
+        framework_config = getattr(option.actual_instance, "framework_config", None)
+        framework_type = getattr(
+            getattr(framework_config, "actual_instance", None), "framework_type", None
+        )
+        if framework_type and framework_type not in framework_types:
+            framework_types.append(framework_type)
+    return framework_types
+
+
+def _iter_adapters(deployment: AgentDeployment) -> Iterator[BaseAdapter]:
+    """Adapters to try to load an agent with. The adapters of the deployment
+    frameworks are imported first, the other ones only if none of them loads
+    the agent."""
+    if ADAPTERS is not None:
+        yield from ADAPTERS
+        return
+
+    refs = [
+        ADAPTER_REGISTRY[framework_type]
+        for framework_type in _framework_types(deployment)
+        if framework_type in ADAPTER_REGISTRY
+    ]
+    refs += [ref for ref in ADAPTER_REGISTRY.values() if ref not in refs]
+    for ref in refs:
+        adapter = _import_adapter(ref)
+        if adapter is not None:
+            yield adapter
 
 
 AGENTS: Dict[str, AgentInfo] = {}
-ADAPTERS = _load_adapters()
+# Adapters to try, in order. When None, the adapters of the
+# agents/adapters package are imported when an agent needs them.
+ADAPTERS: Optional[List[BaseAdapter]] = None
+# Imported adapters by reference, None if the import failed
+_IMPORTED_ADAPTERS: Dict[str, Optional[BaseAdapter]] = {}
+# Agents are loaded concurrently, see load_agents
+_imported_adapters_lock = threading.Lock()
 
 
 def _read_manifest(path: str):
@@ -91,14 +145,16 @@ def _read_manifest(path: str):
             manifest = AgentManifest.model_validate(manifest_data)
             # print full path
             logger.info(f"Loaded Agent Manifest from {os.path.abspath(path)}")
-        return _make_acp_descriptor(manifest), manifest.extensions[0].data.deployment
+        return (
+            _make_acp_descriptor(manifest),
+            manifest.extensions[0].data.deployment,
+            manifest.annotations or {},
+        )
 
-    return None, None
+    return None, None, None
 
 
-def _resolve_agent(
-    name: str, path: str, add_manifest_paths: List[str] = []
-) -> AgentInfo:
+def _split_agent_path(path: str) -> Tuple[str, str]:
     if ":" not in path:
         raise ValueError(
             f"""Invalid format for AGENTS_REF environment variable. \
@@ -106,19 +162,26 @@ Value must be a module:var pair. \
 Example: "agent1_module:agent1_var" or "path/to/file.py:agent1_var"
 Got: {path}"""
         )
-
     module_or_file, export_symbol = path.split(":", 1)
+    return module_or_file, export_symbol
+
+
+def _module_not_found(module_name: str) -> ImportError:
+    return ImportError(
+        f"""Failed to load agent module {module_name}. \
+Check that it is installed and that the module name in 'AGENTS_REF' env variable is correct."""
+    )
+
+
+def _import_agent_module(name: str, module_or_file: str) -> ModuleType:
     if not os.path.isfile(module_or_file):
         # It's a module (name), try to import it
         module_name = module_or_file
         try:
-            module = importlib.import_module(module_name)
+            return importlib.import_module(module_name)
         except ImportError as e:
             if any(part in str(e) for part in module_name.split(".")):
-                raise ImportError(
-                    f"""Failed to load agent module {module_name}. \
-Check that it is installed and that the module name in 'AGENTS_REF' env variable is correct."""
-                ) from e
+                raise _module_not_found(module_name) from e
             else:
                 raise e
     else:
@@ -132,32 +195,47 @@ Check that file path in 'AGENTS_REF' env variable is correct."""
             )
         module = importlib.util.module_from_spec(spec)
         spec.loader.exec_module(module)
+        return module
+
+
+def _agent_module_dir(module_or_file: str) -> str:
+    """Directory of the agent module, found without executing it"""
+    if os.path.isfile(module_or_file):
+        return os.path.dirname(os.path.abspath(module_or_file))
+    try:
+        # Imports the parent packages, not the module itself
+        spec = importlib.util.find_spec(module_or_file)
+    except ImportError as e:
+        raise _module_not_found(module_or_file) from e
+    if spec is None or spec.origin is None:
+        raise _module_not_found(module_or_file)
+    return os.path.dirname(spec.origin)
 
+
+def _find_manifest(module_dir: str, add_manifest_paths: List[str]):
     # Load manifest. Check in paths below (in order)
     manifest_paths = [
-        os.path.join(os.path.dirname(module.__file__), "manifest.json"),
+        os.path.join(module_dir, "manifest.json"),
     ] + add_manifest_paths
 
     for manifest_path in manifest_paths:
-        acp_descriptor, deployment = _read_manifest(manifest_path)
+        acp_descriptor, deployment, annotations = _read_manifest(manifest_path)
         if acp_descriptor and deployment:
-            break
-    else:
-        raise ImportError(
-            f"Failed to load agent manifest from any of the paths: {manifest_paths}"
-        )
+            return acp_descriptor, deployment, annotations
+    raise ImportError(
+        f"Failed to load agent manifest from any of the paths: {manifest_paths}"
+    )
 
-    try:
-        schema = generate_agent_oapi(acp_descriptor, name)
-    except Exception as e:
-        raise ImportError("Failed to generate OAPI schema:", e)
 
+def _load_agent(
+    module: ModuleType, export_symbol: str, deployment: AgentDeployment
+) -> BaseAgent:
     # Check if the variable exists in the module
     if hasattr(module, export_symbol):
         resolved = getattr(module, export_symbol)
 
         agent = None
-        for adapter in ADAPTERS:
+        for adapter in _iter_adapters(deployment):
             agent = adapter.load_agent(resolved, deployment, DB.set_persist_threads)
             if agent is not None:
                 break
@@ -173,12 +251,79 @@ Check that the module name and export symbol in 'AGENTS_REF' env variable are co
 
     logger.info(f"Loaded Agent from {module.__file__}")
     logger.info(f"Agent Type: {type(agent).__name__}")
+    return agent
+
+
+def _make_lazy_agent(
+    name: str, module_or_file: str, export_symbol: str, deployment: AgentDeployment
+) -> LazyAgent:
+    # Set when the module was imported by the agent and not before, it is
+    # then removed from sys.modules when the agent is unloaded
+    imported_module: List[str] = []
+
+    def load() -> BaseAgent:
+        imported_module.clear()
+        if not os.path.isfile(module_or_file) and module_or_file not in sys.modules:
+            imported_module.append(module_or_file)
+        module = _import_agent_module(name, module_or_file)
+        return _load_agent(module, export_symbol, deployment)
+
+    def unload():
+        for module_name in imported_module:
+            sys.modules.pop(module_name, None)
+
+    return LazyAgent(name, load, unload)
+
+
+def _resolve_agent(
+    name: str, path: str, add_manifest_paths: List[str] = [], lazy: bool = False
+) -> AgentInfo:
+    """Load the agent of an AGENTS_REF entry. When lazy, only its manifest is
+    read: the agent module is imported on first use, see agents/lazy.py."""
+    module_or_file, export_symbol = _split_agent_path(path)
+    if lazy:
+        module = None
+        module_dir = _agent_module_dir(module_or_file)
+    else:
+        module = _import_agent_module(name, module_or_file)
+        module_dir = os.path.dirname(module.__file__)
+
+    acp_descriptor, deployment, annotations = _find_manifest(
+        module_dir, add_manifest_paths
+    )
+
+    if lazy:
+        # Generated when requested, see get_agent_openapi_schema
+        schema = None
+        agent = _make_lazy_agent(name, module_or_file, export_symbol, deployment)
+    else:
+        try:
+            schema = generate_agent_oapi(acp_descriptor, name)
+        except Exception as e:
+            raise ImportError("Failed to generate OAPI schema:", e)
+        agent = _load_agent(module, export_symbol, deployment)
+
+    max_concurrency = annotations.get(MAX_CONCURRENCY_ANNOTATION)
 
     return AgentInfo(
-        agent=agent, acp_descriptor=acp_descriptor, deployment=deployment, schema=schema
+        agent=agent,
+        acp_descriptor=acp_descriptor,
+        deployment=deployment,
+        schema=schema,
+        validators=compile_agent_validators(acp_descriptor.specs),
+        max_concurrency=int(max_concurrency) if max_concurrency else None,
     )
 
 
+def load_load_concurrency() -> int:
+    load_concurrency = int(os.getenv("AGWS_LOAD_CONCURRENCY", DEFAULT_LOAD_CONCURRENCY))
+    if load_concurrency < 1:
+        raise ValueError(
+            f"Invalid AGWS_LOAD_CONCURRENCY {load_concurrency}. Must be at least 1."
+        )
+    return load_concurrency
+
+
 def load_agents(agents_ref: Optional[str] = None, add_manifest_paths: List[str] = []):
     try:
         config: Dict[str, str] = json.loads(agents_ref) if agents_ref else {}
@@ -186,14 +331,33 @@ def load_agents(agents_ref: Optional[str] = None, add_manifest_paths: List[str]
         raise ValueError("""Invalid format for AGENTS_REF environment variable. \
 Must be a dictionary of agent_id -> module:var pairs. \
 Example: {"agent1": "agent1_module:agent1_var", "agent2": "agent2_module:agent2_var"}""")
-    for agent_id, agent_path in config.items():
-        try:
-            agent = _resolve_agent(agent_id, agent_path, add_manifest_paths)
-            AGENTS[agent_id] = agent
-            logger.info(f"Registered Agent: '{agent_id}'", {"agent_id": agent_id})
-        except Exception as e:
-            logger.error(e)
-            raise Exception(e)
+    if not config:
+        return
+    lazy = load_lazy_loading_policy().enabled
+
+    # The agents are resolved concurrently: importing their modules and
+    # frameworks, reading their manifests and generating their OpenAPI specs
+    # mostly wait on the disk and on C code. They are registered in the
+    # AGENTS_REF order.
+    with ThreadPoolExecutor(
+        max_workers=min(load_load_concurrency(), len(config)),
+        thread_name_prefix="agws-load",
+    ) as pool:
+        futures = {
+            agent_id: pool.submit(
+                _resolve_agent, agent_id, agent_path, add_manifest_paths, lazy
+            )
+            for agent_id, agent_path in config.items()
+        }
+        for agent_id, future in futures.items():
+            try:
+                AGENTS[agent_id] = future.result()
+                logger.info(f"Registered Agent: '{agent_id}'", {"agent_id": agent_id})
+            except Exception as e:
+                for pending in futures.values():
+                    pending.cancel()
+                logger.error(e)
+                raise Exception(e)
 
 
 def get_agent_info(agent_id: str) -> AgentInfo:
@@ -246,4 +410,9 @@ def get_agent_openapi_schema(agent_id: str) -> str:
     if agent_id not in AGENTS:
         raise ValueError(f'Agent "{agent_id}" not found')
 
-    return json.dumps(AGENTS[agent_id].schema, indent=2)
+    agent_info = AGENTS[agent_id]
+    schema = agent_info.schema
+    if schema is None:
+        schema = generate_agent_oapi(agent_info.acp_descriptor, agent_id)
+        AGENTS[agent_id] = agent_info._replace(schema=schema)
+    return json.dumps(schema, indent=2)
@@ -1,8 +1,14 @@
 # Copyright AGNTCY Contributors (https://github.com/agntcy)
 # SPDX-License-Identifier: Apache-2.0
 
+import copy
+import hashlib
 import json
+import logging
 import os
+import tempfile
+import threading
+from typing import Any, Dict, NamedTuple, Optional, Tuple
 
 from openapi_spec_validator import validate
 from openapi_spec_validator.readers import read_from_filename
@@ -12,11 +18,46 @@ from agent_workflow_server.generated.models.agent_acp_descriptor import (
     AgentACPDescriptor,
 )
 
+logger = logging.getLogger(__name__)
+
+# Bump when the generated specs change for the same descriptor and base spec,
+# so that the specs cached on disk are not used anymore
+GENERATOR_VERSION = 1
+
 
 class ACPDescriptorValidationException(Exception):
     pass
 
 
+class _BaseSpec(NamedTuple):
+    # (path, mtime, size) of the file it was read from
+    stamp: Tuple[str, int, int]
+    spec_dict: Dict[str, Any]
+    digest: str
+
+
+_base_spec: Optional[_BaseSpec] = None
+_base_spec_lock = threading.Lock()
+
+
+def _get_base_spec() -> _BaseSpec:
+    """ACP OpenAPI spec read and validated once, then again only if the file
+    changes. Callers must not modify the returned spec_dict."""
+    global _base_spec
+    path = os.getenv("ACP_SPEC_PATH", "acp-spec/openapi.json")
+    stat = os.stat(path)
+    stamp = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+    with _base_spec_lock:
+        if _base_spec is None or _base_spec.stamp != stamp:
+            with open(path, "rb") as file:
+                digest = hashlib.sha256(file.read()).hexdigest()
+            spec_dict, _ = read_from_filename(path)
+            # If no exception is raised by validate(), the spec is valid.
+            validate(spec_dict)
+            _base_spec = _BaseSpec(stamp, spec_dict, digest)
+        return _base_spec
+
+
 def _convert_descriptor_schema(schema_name, schema):
     return json.loads(
         json.dumps(schema).replace(
@@ -112,13 +153,51 @@ def _add_default_agent_id(spec_dict, agent_id: str):
     return spec_dict
 
 
-def generate_agent_oapi(descriptor: AgentACPDescriptor, agent_id: str):
-    spec_dict, base_uri = read_from_filename(
-        os.getenv("ACP_SPEC_PATH", "acp-spec/openapi.json")
-    )
-
-    # If no exception is raised by validate(), the spec is valid.
-    validate(spec_dict)
+def _cache_path(
+    cache_dir: str, base_spec: _BaseSpec, descriptor: AgentACPDescriptor, agent_id: str
+) -> str:
+    key = hashlib.sha256()
+    for part in (
+        str(GENERATOR_VERSION),
+        base_spec.digest,
+        agent_id,
+        descriptor.model_dump_json(),
+    ):
+        key.update(part.encode())
+        key.update(b"\0")
+    return os.path.join(cache_dir, f"{key.hexdigest()}.json")
+
+
+def _read_cached_spec(path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(path, "r") as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as e:
+        logger.warning(f"Ignoring unreadable cached OpenAPI spec {path}: {e}")
+        return None
+
+
+def _write_cached_spec(path: str, spec_dict: Dict[str, Any]):
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Written aside then renamed, so that a concurrent reader never reads
+        # a partial spec
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "w") as file:
+            json.dump(spec_dict, file)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logger.warning(f"Cannot cache OpenAPI spec in {path}: {e}")
+
+
+def _generate_agent_oapi(
+    base_spec: _BaseSpec, descriptor: AgentACPDescriptor, agent_id: str
+):
+    # Every operation of the copy gets modified, copying it all is cheaper
+    # than parsing the file again
+    spec_dict = copy.deepcopy(base_spec.spec_dict)
 
     spec_dict["info"]["title"] = (
         f"ACP Spec for {descriptor.metadata.ref.name}:{descriptor.metadata.ref.version}"
@@ -148,3 +227,23 @@ def generate_agent_oapi(descriptor: AgentACPDescriptor, agent_id: str):
     validate(spec_dict)
 
     return spec_dict
+
+
+def generate_agent_oapi(descriptor: AgentACPDescriptor, agent_id: str):
+    """OpenAPI spec of an agent: the ACP spec restricted to the capabilities
+    of its descriptor.
+
+    When AGWS_OAPI_CACHE_DIR is set, the generated specs are kept there, by
+    hash of the ACP spec file, descriptor and agent_id, and are not
+    generated and validated again on the next start."""
+    base_spec = _get_base_spec()
+    cache_dir = os.getenv("AGWS_OAPI_CACHE_DIR")
+    if not cache_dir:
+        return _generate_agent_oapi(base_spec, descriptor, agent_id)
+
+    path = _cache_path(cache_dir, base_spec, descriptor, agent_id)
+    spec_dict = _read_cached_spec(path)
+    if spec_dict is None:
+        spec_dict = _generate_agent_oapi(base_spec, descriptor, agent_id)
+        _write_cached_spec(path, spec_dict)
+    return spec_dict
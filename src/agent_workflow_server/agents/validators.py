@@ -0,0 +1,296 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import logging
+import os
+from collections import Counter
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    FrozenSet,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import jsonschema
+
+from agent_workflow_server.generated.models.agent_acp_spec import AgentACPSpec
+
+try:
+    import fastjsonschema
+except ImportError:  # optional dependency, see the "fast-validation" extra
+    fastjsonschema = None
+
+logger = logging.getLogger(__name__)
+
+SCHEMA_VALIDATOR_BACKENDS = ("jsonschema", "fast")
+
+
+def _compile_fast(schema: Any) -> Optional[Callable[[Any], Any]]:
+    """Code generated validator of the schema, None if not available"""
+    if fastjsonschema is None:
+        logger.warning(
+            'AGWS_SCHEMA_VALIDATOR is "fast" but fastjsonschema is not installed'
+        )
+        return None
+    try:
+        # Like jsonschema: formats are not checked and defaults are not
+        # inserted in the validated instance
+        return fastjsonschema.compile(schema, use_default=False, use_formats=False)
+    except Exception as e:
+        logger.warning(f"Cannot compile schema with fastjsonschema: {e}")
+        return None
+
+
+class SchemaValidator:
+    """JSON schema checked and compiled once, validating an instance is then
+    only a walk of the instance"""
+
+    def __init__(self, schema: Any, backend: str = "jsonschema"):
+        self.schema = schema
+        cls = jsonschema.validators.validator_for(schema)
+        cls.check_schema(schema)
+        self._validator = cls(schema)
+        self._fast = _compile_fast(schema) if backend == "fast" else None
+
+    def is_valid(self, instance: Any) -> bool:
+        if self._fast is not None:
+            try:
+                self._fast(instance)
+                return True
+            except fastjsonschema.JsonSchemaException:
+                # Confirmed below, jsonschema is the reference
+                pass
+        return self._validator.is_valid(instance)
+
+    def validate(self, instance: Any) -> None:
+        """Raise the same jsonschema.ValidationError as jsonschema.validate"""
+        if self.is_valid(instance):
+            return
+        error = jsonschema.exceptions.best_match(self._validator.iter_errors(instance))
+        if error is not None:
+            raise error
+
+
+class InterruptValidators(NamedTuple):
+    interrupt_type: str
+    interrupt_payload: SchemaValidator
+    resume_payload: SchemaValidator
+
+
+_JSON_TYPES: Dict[str, Callable[[Any], bool]] = {
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "null": lambda v: v is None,
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "integer": lambda v: (
+        (isinstance(v, int) and not isinstance(v, bool))
+        or (isinstance(v, float) and v.is_integer())
+    ),
+}
+
+# Keywords next to which a "$ref" can be followed, whatever the schema draft
+_REF_SIBLINGS = {
+    "$ref",
+    "$defs",
+    "definitions",
+    "$schema",
+    "$id",
+    "title",
+    "description",
+}
+
+
+def _string_const(schema: Any) -> Optional[str]:
+    """Value of a property schema allowing a single string"""
+    if not isinstance(schema, dict):
+        return None
+    if "const" in schema:
+        value = schema["const"]
+    elif isinstance(schema.get("enum"), list) and len(schema["enum"]) == 1:
+        value = schema["enum"][0]
+    else:
+        return None
+    return value if isinstance(value, str) else None
+
+
+def _resolve_local_ref(schema: dict) -> Optional[dict]:
+    """Definition referenced by a schema that is only a local "$ref", e.g.
+    {"$ref": "#/$defs/Approval", "$defs": {...}}"""
+    ref = schema["$ref"]
+    if (
+        not isinstance(ref, str)
+        or not ref.startswith("#")
+        or set(schema) - _REF_SIBLINGS
+    ):
+        return None
+    target = schema
+    for part in ref[2:].split("/") if ref[2:] else []:
+        target = target.get(part) if isinstance(target, dict) else None
+    if not isinstance(target, dict) or "$ref" in target:
+        return None
+    return target
+
+
+class _PayloadShape(NamedTuple):
+    """Conditions an instance must meet to be valid against an interrupt
+    payload schema, derived from its top level keywords. Meeting them does
+    not make the instance valid."""
+
+    types: Optional[Tuple[str, ...]] = None
+    required: FrozenSet[str] = frozenset()
+    # Required properties whose value must be a given string
+    consts: Dict[str, str] = {}
+    # Set when the schema forbids additional properties
+    allowed: Optional[FrozenSet[str]] = None
+
+    @classmethod
+    def of(cls, schema: Any) -> "_PayloadShape":
+        if not isinstance(schema, dict):
+            return cls()
+        if "$ref" in schema:
+            schema = _resolve_local_ref(schema)
+            if schema is None:
+                return cls()
+
+        types = schema.get("type")
+        if isinstance(types, str):
+            types = (types,)
+        if not isinstance(types, (list, tuple)) or not all(
+            t in _JSON_TYPES for t in types
+        ):
+            types = None
+
+        properties = schema.get("properties")
+        properties = properties if isinstance(properties, dict) else {}
+        required = schema.get("required")
+        required = frozenset(required) if isinstance(required, list) else frozenset()
+        consts = {
+            key: value
+            for key in required
+            if (value := _string_const(properties.get(key))) is not None
+        }
+        allowed = (
+            frozenset(properties)
+            if schema.get("additionalProperties") is False
+            and not schema.get("patternProperties")
+            else None
+        )
+        return cls(tuple(types) if types else None, required, consts, allowed)
+
+    def admits(self, instance: Any) -> bool:
+        if self.types is not None and not any(
+            _JSON_TYPES[t](instance) for t in self.types
+        ):
+            return False
+        if not isinstance(instance, dict):
+            return True
+        if not self.required <= instance.keys():
+            return False
+        for key, value in self.consts.items():
+            if instance[key] != value or not isinstance(instance[key], str):
+                return False
+        return self.allowed is None or instance.keys() <= self.allowed
+
+
+class InterruptClassifier:
+    """Finds the interrupt type of an interrupt payload: the first interrupt
+    type, in the ACP descriptor order, whose payload schema validates it.
+
+    Rather than validating the payload against every schema in turn, the
+    candidates are looked up by the value of the property most interrupt
+    schemas require to be a given string (a discriminator such as "kind"),
+    then filtered by their required properties, allowed properties and
+    type. Only the remaining candidates are validated, usually one."""
+
+    def __init__(self, interrupts: List[InterruptValidators]):
+        self.interrupts = interrupts
+        self._shapes = [
+            _PayloadShape.of(interrupt.interrupt_payload.schema)
+            for interrupt in interrupts
+        ]
+
+        counts = Counter(key for shape in self._shapes for key in shape.consts)
+        self.discriminator: Optional[str] = None
+        # Discriminator value -> interrupt indexes, in the descriptor order
+        self._index: Dict[str, List[int]] = {}
+        # Interrupts that do not constrain the discriminator
+        self._unindexed: List[int] = list(range(len(interrupts)))
+        if counts and counts.most_common(1)[0][1] > 1:
+            self.discriminator = counts.most_common(1)[0][0]
+            self._unindexed = []
+            for i, shape in enumerate(self._shapes):
+                value = shape.consts.get(self.discriminator)
+                if value is None:
+                    self._unindexed.append(i)
+                else:
+                    self._index.setdefault(value, []).append(i)
+
+    def candidates(self, payload: Any) -> List[int]:
+        """Indexes of the interrupt types the payload may be valid against"""
+        if self.discriminator is None or not isinstance(payload, dict):
+            # "required" and "const" only constrain objects
+            indexes = range(len(self.interrupts))
+        else:
+            value = payload.get(self.discriminator)
+            if isinstance(value, str) and value in self._index:
+                indexes = sorted(self._index[value] + self._unindexed)
+            else:
+                # The indexed interrupts require another discriminator value
+                indexes = self._unindexed
+        return [i for i in indexes if self._shapes[i].admits(payload)]
+
+    def classify(self, payload: Any) -> Optional[str]:
+        """Interrupt type of the payload, None if no interrupt schema validates it"""
+        for i in self.candidates(payload):
+            interrupt = self.interrupts[i]
+            if interrupt.interrupt_payload.is_valid(payload):
+                return interrupt.interrupt_type
+        return None
+
+
+class AgentValidators(NamedTuple):
+    # None when the agent has no schema for it
+    input: Optional[SchemaValidator]
+    output: Optional[SchemaValidator]
+    config: Optional[SchemaValidator]
+    interrupts: List[InterruptValidators]
+    interrupt_classifier: InterruptClassifier
+
+
+def load_schema_validator_backend() -> str:
+    backend = os.getenv("AGWS_SCHEMA_VALIDATOR", "jsonschema")
+    if backend not in SCHEMA_VALIDATOR_BACKENDS:
+        raise ValueError(
+            f'Invalid AGWS_SCHEMA_VALIDATOR "{backend}". Supported values are {", ".join(SCHEMA_VALIDATOR_BACKENDS)}.'
+        )
+    return backend
+
+
+def compile_agent_validators(specs: AgentACPSpec) -> AgentValidators:
+    """Compile the validators of the schemas of an agent ACP descriptor"""
+    backend = load_schema_validator_backend()
+
+    def compile(schema: Any) -> Optional[SchemaValidator]:
+        return SchemaValidator(schema, backend) if schema else None
+
+    interrupts = [
+        InterruptValidators(
+            interrupt_type=interrupt.interrupt_type,
+            interrupt_payload=SchemaValidator(interrupt.interrupt_payload, backend),
+            resume_payload=SchemaValidator(interrupt.resume_payload, backend),
+        )
+        for interrupt in specs.interrupts or []
+    ]
+    return AgentValidators(
+        input=compile(specs.input),
+        output=compile(specs.output),
+        config=compile(specs.config),
+        interrupts=interrupts,
+        interrupt_classifier=InterruptClassifier(interrupts),
+    )
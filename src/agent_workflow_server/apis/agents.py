@@ -3,7 +3,7 @@
 
 # coding: utf-8
 
-from typing import List  # noqa: F401
+from typing import Callable, Dict, List, Tuple  # noqa: F401
 
 from fastapi import (  # noqa: F401
     APIRouter,
@@ -19,11 +19,13 @@ from pydantic import Field, StrictStr
 from typing_extensions import Annotated
 
 from agent_workflow_server.agents.load import (
+    AgentInfo,
     get_agent,
     get_agent_info,
     get_agent_openapi_schema,
     search_for_agents,
 )
+from agent_workflow_server.apis.prepared import PreparedResponse
 from agent_workflow_server.generated.models.agent import Agent
 from agent_workflow_server.generated.models.agent_acp_descriptor import (
     AgentACPDescriptor,
@@ -35,11 +37,27 @@ from agent_workflow_server.generated.models.agent_search_request import (
 router = APIRouter()
 public_router = APIRouter()
 
+# (agent_id, endpoint) -> AgentInfo the response was prepared from, response.
+# Prepared on first request, again only if the agent is loaded again.
+_PREPARED_RESPONSES: Dict[Tuple[str, str], Tuple[AgentInfo, PreparedResponse]] = {}
+
+
+def _prepared_response(
+    agent_id: str, endpoint: str, body: Callable[[AgentInfo], bytes]
+) -> PreparedResponse:
+    agent_info = get_agent_info(agent_id)
+    prepared = _PREPARED_RESPONSES.get((agent_id, endpoint))
+    if prepared is None or prepared[0] is not agent_info:
+        prepared = (agent_info, PreparedResponse(body(agent_info)))
+        _PREPARED_RESPONSES[(agent_id, endpoint)] = prepared
+    return prepared[1]
+
 
 @router.get(
     "/agents/{agent_id}/descriptor",
     responses={
         200: {"model": AgentACPDescriptor, "description": "Success"},
+        304: {"description": "Not Modified"},
         404: {"model": str, "description": "Not Found"},
         422: {"model": str, "description": "Validation Error"},
     },
@@ -48,23 +66,31 @@ public_router = APIRouter()
     response_model_by_alias=True,
 )
 async def get_acp_descriptor_by_id(
+    request: Request,
     agent_id: Annotated[StrictStr, Field(description="The ID of the agent.")] = Path(
         ..., description="The ID of the agent."
     ),
-) -> AgentACPDescriptor:
+) -> Response:
     """Get agent ACP descriptor by agent ID."""
 
     try:
-        agent_info = get_agent_info(agent_id)
-        return agent_info.acp_descriptor
+        prepared = _prepared_response(
+            agent_id,
+            "descriptor",
+            lambda agent_info: agent_info.acp_descriptor.model_dump_json(
+                by_alias=True
+            ).encode(),
+        )
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    return prepared.respond(request)
 
 
 @router.get(
     "/agents/{agent_id}",
     responses={
         200: {"model": Agent, "description": "Success"},
+        304: {"description": "Not Modified"},
         404: {"model": str, "description": "Not Found"},
     },
     tags=["Agents"],
@@ -72,17 +98,22 @@ async def get_acp_descriptor_by_id(
     response_model_by_alias=True,
 )
 async def get_agent_by_id(
+    request: Request,
     agent_id: Annotated[StrictStr, Field(description="The ID of the agent.")] = Path(
         ..., description="The ID of the agent."
     ),
-) -> Agent:
+) -> Response:
     """Get an agent by ID."""
 
     try:
-        agent = get_agent(agent_id)
-        return agent
+        prepared = _prepared_response(
+            agent_id,
+            "agent",
+            lambda _: get_agent(agent_id).model_dump_json(by_alias=True).encode(),
+        )
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    return prepared.respond(request)
 
 
 @router.post(
@@ -114,6 +145,7 @@ async def search_agents(
             "content": {"application/json": {"schema": {"type": "object"}}},
             "description": "Success",
         },
+        304: {"description": "Not Modified"},
         404: {"model": str, "description": "Not Found"},
     },
     tags=["Agents"],
@@ -121,6 +153,7 @@ async def search_agents(
     response_model_by_alias=True,
 )
 async def get_agent_openapi(
+    request: Request,
     agent_id: Annotated[StrictStr, Field(description="The ID of the agent.")] = Path(
         ..., description="The ID of the agent."
     ),
@@ -128,10 +161,14 @@ async def get_agent_openapi(
     """Get the OpenAPI schema for an agent by ID."""
 
     try:
-        openapi = get_agent_openapi_schema(agent_id)
-        return Response(content=openapi, media_type="application/json")
+        prepared = _prepared_response(
+            agent_id,
+            "openapi",
+            lambda _: get_agent_openapi_schema(agent_id).encode(),
+        )
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
+    return prepared.respond(request)
 
 
 @public_router.get(
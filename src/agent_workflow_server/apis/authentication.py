@@ -18,20 +18,24 @@ API_KEY_NAME = "x-api-key"
 api_key_header = APIKeyHeader(name=API_KEY_NAME, auto_error=False)
 
 
-async def authentication_with_api_key(
-    api_key_header: str = Security(api_key_header),
-) -> Optional[str]:
+def check_api_key(api_key: Optional[str]) -> Optional[str]:
     # If no API key is configured, authentication is disabled
     if not API_KEY:
         return None
 
     # If API key is configured, validate the header
-    if api_key_header == API_KEY:
-        return api_key_header
+    if api_key == API_KEY:
+        return api_key
 
     raise HTTPException(status_code=HTTP_401_UNAUTHORIZED, detail="Invalid API Key")
 
 
+async def authentication_with_api_key(
+    api_key_header: str = Security(api_key_header),
+) -> Optional[str]:
+    return check_api_key(api_key_header)
+
+
 def setup_api_key_auth(app: FastAPI) -> None:
     """Setup API Key authentication for the FastAPI application"""
 
@@ -0,0 +1,78 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+# coding: utf-8
+
+from typing import Any, Dict, List, Optional
+
+from fastapi import APIRouter, HTTPException, Path, Query, status
+from pydantic import Field, StrictStr
+from typing_extensions import Annotated
+
+from agent_workflow_server.services.retry import DEAD_LETTERS
+
+router = APIRouter()
+
+
+@router.get(
+    "/dead-letters",
+    responses={
+        200: {"model": List[Dict[str, Any]], "description": "Success"},
+    },
+    tags=["Dead Letters"],
+    summary="List the runs that exhausted their retry attempts",
+)
+async def list_dead_letters(
+    agent_id: Optional[StrictStr] = Query(None, description="Filter by agent ID."),
+    offset: int = Query(0, ge=0, description="Number of dead letters to skip."),
+    limit: int = Query(100, ge=1, le=1000, description="Max dead letters to return."),
+) -> List[Dict[str, Any]]:
+    """List the runs that failed after exhausting their retry attempts, most recent first."""
+    return DEAD_LETTERS.list(agent_id=agent_id, offset=offset, limit=limit)
+
+
+@router.get(
+    "/dead-letters/{run_id}",
+    responses={
+        200: {"model": Dict[str, Any], "description": "Success"},
+        404: {"model": str, "description": "Not Found"},
+    },
+    tags=["Dead Letters"],
+    summary="Get a dead letter",
+)
+async def get_dead_letter(
+    run_id: Annotated[StrictStr, Field(description="The ID of the run.")] = Path(
+        ..., description="The ID of the run."
+    ),
+) -> Dict[str, Any]:
+    """Get the attempts and last error of a run that exhausted its retry attempts."""
+    letter = DEAD_LETTERS.get(run_id)
+    if letter is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No dead letter for run {run_id}",
+        )
+    return letter
+
+
+@router.delete(
+    "/dead-letters/{run_id}",
+    responses={
+        204: {"description": "Success"},
+        404: {"model": str, "description": "Not Found"},
+    },
+    tags=["Dead Letters"],
+    summary="Delete a dead letter",
+    status_code=status.HTTP_204_NO_CONTENT,
+)
+async def delete_dead_letter(
+    run_id: Annotated[StrictStr, Field(description="The ID of the run.")] = Path(
+        ..., description="The ID of the run."
+    ),
+) -> None:
+    """Delete the dead letter of a run once it has been handled."""
+    if DEAD_LETTERS.remove(run_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail=f"No dead letter for run {run_id}",
+        )
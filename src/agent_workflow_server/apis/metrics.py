@@ -0,0 +1,78 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+# coding: utf-8
+
+from fastapi import APIRouter, Response
+
+from agent_workflow_server.services import queue
+from agent_workflow_server.services.metrics import REGISTRY, Collected
+from agent_workflow_server.services.retry import RETRY_QUEUE
+from agent_workflow_server.services.runs import RUNS_QUEUE, stream_manager
+from agent_workflow_server.services.webhooks import webhook_dispatcher
+
+# Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+router = APIRouter()
+
+
+def _workers():
+    pool = queue.WORKER_POOL
+    busy = len(pool.busy) if pool is not None else 0
+    size = pool.size if pool is not None else 0
+    return [(("busy",), busy), (("idle",), size - busy)]
+
+
+def _webhook_deliveries():
+    stats = webhook_dispatcher.to_dict()
+    return [
+        ((outcome,), stats[outcome])
+        for outcome in ("delivered", "failed", "retried", "coalesced", "dropped")
+    ]
+
+
+for metric in (
+    Collected(
+        "agws_runs_queued",
+        "Runs waiting in the queue, including the ones held by concurrency limits",
+        lambda: [((), RUNS_QUEUE.qsize())],
+    ),
+    Collected(
+        "agws_runs_runnable",
+        "Queued runs a worker can start now",
+        lambda: [((), RUNS_QUEUE.runnable_size())],
+    ),
+    Collected(
+        "agws_runs_delayed_retries",
+        "Failed runs waiting for their retry delay",
+        lambda: [((), len(RETRY_QUEUE))],
+    ),
+    Collected("agws_workers", "Worker tasks by state", _workers, ("state",)),
+    Collected(
+        "agws_stream_subscribers",
+        "Clients streaming the messages of a run",
+        lambda: [((), sum(len(queues) for queues in stream_manager.queues.values()))],
+    ),
+    Collected(
+        "agws_webhook_deliveries_total",
+        "Webhook deliveries by outcome, and retried delivery attempts",
+        _webhook_deliveries,
+        ("outcome",),
+        type="counter",
+    ),
+):
+    REGISTRY.register(metric)
+
+
+@router.get(
+    "/metrics",
+    responses={
+        200: {"content": {CONTENT_TYPE: {}}, "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get metrics in the Prometheus format",
+)
+async def get_metrics() -> Response:
+    """Get the queue, worker, run latency, retry, stream, webhook and validation metrics in the Prometheus text format."""
+    return Response(content=REGISTRY.render(), media_type=CONTENT_TYPE)
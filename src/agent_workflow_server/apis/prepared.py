@@ -0,0 +1,112 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import hashlib
+from typing import Dict, List, Optional
+
+from fastapi import Request, Response
+
+try:
+    import brotli
+except ImportError:  # optional dependency, see the "compression" extra
+    brotli = None
+
+# Smaller bodies are not worth compressing
+MIN_COMPRESS_SIZE = 512
+
+# Preferred content codings first
+_CODINGS = ("br", "gzip", "identity")
+
+
+def _accepted_codings(accept_encoding: Optional[str]) -> List[str]:
+    """Content codings of an Accept-Encoding header the client accepts, most
+    wanted first, ties broken by _CODINGS order"""
+    if accept_encoding is None:
+        return ["identity"]
+    qualities: Dict[str, float] = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        qualities[coding] = quality
+
+    wildcard = qualities.get("*")
+    accepted = []
+    for coding in _CODINGS:
+        quality = qualities.get(coding, wildcard)
+        if quality is None:
+            # identity is acceptable unless excluded
+            quality = 1.0 if coding == "identity" else 0.0
+        if quality > 0:
+            accepted.append((-quality, _CODINGS.index(coding), coding))
+    return [coding for *_, coding in sorted(accepted)]
+
+
+class PreparedResponse:
+    """Response body encoded, hashed and compressed once, then served to
+    every request with a strong ETag: requests whose If-None-Match matches it
+    get a 304 without body.
+
+    Each content coding is a distinct representation, with its own ETag
+    ("<digest>", "<digest>-gzip", "<digest>-br"), but any of them validates
+    the others since they have the same content."""
+
+    def __init__(self, body: bytes, media_type: str = "application/json"):
+        self.media_type = media_type
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.bodies: Dict[str, bytes] = {"identity": body}
+        if len(body) >= MIN_COMPRESS_SIZE:
+            # mtime=0 keeps the gzip body, hence the ETag, stable
+            compressed = {"gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+            if brotli is not None:
+                compressed["br"] = brotli.compress(body, quality=11)
+            self.bodies.update(
+                (coding, data)
+                for coding, data in compressed.items()
+                if len(data) < len(body)
+            )
+
+    def etag(self, coding: str = "identity") -> str:
+        suffix = "" if coding == "identity" else f"-{coding}"
+        return f'"{self.digest}{suffix}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag == "*":
+                return True
+            # If-None-Match uses the weak comparison
+            tag = tag.removeprefix("W/").strip('"')
+            if tag.split("-", 1)[0] == self.digest:
+                return True
+        return False
+
+    def respond(self, request: Request) -> Response:
+        coding = next(
+            (
+                coding
+                for coding in _accepted_codings(request.headers.get("accept-encoding"))
+                if coding in self.bodies
+            ),
+            "identity",
+        )
+        headers = {"ETag": self.etag(coding), "Vary": "Accept-Encoding"}
+        if self.matches(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if coding != "identity":
+            headers["Content-Encoding"] = coding
+        return Response(
+            content=self.bodies[coding], media_type=self.media_type, headers=headers
+        )
@@ -0,0 +1,48 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import Callable, Optional
+
+from fastapi import Depends, Header, HTTPException, status
+
+from agent_workflow_server.apis.authentication import authentication_with_api_key
+from agent_workflow_server.services.scheduler import (
+    RUN_PRIORITIES,
+    RunPriority,
+    RunScheduling,
+    tenant_of,
+)
+
+RUN_PRIORITY_HEADER = "x-run-priority"
+
+
+def run_scheduling(default_priority: RunPriority) -> Callable[..., RunScheduling]:
+    """Dependency reading the scheduling parameters of the runs created by a request.
+    The priority is taken from the request header, then from the run metadata,
+    then defaults to `default_priority`."""
+
+    async def dependency(
+        x_run_priority: Optional[str] = Header(
+            None,
+            alias=RUN_PRIORITY_HEADER,
+            description=f"Priority class of the run: {', '.join(RUN_PRIORITIES)}",
+        ),
+        api_key: Optional[str] = Depends(authentication_with_api_key),
+    ) -> RunScheduling:
+        if x_run_priority is not None and x_run_priority not in RUN_PRIORITIES:
+            raise HTTPException(
+                status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+                detail=f'{RUN_PRIORITY_HEADER} "{x_run_priority}" must be one of {", ".join(RUN_PRIORITIES)}',
+            )
+        return RunScheduling(
+            priority=x_run_priority,
+            default_priority=default_priority,
+            tenant=tenant_of(api_key),
+        )
+
+    return dependency
+
+
+# Callers blocking on the run output are served ahead of background runs
+interactive_run_scheduling = run_scheduling("interactive")
+background_run_scheduling = run_scheduling("normal")
@@ -3,12 +3,13 @@
 
 # coding: utf-8
 
-from typing import Any, AsyncIterator, List, Optional, Union
+from typing import Any, List, Optional
 
 from fastapi import (
     APIRouter,
     Body,
     Depends,
+    Header,
     HTTPException,
     Path,
     Query,
@@ -20,6 +21,10 @@ from pydantic import Field, StrictBool, StrictStr
 from typing_extensions import Annotated
 
 from agent_workflow_server.agents.load import get_default_agent
+from agent_workflow_server.apis.scheduling import (
+    background_run_scheduling,
+    interactive_run_scheduling,
+)
 from agent_workflow_server.generated.models.run_create_stateless import (
     RunCreateStateless,
 )
@@ -35,11 +40,14 @@ from agent_workflow_server.generated.models.run_stateless import RunStateless
 from agent_workflow_server.generated.models.run_wait_response_stateless import (
     RunWaitResponseStateless,
 )
-from agent_workflow_server.generated.models.stream_event_payload import (
-    StreamEventPayload,
-)
 from agent_workflow_server.generated.models.streaming_mode import StreamingMode
+from agent_workflow_server.services.queue import (
+    RunNotCancellableError,
+    RunNotFoundError,
+    cancel_run,
+)
 from agent_workflow_server.services.runs import Runs
+from agent_workflow_server.services.scheduler import RunScheduling
 from agent_workflow_server.services.validation import (
     InvalidFormatException,
     validate_resume_run,
@@ -117,9 +125,11 @@ async def _validate_resume_run(run_id: str, body: Any) -> None:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
 
 
-async def _wait_and_return_run_output(run_id: str) -> RunWaitResponseStateless:
+async def _wait_and_return_run_output(
+    run_id: str, timeout: Optional[float] = None
+) -> RunWaitResponseStateless:
     try:
-        run, run_output = await Runs.wait_for_output(run_id)
+        run, run_output = await Runs.wait_for_output(run_id, timeout)
     except TimeoutError:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except InvalidFormatException as e:
@@ -158,20 +168,17 @@ async def _wait_and_return_run_output(run_id: str) -> RunWaitResponseStateless:
         )
 
 
-async def _stream_sse_events(
-    stream: AsyncIterator[StreamEventPayload | None],
-) -> AsyncIterator[Union[str, bytes]]:
-    last_event_id = 0
-    async for event in stream:
-        if event is None:
-            yield ":"
-        else:
-            last_event_id += 1
-            yield f"""id: {last_event_id}
-event: agent_event
-data: {event.to_json()}
-
-"""
+async def _cancel_run(run_id: str, action: str, wait: bool) -> None:
+    try:
+        await cancel_run(run_id, action, wait=wait)
+    except RunNotFoundError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except RunNotCancellableError as e:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e)
+        )
 
 
 @router.post(
@@ -202,7 +209,9 @@ async def cancel_stateless_run(
         alias="action",
     ),
 ) -> None:
-    raise HTTPException(status_code=500, detail="Not implemented")
+    """Cancel a pending run. With &#x60;wait&#x60;, return once the run execution has stopped."""
+    await _cancel_run(run_id, action, wait)
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post(
@@ -224,12 +233,13 @@ async def create_and_stream_stateless_run_output(
     run_create_stateless: Annotated[
         RunCreateStateless, Depends(_validate_run_create_stateless)
     ] = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(interactive_run_scheduling)] = None,
 ) -> RunOutputStream:
     """Create a stateless run and join its output stream. See &#39;GET /runs/{run_id}/stream&#39; for details on the return values."""
     try:
-        new_run = await Runs.put(run_create_stateless)
+        new_run = await Runs.put(run_create_stateless, scheduling)
         return StreamingResponse(
-            _stream_sse_events(Runs.stream_events(new_run.run_id)),
+            Runs.stream_frames(new_run.run_id),
             media_type="text/event-stream",
         )
     except HTTPException:
@@ -260,9 +270,10 @@ async def create_and_wait_for_stateless_run_output(
     run_create_stateless: Annotated[
         RunCreateStateless, Depends(_validate_run_create_stateless)
     ] = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(interactive_run_scheduling)] = None,
 ) -> RunWaitResponseStateless:
     """Create a stateless run and wait for its output. See &#39;GET /runs/{run_id}/wait&#39; for details on the return values."""
-    new_run = await Runs.put(run_create_stateless)
+    new_run = await Runs.put(run_create_stateless, scheduling)
     return await _wait_and_return_run_output(new_run.run_id)
 
 
@@ -283,9 +294,10 @@ async def create_stateless_run(
     run_create_stateless: Annotated[
         RunCreateStateless, Depends(_validate_run_create_stateless)
     ] = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(background_run_scheduling)] = None,
 ) -> RunStateless:
     """Create a stateless run, return the run ID immediately. Don&#39;t wait for the final run output."""
-    return await Runs.put(run_create_stateless)
+    return await Runs.put(run_create_stateless, scheduling)
 
 
 @router.delete(
@@ -370,12 +382,13 @@ async def resume_stateless_run(
         ..., description="The ID of the run."
     ),
     body: Optional[Any] = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(interactive_run_scheduling)] = None,
 ) -> RunStateless:
     """Provide the needed input to a run to resume its execution. Can only be called for runs that are in the interrupted state Schema of the provided input must match with the schema specified in the agent specs under interrupts for the interrupt type the agent generated for this specific interruption."""
     try:
         # TODO: This validation should be a dependency
         validate_resume_run(run_id, body)
-        return await Runs.resume(run_id, body)
+        return await Runs.resume(run_id, body, scheduling)
     except InvalidFormatException as e:
         raise HTTPException(
             status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
@@ -406,8 +419,13 @@ async def stream_stateless_run_output(
     run_id: Annotated[StrictStr, Field(description="The ID of the run.")] = Path(
         ..., description="The ID of the run."
     ),
+    last_event_id: Optional[int] = Header(
+        None,
+        alias="Last-Event-ID",
+        description="Id of the last event received, the stream resumes after it.",
+    ),
 ) -> RunOutputStream:
-    """Join the output stream of an existing run. This endpoint streams output in real-time from a run. Only output produced after this endpoint is called will be streamed."""
+    """Join the output stream of an existing run. This endpoint streams output in real-time from a run. The output produced before this endpoint is called is replayed while the run is buffered, from the event following &#x60;Last-Event-ID&#x60; if set."""
     try:
         run = Runs.get(run_id)
         if run is None:
@@ -416,7 +434,7 @@ async def stream_stateless_run_output(
                 detail=f"Run with ID {run_id} not found",
             )
         return StreamingResponse(
-            _stream_sse_events(Runs.stream_events(run_id)),
+            Runs.stream_frames(run_id, last_event_id),
             media_type="text/event-stream",
         )
     except HTTPException:
@@ -445,6 +463,17 @@ async def wait_for_stateless_run_output(
     run_id: Annotated[StrictStr, Field(description="The ID of the run.")] = Path(
         ..., description="The ID of the run."
     ),
+    timeout: Annotated[
+        Optional[float],
+        Field(
+            description="Maximum time to wait for the output, in seconds. When reached, the response is empty with status 204."
+        ),
+    ] = Query(
+        None,
+        description="Maximum time to wait for the output, in seconds. When reached, the response is empty with status 204.",
+        alias="timeout",
+        gt=0,
+    ),
 ) -> RunWaitResponseStateless:
     """Blocks waiting for the result of the run. The output can be:   * an interrupt, this happens when the agent run status is &#x60;interrupted&#x60;   * the final result of the run, this happens when the agent run status is &#x60;success&#x60;   * an error, this happens when the agent run status is &#x60;error&#x60; or &#x60;timeout&#x60;   This call blocks until the output is available."""
-    return await _wait_and_return_run_output(run_id)
+    return await _wait_and_return_run_output(run_id, timeout)
@@ -0,0 +1,88 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+# coding: utf-8
+
+from typing import Any, Dict, List
+
+from fastapi import APIRouter
+
+from agent_workflow_server.agents.lazy import LazyAgent
+from agent_workflow_server.agents.load import AGENTS
+from agent_workflow_server.services import queue
+from agent_workflow_server.services.retention import RETENTION_STATS
+from agent_workflow_server.services.runs import stream_manager
+from agent_workflow_server.services.webhooks import webhook_dispatcher
+
+router = APIRouter()
+
+
+@router.get(
+    "/stats/retention",
+    responses={
+        200: {"model": Dict[str, Any], "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get retention statistics",
+)
+async def get_retention_stats() -> Dict[str, Any]:
+    """Get statistics about the runs, outputs and stream resources reclaimed by the retention sweeper."""
+    return RETENTION_STATS.to_dict()
+
+
+@router.get(
+    "/stats/workers",
+    responses={
+        200: {"model": Dict[str, Any], "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get worker pool statistics",
+)
+async def get_worker_stats() -> Dict[str, Any]:
+    """Get the size of the worker pool, the number of queued runs and the moving averages of the run queue and execution times."""
+    if queue.WORKER_POOL is None:
+        return {"workers": 0}
+    return queue.WORKER_POOL.to_dict()
+
+
+@router.get(
+    "/stats/streams",
+    responses={
+        200: {"model": List[Dict[str, Any]], "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get stream subscriber statistics",
+)
+async def get_stream_stats() -> List[Dict[str, Any]]:
+    """Get the lag of each run stream subscriber and the messages dropped or coalesced because it did not keep up."""
+    return stream_manager.subscribers_stats()
+
+
+@router.get(
+    "/stats/webhooks",
+    responses={
+        200: {"model": Dict[str, Any], "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get webhook delivery statistics",
+)
+async def get_webhook_stats() -> Dict[str, Any]:
+    """Get the number of webhook deliveries waiting, in progress, delivered, failed, retried, coalesced or dropped, and their average latency."""
+    return webhook_dispatcher.to_dict()
+
+
+@router.get(
+    "/stats/agents",
+    responses={
+        200: {"model": Dict[str, Dict[str, Any]], "description": "Success"},
+    },
+    tags=["Stats"],
+    summary="Get agent loading statistics",
+)
+async def get_agent_stats() -> Dict[str, Dict[str, Any]]:
+    """Get, for each agent loaded on first use (AGWS_AGENTS_LAZY), whether it is loaded, its calls in progress, for how long it has been idle and how many times it was loaded and unloaded."""
+    return {
+        agent_id: agent_info.agent.to_dict()
+        for agent_id, agent_info in AGENTS.items()
+        if isinstance(agent_info.agent, LazyAgent)
+    }
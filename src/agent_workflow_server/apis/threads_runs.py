@@ -24,6 +24,10 @@ from typing_extensions import Annotated
 
 from agent_workflow_server.agents.base import ThreadsNotSupportedError
 from agent_workflow_server.agents.load import get_default_agent
+from agent_workflow_server.apis.scheduling import (
+    background_run_scheduling,
+    interactive_run_scheduling,
+)
 from agent_workflow_server.generated.models.extra_models import TokenModel  # noqa: F401
 from agent_workflow_server.generated.models.run_create_stateful import RunCreateStateful
 from agent_workflow_server.generated.models.run_error import RunError
@@ -34,6 +38,11 @@ from agent_workflow_server.generated.models.run_stateful import RunStateful
 from agent_workflow_server.generated.models.run_wait_response_stateful import (
     RunWaitResponseStateful,
 )
+from agent_workflow_server.services.queue import (
+    RunNotCancellableError,
+    RunNotFoundError,
+)
+from agent_workflow_server.services.scheduler import RunScheduling
 from agent_workflow_server.services.thread_runs import ThreadNotFoundError, ThreadRuns
 from agent_workflow_server.services.threads import PendingRunError, Threads
 from agent_workflow_server.services.validation import (
@@ -65,9 +74,11 @@ async def _validate_run_create(
         )
 
 
-async def _wait_and_return_run_output(run_id: str) -> RunWaitResponseStateful:
+async def _wait_and_return_run_output(
+    run_id: str, timeout: Optional[float] = None
+) -> RunWaitResponseStateful:
     try:
-        run, run_output = await ThreadRuns.wait_for_output(run_id)
+        run, run_output = await ThreadRuns.wait_for_output(run_id, timeout)
     except TimeoutError:
         return Response(status_code=status.HTTP_204_NO_CONTENT)
     except InvalidFormatException as e:
@@ -97,6 +108,7 @@ async def _wait_and_return_run_output(run_id: str) -> RunWaitResponseStateful:
     responses={
         204: {"description": "Success"},
         404: {"model": str, "description": "Not Found"},
+        409: {"model": str, "description": "Conflict"},
         422: {"model": str, "description": "Validation Error"},
     },
     tags=["Thread Runs"],
@@ -122,7 +134,17 @@ async def cancel_thread_run(
         alias="action",
     ),
 ) -> None:
-    raise HTTPException(status_code=500, detail="Not implemented")
+    """Cancel a pending run of a thread. With &#x60;wait&#x60;, return once the run execution has stopped."""
+    try:
+        await ThreadRuns.cancel(thread_id, run_id, action, wait)
+    except (ThreadNotFoundError, RunNotFoundError) as e:
+        raise HTTPException(status.HTTP_404_NOT_FOUND, detail=str(e))
+    except RunNotCancellableError as e:
+        raise HTTPException(status.HTTP_409_CONFLICT, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status.HTTP_422_UNPROCESSABLE_ENTITY, detail=str(e))
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 
 @router.post(
@@ -169,10 +191,11 @@ async def create_and_wait_for_thread_run_output(
         ..., description="The ID of the thread."
     ),
     run_create_stateful: RunCreateStateful = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(interactive_run_scheduling)] = None,
 ) -> RunWaitResponseStateful:
     """Create a run on a thread and block waiting for its output. See &#39;GET /runs/{run_id}/wait&#39; for details on the return values."""
     try:
-        new_run = await ThreadRuns.put(run_create_stateful, thread_id)
+        new_run = await ThreadRuns.put(run_create_stateful, thread_id, scheduling)
     except ThreadNotFoundError as e:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail=str(e))
     except PendingRunError as e:
@@ -199,10 +222,11 @@ async def create_thread_run(
         ..., description="The ID of the thread."
     ),
     run_create_stateful: RunCreateStateful = Body(None, description=""),
+    scheduling: Annotated[RunScheduling, Depends(background_run_scheduling)] = None,
 ) -> RunStateful:
     """Create a run on a thread, return the run ID immediately. Don&#39;t wait for the final run output."""
     try:
-        return ThreadRuns.put(run_create_stateful, thread_id)
+        return await ThreadRuns.put(run_create_stateful, thread_id, scheduling)
     except ThreadNotFoundError as e:
         raise HTTPException(status.HTTP_404_NOT_FOUND, detail=str(e))
     except PendingRunError as e:
@@ -369,6 +393,17 @@ async def wait_for_thread_run_output(
     run_id: Annotated[StrictStr, Field(description="The ID of the run.")] = Path(
         ..., description="The ID of the run."
     ),
+    timeout: Annotated[
+        Optional[float],
+        Field(
+            description="Maximum time to wait for the output, in seconds. When reached, the response is empty with status 204."
+        ),
+    ] = Query(
+        None,
+        description="Maximum time to wait for the output, in seconds. When reached, the response is empty with status 204.",
+        alias="timeout",
+        gt=0,
+    ),
 ) -> RunWaitResponseStateful:
     """Blocks waiting for the result of the run. See &#39;GET /runs/{run_id}/wait&#39; for details on the return values."""
     try:
@@ -383,4 +418,4 @@ async def wait_for_thread_run_output(
 
     # TODO check if given thread has the give run
 
-    return await _wait_and_return_run_output(run_id)
+    return await _wait_and_return_run_output(run_id, timeout)
@@ -0,0 +1,276 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+# coding: utf-8
+
+import asyncio
+import json
+import logging
+import os
+import struct
+from typing import Any, Dict, Optional, Set
+
+from fastapi import APIRouter, HTTPException, WebSocket, WebSocketDisconnect, status
+
+from agent_workflow_server.apis.authentication import API_KEY_NAME, check_api_key
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.runs import Runs, stream_manager
+from agent_workflow_server.services.sse import dumps, encode_frame, frame_data
+from agent_workflow_server.storage.storage import DB
+
+logger = logging.getLogger(__name__)
+
+router = APIRouter()
+
+DEFAULT_WS_INITIAL_CREDIT = 256
+DEFAULT_WS_MAX_SUBSCRIPTIONS = 1000
+
+# Binary frames sent to the client:
+#   kind (1 byte) | seq (8 bytes) | run_id length (2 bytes) | run_id | JSON payload
+# kind is FRAME_EVENT for run stream events (seq is their SSE event id, the
+# payload their SSE data) and FRAME_CONTROL for the replies to the commands
+# and the end of the run streams.
+FRAME_EVENT = 1
+FRAME_CONTROL = 2
+_FRAME_HEADER = struct.Struct("!BQH")
+MAX_RUN_ID_BYTES = 0xFFFF
+
+
+def encode_ws_frame(kind: int, run_id: str, seq: int, payload: Any) -> bytes:
+    channel = run_id.encode("utf-8")
+    if len(channel) > MAX_RUN_ID_BYTES:
+        raise ValueError(f"run_id longer than {MAX_RUN_ID_BYTES} bytes")
+    return b"".join((_FRAME_HEADER.pack(kind, seq, len(channel)), channel, payload))
+
+
+def decode_ws_frame(frame: bytes) -> tuple[int, str, int, bytes]:
+    """Inverse of `encode_ws_frame`: kind, run_id, seq and payload"""
+    kind, seq, length = _FRAME_HEADER.unpack_from(frame)
+    start = _FRAME_HEADER.size
+    run_id = frame[start : start + length].decode("utf-8")
+    return kind, run_id, seq, frame[start + length :]
+
+
+class RunStreamsConnection:
+    """Run streams multiplexed over one WebSocket.
+
+    The client sends JSON commands:
+        {"op": "subscribe", "run_id": ..., "last_event_id": ...}
+        {"op": "subscribe", "thread_id": ...}
+        {"op": "unsubscribe", "run_id": ...} or {"op": "unsubscribe", "thread_id": ...}
+        {"op": "credit", "n": ...}
+    Events are only sent while the client has credit, each event takes one.
+    A run stream waiting for credit stops reading its subscriber queue, whose
+    overflow policy then applies."""
+
+    def __init__(
+        self, websocket: WebSocket, initial_credit: int, max_subscriptions: int
+    ):
+        self.websocket = websocket
+        self.credit = initial_credit
+        self.max_subscriptions = max_subscriptions
+        self._credit_available = asyncio.Event()
+        if self.credit > 0:
+            self._credit_available.set()
+        self._send_lock = asyncio.Lock()
+        self.runs: Dict[str, asyncio.Task] = {}
+        # Thread of the runs subscribed through a thread subscription
+        self._run_threads: Dict[str, str] = {}
+        self.threads: Set[str] = set()
+        self._pending: Set[asyncio.Task] = set()
+
+    async def _send(self, frame: bytes) -> None:
+        async with self._send_lock:
+            await self.websocket.send_bytes(frame)
+
+    async def send_control(self, run_id: str, payload: Dict[str, Any]) -> None:
+        await self._send(encode_ws_frame(FRAME_CONTROL, run_id, 0, dumps(payload)))
+
+    async def _take_credit(self) -> None:
+        while self.credit <= 0:
+            self._credit_available.clear()
+            await self._credit_available.wait()
+        self.credit -= 1
+
+    def add_credit(self, n: int) -> None:
+        self.credit += n
+        if self.credit > 0:
+            self._credit_available.set()
+
+    async def _forward(self, run_id: str, last_event_id: Optional[int]) -> None:
+        try:
+            async for message in Runs.Stream.join(run_id, last_event_id):
+                if message.type == "control":
+                    if message.data == "done":
+                        await self.send_control(run_id, {"type": "done"})
+                        break
+                    # The WebSocket has its own keep-alive
+                    continue
+                await self._take_credit()
+                await self._send(self._event_frame(run_id, message))
+        except ValueError as e:
+            await self.send_control(run_id, {"type": "error", "detail": str(e)})
+        except WebSocketDisconnect:
+            pass
+        finally:
+            # Unless unsubscribed and subscribed again meanwhile
+            if self.runs.get(run_id) is asyncio.current_task():
+                del self.runs[run_id]
+                self._run_threads.pop(run_id, None)
+
+    @staticmethod
+    def _event_frame(run_id: str, message: Message) -> bytes:
+        if message.frame is None:
+            message.frame = encode_frame(run_id, DB.get_run_status(run_id), message)
+        return encode_ws_frame(
+            FRAME_EVENT, run_id, message.seq or 0, frame_data(message.frame)
+        )
+
+    async def subscribe_run(
+        self,
+        run_id: str,
+        last_event_id: Optional[int] = None,
+        thread_id: Optional[str] = None,
+    ) -> None:
+        if run_id in self.runs:
+            return
+        if len(self.runs) >= self.max_subscriptions:
+            await self.send_control(
+                run_id,
+                {
+                    "type": "error",
+                    "detail": f"Too many subscriptions (max {self.max_subscriptions})",
+                },
+            )
+            return
+        if thread_id is not None:
+            self._run_threads[run_id] = thread_id
+        self.runs[run_id] = asyncio.create_task(self._forward(run_id, last_event_id))
+        await self.send_control(
+            run_id, {"type": "subscribed", "run_id": run_id, "thread_id": thread_id}
+        )
+
+    def _on_thread_run(self, run_id: str) -> None:
+        run = DB.get_run(run_id)
+        if run is not None and run["thread_id"] in self.threads:
+            task = asyncio.create_task(
+                self.subscribe_run(run_id, thread_id=run["thread_id"])
+            )
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def subscribe_thread(self, thread_id: str) -> None:
+        if thread_id in self.threads:
+            return
+        if DB.get_thread(thread_id) is None:
+            await self.send_control(
+                "",
+                {
+                    "type": "error",
+                    "thread_id": thread_id,
+                    "detail": f"Thread {thread_id} not found",
+                },
+            )
+            return
+        self.threads.add(thread_id)
+        stream_manager.watch_thread(thread_id, self._on_thread_run)
+        for run in DB.search_run({"thread_id": thread_id, "status": "pending"}):
+            await self.subscribe_run(run["run_id"], thread_id=thread_id)
+
+    def unsubscribe_run(self, run_id: str) -> None:
+        task = self.runs.pop(run_id, None)
+        self._run_threads.pop(run_id, None)
+        if task is not None:
+            task.cancel()
+
+    def unsubscribe_thread(self, thread_id: str) -> None:
+        if thread_id not in self.threads:
+            return
+        self.threads.discard(thread_id)
+        stream_manager.unwatch_thread(thread_id, self._on_thread_run)
+        for run_id, run_thread_id in list(self._run_threads.items()):
+            if run_thread_id == thread_id:
+                self.unsubscribe_run(run_id)
+
+    @staticmethod
+    def _run_id(command: Dict[str, Any]) -> str:
+        run_id = str(command["run_id"])
+        # Sent back in the header of the frames
+        if len(run_id.encode("utf-8")) > MAX_RUN_ID_BYTES:
+            raise ValueError(f'"run_id" longer than {MAX_RUN_ID_BYTES} bytes')
+        return run_id
+
+    async def handle(self, command: Dict[str, Any]) -> None:
+        op = command.get("op")
+        if op == "credit":
+            n = command.get("n")
+            if not isinstance(n, int) or n < 1:
+                raise ValueError('"n" must be a positive integer')
+            self.add_credit(n)
+        elif op == "subscribe" and command.get("run_id"):
+            last_event_id = command.get("last_event_id")
+            if last_event_id is not None and not isinstance(last_event_id, int):
+                raise ValueError('"last_event_id" must be an integer')
+            await self.subscribe_run(self._run_id(command), last_event_id)
+        elif op == "subscribe" and command.get("thread_id"):
+            await self.subscribe_thread(str(command["thread_id"]))
+        elif op == "unsubscribe" and command.get("run_id"):
+            run_id = self._run_id(command)
+            self.unsubscribe_run(run_id)
+            await self.send_control(run_id, {"type": "unsubscribed"})
+        elif op == "unsubscribe" and command.get("thread_id"):
+            self.unsubscribe_thread(str(command["thread_id"]))
+            await self.send_control(
+                "", {"type": "unsubscribed", "thread_id": command["thread_id"]}
+            )
+        else:
+            raise ValueError(f"Invalid command: {command}")
+
+    async def close(self) -> None:
+        for thread_id in list(self.threads):
+            self.unsubscribe_thread(thread_id)
+        tasks = [*self._pending, *self.runs.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+@router.websocket("/ws")
+async def run_streams_websocket(websocket: WebSocket):
+    """Stream the output of many runs over one WebSocket. See RunStreamsConnection
+    for the commands and encode_ws_frame for the frames."""
+    try:
+        check_api_key(websocket.headers.get(API_KEY_NAME))
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    connection = RunStreamsConnection(
+        websocket,
+        initial_credit=int(
+            os.getenv("AGWS_WS_INITIAL_CREDIT", DEFAULT_WS_INITIAL_CREDIT)
+        ),
+        max_subscriptions=int(
+            os.getenv("AGWS_WS_MAX_SUBSCRIPTIONS", DEFAULT_WS_MAX_SUBSCRIPTIONS)
+        ),
+    )
+    try:
+        while True:
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+            try:
+                data = message.get("bytes") or message.get("text")
+                if data is None:
+                    raise ValueError("Commands are sent in text or binary frames")
+                command = json.loads(data)
+                if not isinstance(command, dict):
+                    raise ValueError("Commands are JSON objects")
+                await connection.handle(command)
+            except ValueError as e:
+                await connection.send_control("", {"type": "error", "detail": str(e)})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await connection.close()
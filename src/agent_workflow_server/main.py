@@ -5,36 +5,106 @@ import logging
 import os
 import signal
 import sys
+from contextlib import asynccontextmanager
 
 import uvicorn
 from dotenv import find_dotenv, load_dotenv
 from fastapi import Depends, FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
-from agent_workflow_server.agents.load import load_agents
+from agent_workflow_server.agents.lazy import (
+    load_lazy_loading_policy,
+    start_agent_unloader,
+)
+from agent_workflow_server.agents.load import AGENTS, load_agents
 from agent_workflow_server.apis.agents import public_router as PublicAgentsApiRouter
 from agent_workflow_server.apis.agents import router as AgentsApiRouter
 from agent_workflow_server.apis.authentication import (
     authentication_with_api_key,
     setup_api_key_auth,
 )
+from agent_workflow_server.apis.dead_letters import router as DeadLettersApiRouter
+from agent_workflow_server.apis.metrics import router as MetricsApiRouter
 from agent_workflow_server.apis.stateless_runs import router as StatelessRunsApiRouter
+from agent_workflow_server.apis.stats import router as StatsApiRouter
 from agent_workflow_server.apis.threads import router as ThreadsApiRouter
 from agent_workflow_server.apis.threads_runs import router as ThreadRunsApiRouter
-from agent_workflow_server.services.queue import start_workers
+from agent_workflow_server.apis.websocket import router as WebSocketApiRouter
+from agent_workflow_server.services.broker import connect_broker, start_broker
+from agent_workflow_server.services.queue import cancel_held_run, start_workers
+from agent_workflow_server.services.retention import (
+    load_retention_policy,
+    start_retention_sweeper,
+)
+from agent_workflow_server.services.runs import (
+    notify_run_status,
+    replay_buffered,
+    stream_manager,
+)
+from agent_workflow_server.services.tracing import TracingMiddleware, setup_tracing
+from agent_workflow_server.services.webhooks import webhook_dispatcher
 
 load_dotenv(dotenv_path=find_dotenv(usecwd=True))
 
 DEFAULT_HOST = "127.0.0.1"
 DEFAULT_PORT = 8000
 DEFAULT_NUM_WORKERS = 5
+DEFAULT_API_WORKERS = 1
 DEFAULT_AGENT_MANIFEST_PATH = "manifest.json"
 
+# Set by the main process for the API processes of the multi-process mode
+BROKER_SOCKET_ENV = "AGWS_BROKER_SOCKET"
+
 logger = logging.getLogger(__name__)
 
+
+def _start_agents(loop: asyncio.AbstractEventLoop):
+    """Load the agents and start the background tasks executing their runs"""
+    agents_ref = os.getenv("AGENTS_REF", None)
+    agent_manifest_path = os.getenv("AGENT_MANIFEST_PATH", DEFAULT_AGENT_MANIFEST_PATH)
+    load_agents(agents_ref, [agent_manifest_path])
+    n_workers = int(os.getenv("NUM_WORKERS", DEFAULT_NUM_WORKERS))
+
+    loop.create_task(start_workers(n_workers))
+
+    retention_policy = load_retention_policy()
+    if retention_policy.enabled:
+        loop.create_task(start_retention_sweeper(retention_policy))
+
+    lazy_loading_policy = load_lazy_loading_policy()
+    if lazy_loading_policy.enabled and lazy_loading_policy.idle_ttl is not None:
+        loop.create_task(
+            start_agent_unloader(
+                lambda: [info.agent for info in AGENTS.values()], lazy_loading_policy
+            )
+        )
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    broker_path = os.getenv(BROKER_SOCKET_ENV)
+    if broker_path:
+        # API process of the multi-process mode: it executes the runs it accepts,
+        # the other processes get their messages through the broker
+        _start_agents(asyncio.get_running_loop())
+        client = await connect_broker(
+            broker_path,
+            on_message=stream_manager.put_message,
+            on_status=notify_run_status,
+            # Runs are cancelled and replayed by the process holding them
+            handlers={"cancel": cancel_held_run, "replay": replay_buffered},
+        )
+        yield
+        await client.close()
+    else:
+        yield
+    await webhook_dispatcher.aclose()
+
+
 app = FastAPI(
     title="Agent Workflow Server",
     version="0.1",
+    lifespan=lifespan,
 )
 
 setup_api_key_auth(app)
@@ -61,6 +131,26 @@ app.include_router(
     dependencies=[Depends(authentication_with_api_key)],
 )
 
+app.include_router(
+    router=StatsApiRouter,
+    dependencies=[Depends(authentication_with_api_key)],
+)
+
+app.include_router(
+    router=MetricsApiRouter,
+    dependencies=[Depends(authentication_with_api_key)],
+)
+
+app.include_router(
+    router=DeadLettersApiRouter,
+    dependencies=[Depends(authentication_with_api_key)],
+)
+
+# The WebSocket endpoint checks the API key itself, before accepting the connection
+app.include_router(
+    router=WebSocketApiRouter,
+)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=os.getenv("CORS_ALLOWED_ORIGINS", "*").split(","),
@@ -69,23 +159,48 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost, so that the request span covers the other middlewares
+if setup_tracing():
+    app.add_middleware(TracingMiddleware)
+
 
 def signal_handler(sig, frame):
     logger.warning(f"Received {signal.Signals(sig).name}. Exiting...")
     sys.exit(0)
 
 
+def _check_shared_storage():
+    """The API processes share the runs and threads through the database"""
+    if (
+        os.getenv("AGWS_STORAGE_BACKEND", "memory").lower() != "sqlite"
+        or os.getenv("AGWS_STORAGE_PERSIST", "True") != "True"
+    ):
+        raise ValueError(
+            "AGWS_API_WORKERS > 1 requires AGWS_STORAGE_BACKEND=sqlite and AGWS_STORAGE_PERSIST=True"
+        )
+
+
 def start():
     try:
         signal.signal(signal.SIGINT, signal_handler)
         signal.signal(signal.SIGTERM, signal_handler)
 
-        agents_ref = os.getenv("AGENTS_REF", None)
-        agent_manifest_path = os.getenv(
-            "AGENT_MANIFEST_PATH", DEFAULT_AGENT_MANIFEST_PATH
-        )
-        load_agents(agents_ref, [agent_manifest_path])
-        n_workers = int(os.getenv("NUM_WORKERS", DEFAULT_NUM_WORKERS))
+        host = os.getenv("API_HOST", DEFAULT_HOST) or DEFAULT_HOST
+        port = int(os.getenv("API_PORT", DEFAULT_PORT)) or DEFAULT_PORT
+
+        n_api_workers = int(os.getenv("AGWS_API_WORKERS", DEFAULT_API_WORKERS))
+        if n_api_workers > 1:
+            _check_shared_storage()
+            os.environ[BROKER_SOCKET_ENV] = start_broker()
+            # The API processes load the agents on startup, see lifespan
+            uvicorn.run(
+                "agent_workflow_server.main:app",
+                host=host,
+                port=port,
+                workers=n_api_workers,
+                loop="asyncio",
+            )
+            return
 
         try:
             loop = asyncio.get_running_loop()
@@ -93,13 +208,13 @@ def start():
             loop = asyncio.new_event_loop()
             asyncio.set_event_loop(loop)
 
-        loop.create_task(start_workers(n_workers))
+        _start_agents(loop)
 
         # use module import method to support reload argument
         config = uvicorn.Config(
             "agent_workflow_server.main:app",
-            host=os.getenv("API_HOST", DEFAULT_HOST) or DEFAULT_HOST,
-            port=int(os.getenv("API_PORT", DEFAULT_PORT)) or DEFAULT_PORT,
+            host=host,
+            port=port,
             loop="asyncio",
         )
         server = uvicorn.Server(config)
@@ -0,0 +1,312 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import atexit
+import itertools
+import logging
+import os
+import pickle
+import shutil
+import struct
+import tempfile
+import threading
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from .message import Message
+
+logger = logging.getLogger(__name__)
+
+# Frames are pickled tuples prefixed with their length:
+#   ("sub", run_id, token) -> ("ack", token)
+#   ("unsub", run_id)
+#   ("message", run_id, Message)
+#   ("status", run_id)
+#   ("request", run_id, token, kind, args) -> ("reply", token, results)
+# Requests are forwarded to all the other processes, which reply with the
+# result of their handler for `kind`, None when they do not hold the run. The
+# requester gets the results that are not None once all the processes replied.
+_HEADER = struct.Struct("!I")
+
+RequestHandler = Callable[..., Awaitable[Any]]
+
+
+async def _read_frame(reader: asyncio.StreamReader) -> Any:
+    header = await reader.readexactly(_HEADER.size)
+    (size,) = _HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(size))
+
+
+def _write_frame(writer: asyncio.StreamWriter, frame: Any) -> None:
+    data = pickle.dumps(frame)
+    writer.write(_HEADER.pack(len(data)) + data)
+
+
+class Broker:
+    """Relays the stream messages and status changes of runs between the API
+    processes. Each process subscribes to the runs its clients are waiting on,
+    messages are forwarded to the subscribers only."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._subscribers: Dict[str, Set[asyncio.StreamWriter]] = {}
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._requests: Dict[int, _Request] = {}
+        self._tokens = itertools.count()
+
+    async def serve(self) -> asyncio.AbstractServer:
+        return await asyncio.start_unix_server(self._handle, path=self.path)
+
+    async def _handle(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self._writers.add(writer)
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                kind = frame[0]
+                if kind == "sub":
+                    self._subscribers.setdefault(frame[1], set()).add(writer)
+                    _write_frame(writer, ("ack", frame[2]))
+                elif kind == "unsub":
+                    self._unsubscribe(frame[1], writer)
+                elif kind == "request":
+                    self._forward_request(writer, frame)
+                elif kind == "reply":
+                    request = self._requests.get(frame[1])
+                    if request is not None:
+                        request.reply(writer, frame[2])
+                else:
+                    for subscriber in self._subscribers.get(frame[1], ()):
+                        if subscriber is not writer:
+                            _write_frame(subscriber, frame)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            for run_id in list(self._subscribers):
+                self._unsubscribe(run_id, writer)
+            for request in list(self._requests.values()):
+                # No reply from a process that is gone
+                request.reply(writer, None)
+            writer.close()
+
+    def _unsubscribe(self, run_id: str, writer: asyncio.StreamWriter) -> None:
+        subscribers = self._subscribers.get(run_id)
+        if subscribers is not None:
+            subscribers.discard(writer)
+            if not subscribers:
+                del self._subscribers[run_id]
+
+    def _forward_request(self, writer: asyncio.StreamWriter, frame: Tuple) -> None:
+        _, run_id, token, kind, args = frame
+        broker_token = next(self._tokens)
+        request = _Request(
+            writer,
+            token,
+            {other for other in self._writers if other is not writer},
+            lambda: self._requests.pop(broker_token, None),
+        )
+        self._requests[broker_token] = request
+        for other in request.waiting:
+            _write_frame(other, ("request", run_id, broker_token, kind, args))
+        request.complete_if_done()
+
+
+class _Request:
+    """Request forwarded by the broker, waiting for the replies of the other
+    processes"""
+
+    def __init__(
+        self,
+        requester: asyncio.StreamWriter,
+        token: int,
+        waiting: Set[asyncio.StreamWriter],
+        on_complete: Callable[[], Any],
+    ):
+        self.requester = requester
+        self.token = token
+        self.waiting = waiting
+        self.results: List[Any] = []
+        self._on_complete = on_complete
+
+    def reply(self, writer: asyncio.StreamWriter, result: Any) -> None:
+        if writer is self.requester:
+            # The requester is gone
+            self.waiting.clear()
+            self._on_complete()
+            return
+        if writer not in self.waiting:
+            return
+        self.waiting.discard(writer)
+        if result is not None:
+            self.results.append(result)
+        self.complete_if_done()
+
+    def complete_if_done(self) -> None:
+        if not self.waiting:
+            self._on_complete()
+            if not self.requester.is_closing():
+                _write_frame(self.requester, ("reply", self.token, self.results))
+
+
+def start_broker() -> str:
+    """Start the broker on a background thread, returns its socket path. The
+    socket directory is removed at exit."""
+    directory = tempfile.mkdtemp(prefix="agws-")
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    path = os.path.join(directory, "broker.sock")
+    started = threading.Event()
+
+    async def run():
+        server = await Broker(path).serve()
+        started.set()
+        async with server:
+            await server.serve_forever()
+
+    threading.Thread(
+        target=asyncio.run, args=(run(),), name="agws-broker", daemon=True
+    ).start()
+    started.wait()
+    logger.info(f"Broker listening on {path}")
+    return path
+
+
+class BrokerClient:
+    """Connection of an API process to the broker. `handlers` answer the
+    requests of the other processes by kind, see `request`."""
+
+    def __init__(
+        self,
+        path: str,
+        on_message: Callable[[str, Message], Awaitable[None]],
+        on_status: Callable[[str], Awaitable[None]],
+        handlers: Optional[Dict[str, RequestHandler]] = None,
+    ):
+        self.path = path
+        self._on_message = on_message
+        self._on_status = on_status
+        self._handlers = dict(handlers or {})
+        # Subscribed runs -> ack of their subscription by the broker
+        self._subscribed: Dict[str, asyncio.Future] = {}
+        # Subscribed runs -> number of local waiters
+        self._subscriptions: Dict[str, int] = {}
+        self._acks: Dict[int, asyncio.Future] = {}
+        self._replies: Dict[int, asyncio.Future] = {}
+        self._handling: Set[asyncio.Task] = set()
+        self._tokens = itertools.count()
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def connect(self) -> None:
+        reader, self._writer = await asyncio.open_unix_connection(self.path)
+        self._task = asyncio.create_task(self._read_loop(reader))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+        if self._writer is not None:
+            self._writer.close()
+
+    async def subscribe(self, run_id: str) -> None:
+        """Receive the messages published by the other processes for the run,
+        until `unsubscribe` is called as many times. Returns once the broker
+        registered the subscription."""
+        ack = self._subscribed.get(run_id)
+        if ack is None:
+            token = next(self._tokens)
+            ack = self._subscribed[run_id] = asyncio.get_running_loop().create_future()
+            self._acks[token] = ack
+            _write_frame(self._writer, ("sub", run_id, token))
+        self._subscriptions[run_id] = self._subscriptions.get(run_id, 0) + 1
+        try:
+            # Shared by the waiters of the run, not cancelled with one of them
+            await asyncio.shield(ack)
+        except BaseException:
+            self.unsubscribe(run_id)
+            raise
+
+    def unsubscribe(self, run_id: str) -> None:
+        """End a subscription of `subscribe`"""
+        count = self._subscriptions.get(run_id, 0) - 1
+        if count > 0:
+            self._subscriptions[run_id] = count
+            return
+        self._subscriptions.pop(run_id, None)
+        if self._subscribed.pop(run_id, None) is not None:
+            _write_frame(self._writer, ("unsub", run_id))
+
+    async def request(self, run_id: str, kind: str, *args: Any) -> List[Any]:
+        """Call the `kind` handler of the other processes, returns the results
+        of the ones holding the run. Errors of the handlers are returned as
+        results."""
+        token = next(self._tokens)
+        reply = self._replies[token] = asyncio.get_running_loop().create_future()
+        _write_frame(self._writer, ("request", run_id, token, kind, args))
+        try:
+            return await reply
+        finally:
+            self._replies.pop(token, None)
+
+    def publish(self, run_id: str, message: Message) -> None:
+        _write_frame(self._writer, ("message", run_id, message))
+
+    def notify_status(self, run_id: str) -> None:
+        _write_frame(self._writer, ("status", run_id))
+
+    async def _read_loop(self, reader: asyncio.StreamReader) -> None:
+        try:
+            while True:
+                frame = await _read_frame(reader)
+                kind = frame[0]
+                try:
+                    if kind == "ack":
+                        self._acks.pop(frame[1]).set_result(None)
+                    elif kind == "message":
+                        await self._on_message(frame[1], frame[2])
+                    elif kind == "status":
+                        await self._on_status(frame[1])
+                    elif kind == "request":
+                        # Handlers may wait, e.g. for a cancelled run to stop
+                        task = asyncio.create_task(self._handle_request(*frame[1:]))
+                        self._handling.add(task)
+                        task.add_done_callback(self._handling.discard)
+                    elif kind == "reply":
+                        reply = self._replies.get(frame[1])
+                        if reply is not None and not reply.done():
+                            reply.set_result(frame[2])
+                except Exception as e:
+                    logger.error(f"Failed to handle broker frame {kind}: {e}")
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error("Connection to the broker lost")
+
+    async def _handle_request(
+        self, run_id: str, token: int, kind: str, args: Tuple
+    ) -> None:
+        handler = self._handlers.get(kind)
+        try:
+            result = await handler(run_id, *args) if handler is not None else None
+        except Exception as e:
+            result = e
+        _write_frame(self._writer, ("reply", token, result))
+
+
+_CLIENT: Optional[BrokerClient] = None
+
+
+def get_broker_client() -> Optional[BrokerClient]:
+    """The broker connection, None when the server runs a single process"""
+    return _CLIENT
+
+
+async def connect_broker(
+    path: str,
+    on_message: Callable[[str, Message], Awaitable[None]],
+    on_status: Callable[[str], Awaitable[None]],
+    handlers: Optional[Dict[str, RequestHandler]] = None,
+) -> BrokerClient:
+    global _CLIENT
+    client = BrokerClient(path, on_message, on_status, handlers)
+    await client.connect()
+    _CLIENT = client
+    return client
@@ -0,0 +1,67 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+from agent_workflow_server.storage.models import Run
+
+logger = logging.getLogger(__name__)
+
+# Final run (None if deleted) and its output
+Completion = Tuple[Optional[Run], Any]
+
+
+class _Waiters:
+    __slots__ = ("future", "count")
+
+    def __init__(self, future: asyncio.Future):
+        self.future = future
+        self.count = 0
+
+
+class CompletionRegistry:
+    """One future per awaited run, shared by all its local waiters.
+
+    The future is resolved once, when the run stops being pending, and
+    removed from the registry at that point: a resumed run gets a new one.
+    It is also removed when its last waiter leaves, e.g. on timeout, so the
+    registry only holds the runs someone is waiting for."""
+
+    def __init__(self):
+        self._waiters: Dict[str, _Waiters] = {}
+
+    def __len__(self) -> int:
+        return len(self._waiters)
+
+    def __contains__(self, run_id: str) -> bool:
+        return run_id in self._waiters
+
+    async def wait(self, run_id: str, timeout: Optional[float] = None) -> Completion:
+        """Wait for the completion of a pending run. Raise TimeoutError after
+        `timeout` seconds. The caller must check the run is pending before,
+        without awaiting in between."""
+        waiters = self._waiters.get(run_id)
+        if waiters is None:
+            waiters = _Waiters(asyncio.get_running_loop().create_future())
+            self._waiters[run_id] = waiters
+        waiters.count += 1
+        try:
+            # Shielded: a waiter timing out must not cancel the shared future
+            return await asyncio.wait_for(asyncio.shield(waiters.future), timeout)
+        finally:
+            waiters.count -= 1
+            if waiters.count == 0 and self._waiters.get(run_id) is waiters:
+                del self._waiters[run_id]
+
+    def resolve(self, run_id: str, run: Optional[Run], output: Any) -> bool:
+        """Resolve the waiters of a run with its final state. Return whether
+        there were any."""
+        waiters = self._waiters.pop(run_id, None)
+        if waiters is None:
+            return False
+        if not waiters.future.done():
+            waiters.future.set_result((run, output))
+        logger.debug(f"Run {run_id} completion sent to {waiters.count} waiters")
+        return True
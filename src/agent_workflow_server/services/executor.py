@@ -0,0 +1,260 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+# Keep the top level imports of this module light: it is imported by the
+# executor processes before they disable the persistence of their database.
+import asyncio
+import logging
+import multiprocessing
+import os
+from abc import ABC, abstractmethod
+from contextlib import aclosing
+from multiprocessing.connection import Connection
+from typing import AsyncGenerator, Callable, List, Optional
+
+from agent_workflow_server.storage.models import Run
+
+from . import tracing
+from .message import Message
+from .metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_AGENT_MANIFEST_PATH = "manifest.json"
+
+
+class Executor(ABC):
+    """Executes agent runs and streams their messages"""
+
+    async def start(self) -> None:
+        pass
+
+    async def stop(self) -> None:
+        pass
+
+    @abstractmethod
+    def stream(self, run: Run) -> AsyncGenerator[Message, None]:
+        pass
+
+
+class LoopExecutor(Executor):
+    """Executes the runs on the server event loop"""
+
+    def stream(self, run: Run) -> AsyncGenerator[Message, None]:
+        from .stream import stream_run
+
+        return stream_run(run)
+
+
+class RunExecutionError(Exception):
+    """Raised when a run fails in an executor process"""
+
+
+def _process_main(
+    conn: Connection,
+    agents_ref: Optional[str],
+    manifest_paths: List[str],
+    initializer: Optional[Callable[[], None]],
+) -> None:
+    """Entry point of an executor process: loads the agents, then executes the
+    runs received on `conn` sending back their messages. Its spans are
+    exported like the server ones, its metrics are sent back after each run."""
+    # The process only executes runs, the server process owns the database
+    os.environ["AGWS_STORAGE_BACKEND"] = "memory"
+    os.environ["AGWS_STORAGE_PERSIST"] = "False"
+
+    from agent_workflow_server.agents.load import load_agents
+    from agent_workflow_server.utils.tools import make_serializable
+
+    from .stream import stream_run
+
+    if initializer is not None:
+        initializer()
+    tracing.setup_tracing()
+    load_agents(agents_ref, manifest_paths)
+
+    async def execute(run: Run, trace_context: Optional[tracing.Carrier]):
+        # The spans of the run are children of the span executing it
+        with tracing.use_context(trace_context):
+            # Closed on interrupt, ending its span before it is exported
+            async with aclosing(stream_run(run)) as stream:
+                async for message in stream:
+                    message.data = make_serializable(message.data)
+                    conn.send(("message", message))
+                    if message.type == "interrupt":
+                        break
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    while True:
+        try:
+            request = conn.recv()
+        except (EOFError, KeyboardInterrupt):
+            break
+        if request is None:
+            break
+        try:
+            loop.run_until_complete(execute(*request))
+            result = ("done", None)
+        except Exception as error:
+            result = ("error", RunExecutionError(str(error)))
+        conn.send(("metrics", REGISTRY.take_updates()))
+        conn.send(result)
+        # The process is killed when the consumer of a run stops early
+        tracing.flush()
+
+
+class _ExecutorProcess:
+    def __init__(self, context, args):
+        self._context = context
+        self._args = args
+        self.conn: Optional[Connection] = None
+        self.process = None
+
+    def spawn(self) -> None:
+        self.conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(
+            target=_process_main,
+            args=(child_conn, *self._args),
+            name="agws-executor",
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+    def kill(self) -> None:
+        if self.process is not None and self.process.is_alive():
+            self.process.kill()
+            self.process.join()
+        if self.conn is not None:
+            self.conn.close()
+
+    def respawn(self) -> None:
+        self.kill()
+        self.spawn()
+
+
+class ProcessExecutor(Executor):
+    """Executes the runs in a pool of processes, each one loading the agents.
+    Messages are streamed back to the server process over pipes."""
+
+    def __init__(
+        self,
+        n_processes: int,
+        agents_ref: Optional[str],
+        manifest_paths: List[str],
+        initializer: Optional[Callable[[], None]] = None,
+    ):
+        self.n_processes = n_processes
+        context = multiprocessing.get_context("spawn")
+        self._processes = [
+            _ExecutorProcess(context, (agents_ref, manifest_paths, initializer))
+            for _ in range(n_processes)
+        ]
+        self._idle: Optional[asyncio.Queue] = None
+
+    async def start(self) -> None:
+        logger.info(f"Starting {self.n_processes} executor processes")
+        self._idle = asyncio.Queue()
+        for process in self._processes:
+            process.spawn()
+            self._idle.put_nowait(process)
+
+    async def stop(self) -> None:
+        for process in self._processes:
+            process.kill()
+
+    async def stream(self, run: Run) -> AsyncGenerator[Message, None]:
+        process: _ExecutorProcess = await self._idle.get()
+        loop = asyncio.get_running_loop()
+        received: asyncio.Queue = asyncio.Queue()
+
+        def on_readable():
+            try:
+                while process.conn.poll():
+                    received.put_nowait(process.conn.recv())
+            except (EOFError, OSError):
+                loop.remove_reader(process.conn.fileno())
+                received.put_nowait(
+                    ("error", RunExecutionError("Executor process exited"))
+                )
+
+        async def receive():
+            while True:
+                kind, payload = await received.get()
+                if kind != "metrics":
+                    return kind, payload
+                REGISTRY.merge(payload)
+
+        finished = False
+        released = False
+        fd = process.conn.fileno()
+        loop.add_reader(fd, on_readable)
+        try:
+            process.conn.send((run, tracing.inject()))
+            while True:
+                kind, payload = await receive()
+                if kind == "message":
+                    if payload.type == "interrupt":
+                        # The run stops at the interrupt: release the process
+                        # before handing the message over.
+                        kind, _ = await receive()
+                        finished = kind == "done"
+                        loop.remove_reader(fd)
+                        self._release(process, finished)
+                        released = True
+                        yield payload
+                        return
+                    yield payload
+                elif kind == "done":
+                    finished = True
+                    break
+                else:
+                    finished = True
+                    raise payload
+        finally:
+            if not released:
+                loop.remove_reader(fd)
+                self._release(process, finished)
+
+    def _release(self, process: _ExecutorProcess, finished: bool) -> None:
+        if not finished or not process.process.is_alive():
+            # The consumer stopped early (or the process died): the process
+            # may still be executing the run, replace it with a fresh one.
+            process.respawn()
+        self._idle.put_nowait(process)
+
+
+_EXECUTOR: Optional[Executor] = None
+
+
+def create_executor() -> Executor:
+    """Create the executor selected with AGWS_EXECUTOR"""
+    kind = os.getenv("AGWS_EXECUTOR", "loop").lower()
+    if kind == "loop":
+        return LoopExecutor()
+    elif kind == "process":
+        return ProcessExecutor(
+            n_processes=int(
+                os.getenv("AGWS_EXECUTOR_PROCESSES") or os.cpu_count() or 1
+            ),
+            agents_ref=os.getenv("AGENTS_REF"),
+            manifest_paths=[
+                os.getenv("AGENT_MANIFEST_PATH", DEFAULT_AGENT_MANIFEST_PATH)
+            ],
+        )
+    raise ValueError(
+        f'Invalid AGWS_EXECUTOR "{kind}". Supported values are "loop" and "process".'
+    )
+
+
+def get_executor() -> Executor:
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = create_executor()
+    return _EXECUTOR
+
+
+def set_executor(executor: Executor) -> None:
+    global _EXECUTOR
+    _EXECUTOR = executor
@@ -13,8 +13,18 @@ class Message:
         data: Any,
         event: Optional[str] = None,
         interrupt_name: Optional[str] = None,
+        seq: Optional[int] = None,
+        snapshot: bool = False,
+        frame: Optional[bytes] = None,
     ):
         self.type = type
         self.data = data
         self.event = event
         self.interrupt_name = interrupt_name
+        # Position in the run stream, set when published
+        self.seq = seq
+        # Set when the data is the whole agent output, superseding the
+        # previous snapshots of the run rather than adding to them
+        self.snapshot = snapshot
+        # SSE frame, encoded once when published and shared by all the subscribers
+        self.frame = frame
@@ -0,0 +1,244 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""Metrics exposed in the Prometheus text format on /metrics.
+
+The metrics are updated by the code running on the event loop, without
+locks: an update is a dict lookup and a few additions. Values read from
+other services (queue depth, workers, ...) are collected when scraped."""
+
+import math
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from typing import Any, Callable, Dict, Iterable, List, Sequence, Tuple
+
+# Seconds, from quick validations to long agent runs
+RUN_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+WEBHOOK_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+VALIDATION_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)
+
+Labels = Tuple[str, ...]
+
+
+def _escape_help(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n")
+
+
+def _escape(value: str) -> str:
+    return _escape_help(value).replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{n}="{_escape(str(v))}"' for n, v in zip(names, values))
+    return "{" + pairs + "}"
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+class Metric(ABC):
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+
+    @abstractmethod
+    def samples(self) -> Iterable[str]:
+        """Sample lines of the metric in the text format"""
+        pass
+
+    def take_updates(self) -> Any:
+        """Changes since the last call, to be merged in the metric of another
+        process. None for the metrics read when scraped."""
+        return None
+
+    def merge(self, updates: Any) -> None:
+        pass
+
+    def render(self) -> Iterable[str]:
+        yield f"# HELP {self.name} {_escape_help(self.help)}"
+        yield f"# TYPE {self.name} {self.type}"
+        yield from self.samples()
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, value: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + value
+
+    def value(self, *labels: str) -> float:
+        return self._values.get(labels, 0)
+
+    def take_updates(self) -> Dict[Labels, float]:
+        values, self._values = self._values, {}
+        return values
+
+    def merge(self, updates: Dict[Labels, float]) -> None:
+        for labels, value in updates.items():
+            self.inc(*labels, value=value)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in list(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = RUN_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Labels -> observations per bucket (not cumulated, the last one is
+        # +Inf), then their sum
+        self._series: Dict[Labels, List[float]] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [0] * (len(self.buckets) + 2)
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self._series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def take_updates(self) -> Dict[Labels, List[float]]:
+        series, self._series = self._series, {}
+        return series
+
+    def merge(self, updates: Dict[Labels, List[float]]) -> None:
+        for labels, series in updates.items():
+            merged = self._series.setdefault(labels, [0] * (len(self.buckets) + 2))
+            for i, value in enumerate(series):
+                merged[i] += value
+
+    def samples(self) -> Iterable[str]:
+        names = self.labelnames + ("le",)
+        for labels, series in list(self._series.items()):
+            series = list(series)
+            cumulated = 0
+            for bound, count in zip(self.buckets + (math.inf,), series[:-1]):
+                cumulated += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulated}"
+            label_str = _format_labels(self.labelnames, labels)
+            yield f"{self.name}_sum{label_str} {_format_value(series[-1])}"
+            yield f"{self.name}_count{label_str} {cumulated}"
+
+
+class Collected(Metric):
+    """Metric whose values are read from elsewhere when scraped"""
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        collect: Callable[[], Iterable[Tuple[Labels, float]]],
+        labelnames: Sequence[str] = (),
+        type: str = "gauge",
+    ):
+        super().__init__(name, help, labelnames)
+        self.type = type
+        self.collect = collect
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labelnames, labels)} {_format_value(value)}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+
+    def register(self, metric: Metric) -> Metric:
+        if metric.name in self.metrics:
+            raise ValueError(f"Metric {metric.name} already registered")
+        self.metrics[metric.name] = metric
+        return metric
+
+    def take_updates(self) -> Dict[str, Any]:
+        """Changes of the metrics since the last call, e.g. in an executor
+        process, to be merged in the registry of the server process"""
+        return {
+            name: updates
+            for name, metric in self.metrics.items()
+            if (updates := metric.take_updates())
+        }
+
+    def merge(self, updates: Dict[str, Any]) -> None:
+        for name, metric_updates in updates.items():
+            self.metrics[name].merge(metric_updates)
+
+    def render(self) -> str:
+        return (
+            "\n".join(
+                line for metric in self.metrics.values() for line in metric.render()
+            )
+            + "\n"
+        )
+
+
+REGISTRY = MetricsRegistry()
+
+RUN_QUEUE_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "agws_run_queue_seconds",
+        "Time the runs waited in the queue before their last attempt started",
+        ("agent_id", "status"),
+    )
+)
+RUN_EXEC_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "agws_run_exec_seconds",
+        "Execution time of the run attempts",
+        ("agent_id", "status"),
+    )
+)
+RUN_RETRIES: Counter = REGISTRY.register(
+    Counter(
+        "agws_run_retries_total",
+        "Run attempts that failed and were scheduled for a retry",
+        ("agent_id",),
+    )
+)
+RUN_DEAD_LETTERS: Counter = REGISTRY.register(
+    Counter(
+        "agws_run_dead_letters_total",
+        "Runs that exhausted their attempts",
+        ("agent_id",),
+    )
+)
+WEBHOOK_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "agws_webhook_delivery_seconds",
+        "Time from the status change of a run to the successful delivery of its webhook, retries included",
+        buckets=WEBHOOK_BUCKETS,
+    )
+)
+VALIDATION_SECONDS: Histogram = REGISTRY.register(
+    Histogram(
+        "agws_validation_seconds",
+        "Time validating payloads against the agent schemas",
+        ("kind",),
+        buckets=VALIDATION_BUCKETS,
+    )
+)
@@ -0,0 +1,60 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+import json
+import threading
+from typing import Any, Dict, Sequence
+
+from google.protobuf.json_format import MessageToDict
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+
+_ID_FIELDS = ("traceId", "spanId", "parentSpanId")
+
+
+def _hex_ids(item: Dict[str, Any]) -> None:
+    # OTLP JSON encodes the ids in hex, protobuf JSON in base64
+    for field in _ID_FIELDS:
+        if field in item:
+            item[field] = base64.b64decode(item[field]).hex()
+
+
+def to_otlp_json(spans: Sequence[ReadableSpan]) -> str:
+    request = MessageToDict(encode_spans(spans))
+    for resource_spans in request.get("resourceSpans", []):
+        for scope_spans in resource_spans.get("scopeSpans", []):
+            for span in scope_spans.get("spans", []):
+                _hex_ids(span)
+                for link in span.get("links", []):
+                    _hex_ids(link)
+    return json.dumps(request, separators=(",", ":"))
+
+
+class OTLPFileSpanExporter(SpanExporter):
+    """Appends the spans to a file in the OTLP JSON format, one
+    ExportTraceServiceRequest per line like the file exporter of the
+    OpenTelemetry Collector, e.g. to inspect the traces of a test run or
+    replay them into a collector."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        line = to_otlp_json(spans)
+        with self._lock:
+            if self._file.closed:
+                return SpanExportResult.FAILURE
+            self._file.write(line + "\n")
+            self._file.flush()
+        return SpanExportResult.SUCCESS
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._file.close()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        return True
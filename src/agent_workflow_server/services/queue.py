@@ -4,22 +4,28 @@
 import asyncio
 import json
 import logging
+import os
+from contextlib import aclosing
 from datetime import datetime
-from typing import Literal
+from typing import Any, Dict, Literal, NamedTuple, Optional, Set
 
+from agent_workflow_server.agents.load import AGENTS, get_agent_info
 from agent_workflow_server.services.validation import (
     InvalidFormatException,
     validate_output,
 )
-from agent_workflow_server.storage.models import Interrupt, RunInfo
+from agent_workflow_server.storage.models import Interrupt, Run, RunInfo
 from agent_workflow_server.storage.storage import DB
 from agent_workflow_server.utils.tools import make_serializable
 
+from . import tracing
+from .broker import get_broker_client
+from .executor import get_executor
 from .message import Message
-from .runs import RUNS_QUEUE, Runs
-from .stream import stream_run
-
-MAX_RETRY_ATTEMPTS = 3
+from .metrics import RUN_DEAD_LETTERS, RUN_EXEC_SECONDS, RUN_QUEUE_SECONDS, RUN_RETRIES
+from .retry import DEAD_LETTERS, RETRY_QUEUE, DeadLetter
+from .runs import RUNS_QUEUE, Runs, notify_run_status
+from .scheduler import load_concurrency_limits
 
 logger = logging.getLogger(__name__)
 
@@ -30,15 +36,309 @@ class RunError(Exception): ...
 class AttemptsExceededError(Exception): ...
 
 
+CancelAction = Literal["interrupt", "rollback"]
+CANCEL_ACTIONS = ("interrupt", "rollback")
+RUN_CANCELLED_MESSAGE = "Run cancelled"
+
+
+class RunCancelledError(Exception):
+    def __init__(self, action: CancelAction):
+        super().__init__(f"Run cancelled ({action})")
+        self.action = action
+
+
+class RunTimeoutError(Exception):
+    def __init__(self, timeout: float):
+        super().__init__(f"Run exceeded its execution deadline of {timeout}s")
+
+
+class RunNotFoundError(Exception): ...
+
+
+class RunNotCancellableError(Exception):
+    """Raised when cancelling a run that is not pending"""
+
+
+class RunHandle:
+    """Execution of a run by a worker"""
+
+    def __init__(self, run_id: str):
+        self.run_id = run_id
+        self.task: Optional[asyncio.Task] = None
+        self.action: Optional[CancelAction] = None
+        # Set once the worker is done with the run
+        self.released = asyncio.Event()
+
+    def cancel(self, action: CancelAction) -> None:
+        if self.action is None:
+            self.action = action
+        elif action == "rollback":
+            self.action = action
+        if self.task is not None:
+            self.task.cancel()
+
+
+# Runs being executed by the workers of this process
+RUN_HANDLES: Dict[str, RunHandle] = {}
+# Queued runs cancelled before a worker got them
+_cancelled_queued_runs: Dict[str, CancelAction] = {}
+
+
+def load_run_timeout() -> Optional[float]:
+    """Execution deadline of the runs, in seconds (AGWS_RUN_TIMEOUT)"""
+    timeout = os.getenv("AGWS_RUN_TIMEOUT")
+    return float(timeout) if timeout else None
+
+
+async def rollback_run(run: Run) -> None:
+    """Delete the state written by the run, then the run itself"""
+    try:
+        await get_agent_info(run["agent_id"]).agent.rollback(run)
+    except Exception as e:
+        logger.error(f"Failed to rollback the state of run {run['run_id']}: {e}")
+    DB.delete_run(run["run_id"])
+    await notify_run_status(run["run_id"])
+
+
+async def cancel_run(run_id: str, action: CancelAction, wait: bool = False) -> None:
+    """Cancel a pending run. If it is being executed its execution is stopped,
+    with `wait` this returns once its worker is released."""
+    if action not in CANCEL_ACTIONS:
+        raise ValueError(
+            f'Invalid action "{action}". Supported values are {", ".join(CANCEL_ACTIONS)}.'
+        )
+    run = DB.get_run(run_id)
+    if run is None:
+        raise RunNotFoundError(f"Run {run_id} not found")
+
+    if await _cancel_held_run(run, action, wait):
+        return
+
+    if run["status"] == "pending":
+        broker = get_broker_client()
+        if broker is not None:
+            # Queued or executed by another process, which cancels it
+            results = await broker.request(run_id, "cancel", action, wait)
+            if results:
+                if isinstance(results[0], Exception):
+                    raise results[0]
+                return
+        # Held by no process, e.g. queued by a process that exited: no worker
+        # will execute it
+        await _finish_cancelled_run(run, action)
+    elif run["status"] == "interrupted" and action == "rollback":
+        # Abandon a run waiting for user input
+        await rollback_run(run)
+    else:
+        raise RunNotCancellableError(
+            f"Run {run_id} cannot be cancelled, its status is {run['status']}"
+        )
+
+
+async def _cancel_held_run(run: Run, action: CancelAction, wait: bool) -> bool:
+    """Cancel the run if it is queued, executed or waiting for a retry in this
+    process, returns whether it is"""
+    run_id = run["run_id"]
+    handle = RUN_HANDLES.get(run_id)
+    if handle is not None and not (handle.task and handle.task.done()):
+        handle.cancel(action)
+        if wait:
+            await handle.released.wait()
+        return True
+
+    if RETRY_QUEUE.discard(run_id):
+        # Waiting for a retry
+        await _finish_cancelled_run(run, action)
+        return True
+    if run_id in RUNS_QUEUE and run_id not in _cancelled_queued_runs:
+        # Not started yet: the worker getting it skips it
+        _cancelled_queued_runs[run_id] = action
+        await _finish_cancelled_run(run, action)
+        return True
+    return False
+
+
+async def cancel_held_run(
+    run_id: str, action: CancelAction, wait: bool
+) -> Optional[bool]:
+    """Handle the cancel requests of the other API processes, None when the
+    run is not held by this process"""
+    run = DB.get_run(run_id)
+    if run is None or not await _cancel_held_run(run, action, wait):
+        return None
+    return True
+
+
+class AutoscalePolicy(NamedTuple):
+    min_workers: int
+    max_workers: int
+    # Seconds between two scaling decisions
+    interval: float
+    # Workers are added while runs wait longer than this in the queue
+    target_queue_s: float
+
+
+def load_autoscale_policy(n_workers: int) -> AutoscalePolicy:
+    """Read the worker pool bounds from the environment, the pool has a fixed
+    size of `n_workers` when they are not set"""
+    min_workers = int(os.getenv("AGWS_WORKERS_MIN") or n_workers)
+    max_workers = int(os.getenv("AGWS_WORKERS_MAX") or max(n_workers, min_workers))
+    if not 0 < min_workers <= max_workers:
+        raise ValueError(
+            f"Invalid worker pool bounds: AGWS_WORKERS_MIN={min_workers}, AGWS_WORKERS_MAX={max_workers}"
+        )
+    return AutoscalePolicy(
+        min_workers=min_workers,
+        max_workers=max_workers,
+        interval=float(os.getenv("AGWS_AUTOSCALE_INTERVAL", 5)),
+        target_queue_s=float(os.getenv("AGWS_AUTOSCALE_TARGET_QUEUE_S", 1)),
+    )
+
+
+class WorkerPool:
+    """Worker tasks executing the queued runs. When the policy bounds differ, the
+    pool grows while the runs wait in the queue and shrinks while workers are idle."""
+
+    # Weight of the last run in the moving averages of the run stats
+    EWMA_ALPHA = 0.2
+
+    def __init__(self, policy: AutoscalePolicy):
+        self.policy = policy
+        self.tasks: Dict[int, asyncio.Task] = {}
+        self.busy: Set[int] = set()
+        self.queue_s: Optional[float] = None
+        self.exec_s: Optional[float] = None
+        self._next_id = 1
+
+    @property
+    def size(self) -> int:
+        return len(self.tasks)
+
+    def observe(self, run_info: RunInfo) -> None:
+        """Feed the stats of an executed run to the moving averages"""
+        for stat in ("queue_s", "exec_s"):
+            value = run_info.get(stat)
+            if value is None:
+                continue
+            current = getattr(self, stat)
+            setattr(
+                self,
+                stat,
+                value
+                if current is None
+                else current + self.EWMA_ALPHA * (value - current),
+            )
+
+    def _add_worker(self) -> None:
+        worker_id = self._next_id
+        self._next_id += 1
+        self.tasks[worker_id] = asyncio.create_task(worker(worker_id, self))
+
+    def _remove_idle_worker(self) -> bool:
+        for worker_id, task in self.tasks.items():
+            if worker_id not in self.busy:
+                # Idle workers are waiting for a run: cancelling them is safe
+                task.cancel()
+                del self.tasks[worker_id]
+                return True
+        return False
+
+    def desired_size(self) -> int:
+        runnable = RUNS_QUEUE.runnable_size()
+        idle = self.size - len(self.busy)
+        if runnable > idle and (
+            self.queue_s is None or self.queue_s >= self.policy.target_queue_s
+        ):
+            # Start all the runnable runs now
+            desired = len(self.busy) + runnable
+        elif runnable == 0 and idle > 0:
+            # Release one idle worker at a time
+            desired = self.size - 1
+        else:
+            desired = self.size
+        return max(self.policy.min_workers, min(self.policy.max_workers, desired))
+
+    def scale(self) -> None:
+        desired = self.desired_size()
+        if desired == self.size:
+            return
+        logger.info(
+            f"Scaling workers from {self.size} to {desired} (queued: {RUNS_QUEUE.qsize()}, busy: {len(self.busy)}, queue_s: {self.queue_s}, exec_s: {self.exec_s})"
+        )
+        while self.size < desired:
+            self._add_worker()
+        while self.size > desired and self._remove_idle_worker():
+            pass
+
+    async def run(self) -> None:
+        for _ in range(self.policy.min_workers):
+            self._add_worker()
+        try:
+            if self.policy.min_workers == self.policy.max_workers:
+                await asyncio.gather(*self.tasks.values())
+            else:
+                while True:
+                    await asyncio.sleep(self.policy.interval)
+                    self.scale()
+        finally:
+            tasks = list(self.tasks.values())
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            self.tasks.clear()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "workers": self.size,
+            "busy_workers": len(self.busy),
+            "min_workers": self.policy.min_workers,
+            "max_workers": self.policy.max_workers,
+            "queued_runs": RUNS_QUEUE.qsize(),
+            "runnable_runs": RUNS_QUEUE.runnable_size(),
+            "delayed_retries": len(RETRY_QUEUE),
+            "dead_letters": len(DEAD_LETTERS),
+            "queue_s": self.queue_s,
+            "exec_s": self.exec_s,
+        }
+
+
+WORKER_POOL: Optional[WorkerPool] = None
+
+
+def configure_concurrency_limits() -> None:
+    """Apply the per-agent concurrency limits of the manifests.
+    AGWS_AGENT_CONCURRENCY takes precedence."""
+    env_limits = load_concurrency_limits()
+    for agent_id, agent_info in AGENTS.items():
+        limit = env_limits.get(agent_id, agent_info.max_concurrency)
+        if limit is not None:
+            RUNS_QUEUE.set_concurrency_limit(agent_id, limit)
+            logger.info(f"Agent {agent_id} runs at most {limit} runs concurrently")
+
+
 async def start_workers(n_workers: int):
-    logger.info(f"Starting {n_workers} workers")
-    tasks = [asyncio.create_task(worker(i + 1)) for i in range(n_workers)]
+    global WORKER_POOL
+    policy = load_autoscale_policy(n_workers)
+    logger.info(
+        f"Starting {policy.min_workers} workers"
+        + (
+            f" (autoscaling up to {policy.max_workers})"
+            if policy.max_workers > policy.min_workers
+            else ""
+        )
+    )
+    configure_concurrency_limits()
+    RETRY_QUEUE.configure()
+    executor = get_executor()
+    await executor.start()
+    WORKER_POOL = WorkerPool(policy)
+    retries = asyncio.create_task(RETRY_QUEUE.run(RUNS_QUEUE))
     try:
-        await asyncio.gather(*tasks)
+        await WORKER_POOL.run()
     finally:
-        for task in tasks:
-            task.cancel()
-        await asyncio.gather(*tasks, return_exceptions=True)
+        retries.cancel()
+        await asyncio.gather(retries, return_exceptions=True)
+        await executor.stop()
 
 
 def log_run(
@@ -50,6 +350,9 @@ def log_run(
         "interrupted",
         "succeeded",
         "failed",
+        "retry scheduled",
+        "cancelled",
+        "timed out",
         "exeeded attempts",
     ],
     **kwargs,
@@ -60,6 +363,9 @@ def log_run(
         "interrupted": logger.info,
         "succeeded": logger.info,
         "failed": logger.exception,
+        "retry scheduled": logger.info,
+        "cancelled": logger.info,
+        "timed out": logger.error,
         "exeeded attempts": logger.error,
     }
     log_message = f"(Worker {worker_id}) Background Run {run_id} {info}"
@@ -74,50 +380,134 @@ def run_stats(run_info: RunInfo):
     return {key: run_info[key] for key in ["exec_s", "queue_s", "attempts"]}
 
 
-async def worker(worker_id: int):
+def _add_dead_letter(run: Run, run_info: RunInfo, error: str) -> None:
+    RUN_DEAD_LETTERS.inc(run["agent_id"])
+    DEAD_LETTERS.add(
+        DeadLetter(
+            run_id=run["run_id"],
+            agent_id=run["agent_id"],
+            attempts=run_info["attempts"],
+            error=error,
+            failed_at=datetime.now(),
+        )
+    )
+
+
+async def _execute(worker_id: int, run: Run) -> Optional[Message]:
+    """Stream the run messages to the subscribers, return the last one"""
+    run_id = run["run_id"]
+    last_message = None
+    # Close the stream on cancellation: it releases the executor resources
+    async with aclosing(get_executor().stream(run)) as stream:
+        async for message in stream:
+            message.data = make_serializable(message.data)
+            last_message = message
+            if last_message.type == "interrupt":
+                log_run(
+                    worker_id,
+                    run_id,
+                    "interrupted",
+                    message_data=json.dumps(message.data),
+                )
+                break
+            else:
+                await Runs.Stream.publish(run_id, message)
+    return last_message
+
+
+async def _finish_cancelled_run(run: Run, action: CancelAction) -> None:
+    run_id = run["run_id"]
+    if action == "rollback":
+        await rollback_run(run)
+    else:
+        DB.add_run_output(run_id, RUN_CANCELLED_MESSAGE)
+        await Runs.set_status(run_id, "error")
+        await Runs.Stream.publish(
+            run_id, Message(type="message", data=RUN_CANCELLED_MESSAGE)
+        )
+    await Runs.Stream.publish(run_id, Message(type="control", data="done"))
+
+
+async def worker(worker_id: int, pool: Optional[WorkerPool] = None):
     while True:
-        run_id = await RUNS_QUEUE.get()
+        queued_run = await RUNS_QUEUE.get()
+        run_id = queued_run.run_id
         run = DB.get_run(run_id)
+        cancelled = _cancelled_queued_runs.pop(run_id, None)
+        if run is None or cancelled is not None:
+            # Cancelled while queued
+            RUNS_QUEUE.release(queued_run)
+            RUNS_QUEUE.task_done()
+            continue
+
+        if pool is not None:
+            pool.busy.add(worker_id)
+        handle = RunHandle(run_id)
+        RUN_HANDLES[run_id] = handle
         run_info = DB.get_run_info(run_id)
 
         started_at = datetime.now().timestamp()
+        # Outcome of the attempt, for the metrics
+        status: Optional[str] = None
 
         await Runs.set_status(run["run_id"], "pending")
 
-        run_info["attempts"] += 1
-        run_info["started_at"] = started_at
-        run_info["exec_s"] = 0
+        # Stored records are replaced, never changed in place: they may be
+        # read by the storage in another thread
+        run_info = {
+            **run_info,
+            "attempts": run_info["attempts"] + 1,
+            "started_at": started_at,
+            "exec_s": 0,
+        }
         DB.update_run_info(run_id, run_info)
 
+        span_attributes = {"run.id": run_id, "agent.id": run["agent_id"]}
+        tracing.record_span(
+            "run.queued",
+            run_info["queued_at"].timestamp(),
+            started_at,
+            span_attributes,
+            queued_run.trace_context,
+        )
+        trace_span = tracing.ActiveSpan(
+            "run.execute",
+            {**span_attributes, "run.attempt": run_info["attempts"]},
+            queued_run.trace_context,
+        )
+
         try:
-            if run_info["attempts"] > MAX_RETRY_ATTEMPTS:
+            retry_policy = RETRY_QUEUE.policy(run["agent_id"])
+            if run_info["attempts"] > retry_policy.max_attempts:
                 raise AttemptsExceededError()
 
             log_run(worker_id, run_id, "started")
 
-            await Runs.Stream.subscribe(run_id)  # to create a queue
-            stream = stream_run(run)
-            last_message = None
-            async for message in stream:
-                message.data = make_serializable(message.data)
-                last_message = message
-                if last_message.type == "interrupt":
-                    log_run(
-                        worker_id,
-                        run_id,
-                        "interrupted",
-                        message_data=json.dumps(message.data),
-                    )
-                    break
-                else:
-                    await Runs.Stream.publish(run_id, message)
+            if handle.action is not None:
+                # Cancelled before its execution started
+                raise RunCancelledError(handle.action)
+            handle.task = asyncio.create_task(_execute(worker_id, run))
+            timeout = load_run_timeout()
+            try:
+                async with asyncio.timeout(timeout):
+                    last_message = await handle.task
+            except asyncio.CancelledError:
+                if handle.action is None:
+                    # The worker itself is cancelled
+                    handle.task.cancel()
+                    raise
+                raise RunCancelledError(handle.action)
+            except TimeoutError:
+                raise RunTimeoutError(timeout)
 
             ended_at = datetime.now().timestamp()
 
-            run_info["ended_at"] = ended_at
-            run_info["exec_s"] = ended_at - started_at
-            run_info["queue_s"] = started_at - run_info["queued_at"].timestamp()
-
+            run_info = {
+                **run_info,
+                "ended_at": ended_at,
+                "exec_s": ended_at - started_at,
+                "queue_s": started_at - run_info["queued_at"].timestamp(),
+            }
             DB.update_run_info(run_id, run_info)
 
             try:
@@ -140,9 +530,11 @@ async def worker(worker_id: int):
                         ai_data=last_message.data,
                     )
                     DB.update_run(run_id, {"interrupt": interrupt})
-                    await Runs.set_status(run_id, "interrupted")
+                    status = "interrupted"
+                    await Runs.set_status(run_id, status)
                 else:
-                    await Runs.set_status(run_id, "success")
+                    status = "success"
+                    await Runs.set_status(run_id, status)
                 log_run(worker_id, run_id, "succeeded", **run_stats(run_info))
                 await Runs.Stream.publish(run_id, Message(type="control", data="done"))
 
@@ -150,33 +542,59 @@ async def worker(worker_id: int):
                 log_run(worker_id, run_id, "failed")
                 raise RunError(str(error))
 
+        except (RunCancelledError, RunTimeoutError) as error:
+            ended_at = datetime.now().timestamp()
+            run_info = {
+                **run_info,
+                "ended_at": ended_at,
+                "exec_s": ended_at - started_at,
+                "queue_s": (started_at - run_info["queued_at"].timestamp()),
+            }
+            DB.update_run_info(run_id, run_info)
+
+            if isinstance(error, RunCancelledError):
+                status = "cancelled"
+                log_run(worker_id, run_id, "cancelled", action=error.action)
+                await _finish_cancelled_run(run, error.action)
+            else:
+                status = "timeout"
+                log_run(worker_id, run_id, "timed out", **run_stats(run_info))
+                DB.add_run_output(run_id, str(error))
+                await Runs.set_status(run_id, "timeout")
+                await Runs.Stream.publish(
+                    run_id, Message(type="message", data=str(error))
+                )
+                await Runs.Stream.publish(run_id, Message(type="control", data="done"))
+
         except AttemptsExceededError:
             ended_at = datetime.now().timestamp()
-            run_info.update(
-                {
-                    "ended_at": ended_at,
-                    "exec_s": ended_at - started_at,
-                    "queue_s": (started_at - run_info["queued_at"].timestamp()),
-                }
-            )
+            run_info = {
+                **run_info,
+                "ended_at": ended_at,
+                "exec_s": ended_at - started_at,
+                "queue_s": (started_at - run_info["queued_at"].timestamp()),
+            }
 
             DB.update_run_info(run_id, run_info)
-            await Runs.set_status(run_id, "error")
+            status = "error"
+            await Runs.set_status(run_id, status)
             log_run(worker_id, run_id, "exceeded attempts")
+            _add_dead_letter(run, run_info, "Exceeded max attempts")
 
         except Exception as error:
             ended_at = datetime.now().timestamp()
-            run_info.update(
-                {
-                    "ended_at": ended_at,
-                    "exec_s": ended_at - started_at,
-                    "queue_s": (started_at - run_info["queued_at"].timestamp()),
-                }
-            )
+            run_info = {
+                **run_info,
+                "ended_at": ended_at,
+                "exec_s": ended_at - started_at,
+                "queue_s": (started_at - run_info["queued_at"].timestamp()),
+            }
 
             DB.update_run_info(run_id, run_info)
-            await Runs.set_status(run_id, "error")
+            # Before the status, the waiters get the output with it
             DB.add_run_output(run_id, str(error))
+            status = "error"
+            await Runs.set_status(run_id, status)
             log_run(
                 worker_id,
                 run_id,
@@ -185,7 +603,28 @@ async def worker(worker_id: int):
             )
 
             await Runs.Stream.publish(run_id, Message(type="message", data=str(error)))
-            await RUNS_QUEUE.put(run_id)  # Re-queue for retry
+
+            retry_policy = RETRY_QUEUE.policy(run["agent_id"])
+            if run_info["attempts"] < retry_policy.max_attempts:
+                # Retry later, without holding a worker in the meantime
+                delay = retry_policy.delay(run_info["attempts"])
+                RETRY_QUEUE.schedule(queued_run, delay)
+                RUN_RETRIES.inc(run["agent_id"])
+                log_run(worker_id, run_id, "retry scheduled", delay_s=delay)
+            else:
+                log_run(worker_id, run_id, "exeeded attempts")
+                _add_dead_letter(run, run_info, str(error))
 
         finally:
+            RUN_HANDLES.pop(run_id, None)
+            handle.released.set()
+            RUNS_QUEUE.release(queued_run)
             RUNS_QUEUE.task_done()
+            if pool is not None:
+                pool.busy.discard(worker_id)
+                pool.observe(run_info)
+            if status is not None:
+                RUN_QUEUE_SECONDS.observe(run_info["queue_s"], run["agent_id"], status)
+                RUN_EXEC_SECONDS.observe(run_info["exec_s"], run["agent_id"], status)
+                trace_span.set_attribute("run.status", status)
+            trace_span.end(error=status if status in ("error", "timeout") else None)
@@ -0,0 +1,104 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+import os
+from collections import deque
+from typing import Deque, List, NamedTuple, Optional, Tuple
+
+from .message import Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_REPLAY_MAX_MESSAGES = 1000
+DEFAULT_REPLAY_MAX_BYTES = 1024 * 1024
+DEFAULT_REPLAY_GRACE_S = 60.0
+
+
+class ReplayPolicy(NamedTuple):
+    # Max number of messages kept per run, 0 disables the replay
+    max_messages: int = DEFAULT_REPLAY_MAX_MESSAGES
+    # Max size of the messages kept per run (JSON encoded data)
+    max_bytes: int = DEFAULT_REPLAY_MAX_BYTES
+    # Seconds the messages of a completed run are kept for reconnecting clients
+    grace_s: float = DEFAULT_REPLAY_GRACE_S
+
+
+def load_replay_policy() -> ReplayPolicy:
+    """Read the stream replay policy from the environment"""
+    return ReplayPolicy(
+        max_messages=int(
+            os.getenv("AGWS_STREAM_REPLAY_MAX_MESSAGES", DEFAULT_REPLAY_MAX_MESSAGES)
+        ),
+        max_bytes=int(
+            os.getenv("AGWS_STREAM_REPLAY_MAX_BYTES", DEFAULT_REPLAY_MAX_BYTES)
+        ),
+        grace_s=float(os.getenv("AGWS_STREAM_REPLAY_GRACE_S", DEFAULT_REPLAY_GRACE_S)),
+    )
+
+
+def _message_size(message: Message) -> int:
+    if message.frame is not None:
+        # Encoded once when published
+        return len(message.frame)
+    try:
+        return len(json.dumps(message.data, default=str))
+    except (TypeError, ValueError):
+        return len(str(message.data))
+
+
+class ReplayBuffer:
+    """Ring buffer of the last messages published for a run.
+
+    Messages are numbered with increasing sequence ids, used as SSE event ids.
+    A stream ends with a "done" control message: the next message (e.g. of a
+    resumed run) starts a new stream and clears the buffer, the ids keep
+    increasing."""
+
+    def __init__(self, max_messages: int, max_bytes: int):
+        self.max_messages = max_messages
+        self.max_bytes = max_bytes
+        self._messages: Deque[Tuple[Message, int]] = deque()
+        self.size_bytes = 0
+        self.last_seq = 0
+        self.done = False
+
+    def next_seq(self) -> int:
+        return self.last_seq + 1
+
+    def append(self, message: Message) -> None:
+        """Add a message numbered with `seq`"""
+        if self.done:
+            self._messages.clear()
+            self.size_bytes = 0
+            self.done = False
+        self.last_seq = max(self.last_seq, message.seq)
+        if message.type == "control" and message.data == "done":
+            self.done = True
+        if self.max_messages <= 0:
+            return
+
+        size = _message_size(message)
+        self._messages.append((message, size))
+        self.size_bytes += size
+        # Always keep the last message, whatever its size
+        while len(self._messages) > 1 and (
+            len(self._messages) > self.max_messages or self.size_bytes > self.max_bytes
+        ):
+            _, dropped = self._messages.popleft()
+            self.size_bytes -= dropped
+
+    def since(self, last_seq: Optional[int]) -> List[Message]:
+        """Messages after `last_seq`, all of them if None"""
+        if last_seq is None:
+            return [message for message, _ in self._messages]
+        messages = [message for message, _ in self._messages if message.seq > last_seq]
+        if self._messages and self._messages[0][0].seq > last_seq + 1:
+            logger.warning(
+                f"Messages {last_seq + 1} to {self._messages[0][0].seq - 1} are not in the replay buffer anymore"
+            )
+        return messages
+
+    def __len__(self) -> int:
+        return len(self._messages)
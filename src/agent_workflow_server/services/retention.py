@@ -0,0 +1,189 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, NamedTuple, Optional
+
+from agent_workflow_server.storage.models import Run
+from agent_workflow_server.storage.storage import DB
+
+from .retry import RETRY_QUEUE
+from .runs import stream_manager
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RETENTION_INTERVAL = 60
+# Runs evicted per sweep step, the sweeper yields to the event loop between steps
+SWEEP_BATCH_SIZE = 500
+
+
+class RetentionPolicy(NamedTuple):
+    # Seconds after the last update a run with the given (final) status is evicted
+    ttls: Dict[str, float]
+    # Max number of stored runs, the least recently updated finished runs are evicted first
+    max_runs: Optional[int]
+    # If set, outputs of evicted runs are written to this directory
+    spill_dir: Optional[str]
+    # Seconds between sweeps
+    interval: float
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.ttls) or self.max_runs is not None
+
+
+def load_retention_policy() -> RetentionPolicy:
+    """Read the retention policy from the environment"""
+    try:
+        ttls = json.loads(os.getenv("AGWS_RETENTION_TTL") or "{}")
+    except json.JSONDecodeError:
+        raise ValueError("""Invalid format for AGWS_RETENTION_TTL environment variable. \
+Must be a dictionary of run status -> seconds. \
+Example: {"success": 3600, "error": 86400}""")
+    if "pending" in ttls:
+        raise ValueError("AGWS_RETENTION_TTL: pending runs cannot be evicted")
+
+    max_runs = os.getenv("AGWS_RETENTION_MAX_RUNS")
+    return RetentionPolicy(
+        ttls={status: float(ttl) for status, ttl in ttls.items()},
+        max_runs=int(max_runs) if max_runs else None,
+        spill_dir=os.getenv("AGWS_RETENTION_SPILL_DIR") or None,
+        interval=float(
+            os.getenv("AGWS_RETENTION_INTERVAL", DEFAULT_RETENTION_INTERVAL)
+        ),
+    )
+
+
+class RetentionStats:
+    def __init__(self):
+        self.sweeps = 0
+        self.last_sweep_at: Optional[datetime] = None
+        self.last_sweep_s: Optional[float] = None
+        self.runs_evicted_ttl: Dict[str, int] = {}
+        self.runs_evicted_max_runs = 0
+        self.outputs_spilled = 0
+        self.spill_errors = 0
+        self.replay_buffers_released = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sweeps": self.sweeps,
+            "last_sweep_at": self.last_sweep_at.isoformat()
+            if self.last_sweep_at
+            else None,
+            "last_sweep_s": self.last_sweep_s,
+            "runs_evicted_ttl": dict(self.runs_evicted_ttl),
+            "runs_evicted_max_runs": self.runs_evicted_max_runs,
+            "outputs_spilled": self.outputs_spilled,
+            "spill_errors": self.spill_errors,
+            "replay_buffers_released": self.replay_buffers_released,
+            "runs_stored": DB.count_runs(),
+        }
+
+
+RETENTION_STATS = RetentionStats()
+
+
+def _spill_output(spill_dir: str, run: Run) -> None:
+    run_id = run["run_id"]
+    data = {
+        "run": run,
+        "run_info": DB.get_run_info(run_id),
+        "output": DB.get_run_output(run_id),
+    }
+    os.makedirs(spill_dir, exist_ok=True)
+    with open(os.path.join(spill_dir, f"{run_id}.json"), "w") as f:
+        json.dump(data, f, default=str)
+
+
+def _evict(run: Run, policy: RetentionPolicy) -> None:
+    if policy.spill_dir:
+        try:
+            _spill_output(policy.spill_dir, run)
+            RETENTION_STATS.outputs_spilled += 1
+        except Exception as e:
+            RETENTION_STATS.spill_errors += 1
+            logger.error(f"Failed to spill output of run {run['run_id']}: {e}")
+    DB.delete_run(run["run_id"])
+
+
+def _release_run_resources() -> None:
+    """Release the replay buffers of deleted runs. The stream queues are
+    removed by their subscribers."""
+    for run_id in list(stream_manager.buffers.keys()):
+        if DB.get_run_status(run_id) is None:
+            # Evicted or deleted before the end of its replay grace period
+            stream_manager.release(run_id)
+            RETENTION_STATS.replay_buffers_released += 1
+
+
+def _evictable(runs: List[Run]) -> List[Run]:
+    # Failed runs waiting for a retry are still in progress
+    return [run for run in runs if run["run_id"] not in RETRY_QUEUE]
+
+
+def sweep(
+    policy: RetentionPolicy,
+    now: Optional[datetime] = None,
+    batch_size: int = SWEEP_BATCH_SIZE,
+) -> bool:
+    """Evict expired runs, then the least recently updated ones above max_runs.
+    At most `batch_size` runs are evicted per status and for max_runs, the
+    storage selects them. Returns True if runs may remain to be evicted."""
+    started_at = datetime.now()
+    now = now or started_at
+    more = False
+
+    for status, ttl in policy.ttls.items():
+        expired: List[Run] = _evictable(
+            DB.search_runs_updated_before(
+                status, now - timedelta(seconds=ttl), batch_size
+            )
+        )
+        for run in expired:
+            _evict(run, policy)
+        if expired:
+            RETENTION_STATS.runs_evicted_ttl[status] = (
+                RETENTION_STATS.runs_evicted_ttl.get(status, 0) + len(expired)
+            )
+            logger.info(f"Evicted {len(expired)} expired {status} runs")
+        more = more or len(expired) == batch_size
+
+    if policy.max_runs is not None:
+        excess = DB.count_runs() - policy.max_runs
+        if excess > 0:
+            evicted = _evictable(
+                DB.least_recently_updated_runs(min(excess, batch_size))
+            )
+            for run in evicted:
+                _evict(run, policy)
+            RETENTION_STATS.runs_evicted_max_runs += len(evicted)
+            logger.info(
+                f"Evicted {len(evicted)} runs above the max of {policy.max_runs}"
+            )
+            more = more or (excess > batch_size and len(evicted) == batch_size)
+
+    _release_run_resources()
+
+    RETENTION_STATS.sweeps += 1
+    RETENTION_STATS.last_sweep_at = started_at
+    RETENTION_STATS.last_sweep_s = (datetime.now() - started_at).total_seconds()
+    return more
+
+
+async def start_retention_sweeper(policy: RetentionPolicy):
+    logger.info(
+        f"Starting retention sweeper (ttls: {policy.ttls}, max runs: {policy.max_runs})"
+    )
+    while True:
+        await asyncio.sleep(policy.interval)
+        try:
+            # In batches, so that requests are handled in between
+            while sweep(policy):
+                await asyncio.sleep(0)
+        except Exception as e:
+            logger.exception(f"Retention sweep failed: {e}")
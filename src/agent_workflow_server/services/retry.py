@@ -0,0 +1,179 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, TypedDict
+
+from .scheduler import QueuedRun, RunScheduler
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 3
+DEFAULT_DEAD_LETTERS_MAX = 1000
+
+
+class RetryPolicy(NamedTuple):
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+    # Delay before the first retry, in seconds
+    base_delay: float = 1.0
+    max_delay: float = 60.0
+    multiplier: float = 2.0
+    # Fraction of the delay that is randomized, so that the runs failed by the
+    # same outage are not all retried at once
+    jitter: float = 0.5
+
+    def delay(self, attempt: int) -> float:
+        """Delay before retrying a run that failed `attempt` times"""
+        delay = min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1))
+        return delay * (1 - self.jitter * random.random())
+
+
+def parse_retry_policy(env: str, value: Any, default: RetryPolicy) -> RetryPolicy:
+    """Retry policy of a JSON object read from the `env` environment
+    variable, its missing keys taken from `default`"""
+    if not isinstance(value, dict) or not set(value) <= set(RetryPolicy._fields):
+        raise ValueError(
+            f'Invalid format for {env} environment variable. \
+Retry policies are dictionaries with keys: {", ".join(RetryPolicy._fields)}. \
+Example: {{"max_attempts": 5, "base_delay": 2}}'
+        )
+    return default._replace(**value)
+
+
+def load_retry_policies() -> Tuple[RetryPolicy, Dict[str, RetryPolicy]]:
+    """Read the default retry policy (AGWS_RETRY_POLICY) and the per-agent ones
+    (AGWS_AGENT_RETRY_POLICIES: agent_id -> policy) from the environment"""
+    try:
+        default = json.loads(os.getenv("AGWS_RETRY_POLICY") or "{}")
+        per_agent = json.loads(os.getenv("AGWS_AGENT_RETRY_POLICIES") or "{}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid retry policy: {e}")
+
+    default_policy = parse_retry_policy("AGWS_RETRY_POLICY", default, RetryPolicy())
+    if not isinstance(per_agent, dict):
+        raise ValueError(
+            "Invalid format for AGWS_AGENT_RETRY_POLICIES environment variable. \
+Must be a dictionary of agent_id -> retry policy."
+        )
+    return default_policy, {
+        agent_id: parse_retry_policy(
+            "AGWS_AGENT_RETRY_POLICIES", policy, default_policy
+        )
+        for agent_id, policy in per_agent.items()
+    }
+
+
+class DelayedRetryQueue:
+    """Holds failed runs until their retry is due, then puts them back in the
+    run queue. Waiting retries do not take worker slots."""
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int, QueuedRun]] = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self.default_policy, self.agent_policies = RetryPolicy(), {}
+
+    def configure(self) -> None:
+        self.default_policy, self.agent_policies = load_retry_policies()
+
+    def policy(self, agent_id: str) -> RetryPolicy:
+        return self.agent_policies.get(agent_id, self.default_policy)
+
+    def schedule(self, run: QueuedRun, delay: float) -> None:
+        ready_at = asyncio.get_running_loop().time() + delay
+        heapq.heappush(self._heap, (ready_at, next(self._seq), run))
+        self._changed.set()
+
+    def discard(self, run_id: str) -> bool:
+        """Drop the scheduled retry of a run, returns whether there was one"""
+        for i, (_, _, run) in enumerate(self._heap):
+            if run.run_id == run_id:
+                self._heap[i] = self._heap[-1]
+                self._heap.pop()
+                heapq.heapify(self._heap)
+                self._changed.set()
+                return True
+        return False
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def __contains__(self, run_id: str) -> bool:
+        """Whether a retry of the run is scheduled"""
+        return any(run.run_id == run_id for _, _, run in self._heap)
+
+    async def run(self, queue: RunScheduler) -> None:
+        """Move the due retries to `queue`"""
+        loop = asyncio.get_running_loop()
+        while True:
+            self._changed.clear()
+            if not self._heap:
+                await self._changed.wait()
+                continue
+            delay = self._heap[0][0] - loop.time()
+            if delay > 0:
+                try:
+                    # Wake up early if an earlier retry is scheduled
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, run = heapq.heappop(self._heap)
+            logger.debug(f"Retrying run {run.run_id}")
+            await queue.put(run)
+
+
+class DeadLetter(TypedDict):
+    run_id: str
+    agent_id: str
+    attempts: int
+    error: str
+    failed_at: datetime
+
+
+class DeadLetterStore:
+    """The last runs that failed after exhausting their retry attempts"""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._letters: "OrderedDict[str, DeadLetter]" = OrderedDict()
+
+    def add(self, letter: DeadLetter) -> None:
+        self._letters.pop(letter["run_id"], None)
+        self._letters[letter["run_id"]] = letter
+        while len(self._letters) > self.max_size:
+            self._letters.popitem(last=False)
+
+    def get(self, run_id: str) -> Optional[DeadLetter]:
+        return self._letters.get(run_id)
+
+    def remove(self, run_id: str) -> Optional[DeadLetter]:
+        return self._letters.pop(run_id, None)
+
+    def list(
+        self, agent_id: Optional[str] = None, offset: int = 0, limit: int = 100
+    ) -> List[DeadLetter]:
+        """Most recent first"""
+        letters = (
+            letter
+            for letter in reversed(self._letters.values())
+            if agent_id is None or letter["agent_id"] == agent_id
+        )
+        return list(itertools.islice(letters, offset, offset + limit))
+
+    def __len__(self) -> int:
+        return len(self._letters)
+
+
+RETRY_QUEUE = DelayedRetryQueue()
+DEAD_LETTERS = DeadLetterStore(
+    int(os.getenv("AGWS_DEAD_LETTERS_MAX", DEFAULT_DEAD_LETTERS_MAX))
+)
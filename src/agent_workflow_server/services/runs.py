@@ -3,14 +3,20 @@
 
 import asyncio
 import logging
-from collections import defaultdict
 from datetime import datetime
 from itertools import islice
-from typing import Any, AsyncGenerator, AsyncIterator, Dict, List, Optional
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterator,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
 from uuid import uuid4
 
-import httpx
-
 from agent_workflow_server.generated.models.run_create_stateless import (
     RunCreateStateless as ApiRunCreate,
 )
@@ -20,25 +26,26 @@ from agent_workflow_server.generated.models.run_search_request import (
 from agent_workflow_server.generated.models.run_stateless import (
     RunStateless as ApiRun,
 )
-from agent_workflow_server.generated.models.stream_event_payload import (
-    StreamEventPayload,
-)
-from agent_workflow_server.generated.models.value_run_error_update import (
-    ValueRunErrorUpdate,
-)
-from agent_workflow_server.generated.models.value_run_interrupt_update import (
-    ValueRunInterruptUpdate,
-)
-from agent_workflow_server.generated.models.value_run_result_update import (
-    ValueRunResultUpdate,
-)
 from agent_workflow_server.services.threads import Threads
 from agent_workflow_server.services.utils import check_run_is_interrupted
 from agent_workflow_server.storage.models import Interrupt, Run, RunInfo, RunStatus
 from agent_workflow_server.storage.storage import DB
 
 from ..utils.tools import is_valid_url, is_valid_uuid
+from . import tracing
+from .broker import get_broker_client
+from .completion import Completion, CompletionRegistry
 from .message import Message
+from .replay import ReplayBuffer, ReplayPolicy, load_replay_policy
+from .scheduler import QueuedRun, RunScheduling, create_scheduler
+from .sse import KEEPALIVE_FRAME, encode_frame
+from .subscriber import (
+    SlowConsumerError,
+    SubscriberPolicy,
+    SubscriberQueue,
+    load_subscriber_policy,
+)
+from .webhooks import webhook_dispatcher
 
 logger = logging.getLogger(__name__)
 
@@ -104,9 +111,10 @@ def _to_api_model(run: Run) -> ApiRun:
     )
 
 
-async def _call_webhook(run: Run) -> None:
+def _call_webhook(run: Run) -> None:
     """
-    Call the webhook URL with the Run data.
+    Queue the delivery of the Run data to the webhook URL. The webhook is
+    called in the background, see WebhookDispatcher.
 
     Args:
         run (Run): The Run to send to the webhook.
@@ -114,55 +122,202 @@ async def _call_webhook(run: Run) -> None:
     if not run.get("webhook"):
         return
 
-    try:
-        run_data = _to_api_model(run).model_dump_json(by_alias=True, exclude_unset=True)
-
-        async with httpx.AsyncClient() as client:
-            response = await client.post(
-                run["webhook"],
-                content=run_data,
-                headers={"Content-Type": "application/json"},
-            )
-
-        response.raise_for_status()
-
-        logger.info(f"Webhook called successfully for run {run['run_id']}")
-    except httpx.RequestError as e:
-        logger.error(f"Error calling webhook for run {run['run_id']}: {e}")
+    run_data = _to_api_model(run).model_dump_json(by_alias=True, exclude_unset=True)
+    webhook_dispatcher.submit(run["run_id"], run["webhook"], run_data.encode("utf-8"))
 
 
 class StreamManager:
-    def __init__(self):
-        self.queues: Dict[str, List[asyncio.Queue]] = {}
-
-    def get_queues(self, run_id: str) -> List[asyncio.Queue]:
+    def __init__(
+        self,
+        replay_policy: Optional[ReplayPolicy] = None,
+        subscriber_policy: Optional[SubscriberPolicy] = None,
+    ):
+        self.queues: Dict[str, List[SubscriberQueue]] = {}
+        self.replay_policy = replay_policy or load_replay_policy()
+        self.subscriber_policy = subscriber_policy or load_subscriber_policy()
+        self.buffers: Dict[str, ReplayBuffer] = {}
+        # Callbacks notified of the runs created on a thread
+        self.thread_watchers: Dict[str, List[Callable[[str], None]]] = {}
+        self._expirations: Dict[str, asyncio.TimerHandle] = {}
+
+    def get_queues(self, run_id: str) -> List[SubscriberQueue]:
         return self.queues.get(run_id, [])
 
-    async def add_queue(self, run_id: str) -> asyncio.Queue:
-        queue = asyncio.Queue()
+    async def add_queue(self, run_id: str) -> SubscriberQueue:
+        queue = SubscriberQueue(run_id, self.subscriber_policy)
         self.queues.setdefault(run_id, []).append(queue)
         return queue
 
-    async def remove_queue(self, run_id: str, queue: asyncio.Queue):
-        self.queues[run_id].remove(queue)
+    async def remove_queue(self, run_id: str, queue: SubscriberQueue):
+        queues = self.queues.get(run_id)
+        if queues is not None and queue in queues:
+            queues.remove(queue)
+            if not queues:
+                del self.queues[run_id]
+
+    def _buffer(self, run_id: str) -> ReplayBuffer:
+        buffer = self.buffers.get(run_id)
+        if buffer is None:
+            buffer = self.buffers[run_id] = ReplayBuffer(
+                self.replay_policy.max_messages, self.replay_policy.max_bytes
+            )
+        return buffer
+
+    def replay(
+        self, run_id: str, last_seq: Optional[int] = None
+    ) -> Tuple[List[Message], int]:
+        """Buffered messages after `last_seq` and the sequence id after which
+        the live messages are new"""
+        buffer = self.buffers.get(run_id)
+        if buffer is None:
+            return [], last_seq or 0
+        if last_seq is not None and last_seq > buffer.last_seq:
+            # Id of a previous stream of the run, e.g. before the buffer expired
+            last_seq = None
+        messages = buffer.since(last_seq)
+        return messages, messages[-1].seq if messages else last_seq or 0
+
+    def release(self, run_id: str) -> None:
+        """Drop the replay buffer of a run"""
+        self.buffers.pop(run_id, None)
+        expiration = self._expirations.pop(run_id, None)
+        if expiration is not None:
+            expiration.cancel()
+
+    def sequence(self, run_id: str, message: Message) -> None:
+        """Number a message published for the run, if not done yet"""
+        if message.seq is None:
+            message.seq = self._buffer(run_id).next_seq()
+
+    def _record(self, run_id: str, message: Message) -> None:
+        self.sequence(run_id, message)
+        buffer = self._buffer(run_id)
+        buffer.append(message)
+
+        expiration = self._expirations.pop(run_id, None)
+        if expiration is not None:
+            expiration.cancel()
+        if buffer.done:
+            self._expirations[run_id] = asyncio.get_running_loop().call_later(
+                self.replay_policy.grace_s, self.release, run_id
+            )
 
     async def put_message(self, run_id: str, message: Message) -> None:
+        """Never waits for the subscribers: slow ones are handled by the
+        overflow policy of their queue"""
+        self._record(run_id, message)
         queues = self.get_queues(run_id)
-        num = len(queues)
-        if not queues:
-            logger.warning(f"No queues found for run_id {run_id}")
-        await asyncio.gather(*(queue.put(message) for queue in queues))
-        logger.debug(f"Message put on {num} queues for run_id {run_id}")
+        for queue in queues:
+            queue.put_nowait(message)
+        logger.debug(
+            f"Message {message.seq} put on {len(queues)} queues for run_id {run_id}"
+        )
+
+    def watch_thread(self, thread_id: str, callback: Callable[[str], None]) -> None:
+        self.thread_watchers.setdefault(thread_id, []).append(callback)
+
+    def unwatch_thread(self, thread_id: str, callback: Callable[[str], None]) -> None:
+        watchers = self.thread_watchers.get(thread_id)
+        if watchers is not None and callback in watchers:
+            watchers.remove(callback)
+            if not watchers:
+                del self.thread_watchers[thread_id]
+
+    def announce_run(self, thread_id: str, run_id: str) -> None:
+        """Notify the watchers of a thread that a run was created on it"""
+        for callback in list(self.thread_watchers.get(thread_id, [])):
+            callback(run_id)
+
+    def subscribers_stats(self) -> List[Dict[str, Any]]:
+        return [queue.to_dict() for queues in self.queues.values() for queue in queues]
 
 
 stream_manager = StreamManager()
-cvs_pending_run = defaultdict(asyncio.Condition)
-RUNS_QUEUE = asyncio.Queue()
+run_completions = CompletionRegistry()
+RUNS_QUEUE = create_scheduler()
+
+
+async def notify_run_status(run_id: str, run: Optional[Run] = None) -> None:
+    """Resolve the local waiters of a run that is not pending anymore, or
+    deleted. `run` is its final state when the caller has it."""
+    if run_id not in run_completions:
+        return
+    if run is None:
+        run = DB.get_run(run_id)
+    if run is not None and run["status"] == "pending":
+        # e.g. resumed meanwhile
+        return
+    output = DB.get_run_output(run_id) if run is not None else None
+    run_completions.resolve(run_id, run, output)
+
+
+def _stored_completion(run_id: str) -> Optional[Completion]:
+    """Final state and output of a run that is not pending, or deleted"""
+    run = DB.get_run(run_id)
+    if run is None:
+        return None, None
+    if run["status"] != "pending":
+        return run, DB.get_run_output(run_id)
+    return None
+
+
+async def wait_for_completion(
+    run_id: str, timeout: Optional[float] = None
+) -> Completion:
+    """Wait for a run to stop being pending. Raise TimeoutError after
+    `timeout` seconds."""
+    completion = _stored_completion(run_id)
+    if completion is not None:
+        return completion
+
+    broker = get_broker_client()
+    if broker is None:
+        return await run_completions.wait(run_id, timeout)
+
+    # The run may be executed by another process. Only subscribed while
+    # waiting, and only for runs that are still pending.
+    await broker.subscribe(run_id)
+    try:
+        # Completed before the subscription
+        completion = _stored_completion(run_id)
+        if completion is not None:
+            return completion
+        return await run_completions.wait(run_id, timeout)
+    finally:
+        broker.unsubscribe(run_id)
+
+
+async def replay_buffered(
+    run_id: str, last_seq: Optional[int]
+) -> Optional[Tuple[List[Message], int]]:
+    """Handle the replay requests of the other API processes, None when no
+    messages of the run are buffered in this process"""
+    if run_id not in stream_manager.buffers:
+        return None
+    return stream_manager.replay(run_id, last_seq)
+
+
+async def _replay(run_id: str, last_seq: Optional[int]) -> Tuple[List[Message], int]:
+    """Buffered messages of the run. With several API processes, the messages
+    are buffered by the process executing the run, and partially by the ones
+    subscribed to it: the longest replay wins."""
+    replayed = stream_manager.replay(run_id, last_seq)
+    broker = get_broker_client()
+    if broker is not None:
+        for result in await broker.request(run_id, "replay", last_seq):
+            if isinstance(result, Exception):
+                logger.error(f"Failed to replay run {run_id}: {result}")
+            elif len(result[0]) > len(replayed[0]):
+                replayed = result
+    return replayed
 
 
 class Runs:
     @staticmethod
-    async def put(run_create: ApiRunCreate) -> ApiRun:
+    async def put(
+        run_create: ApiRunCreate, scheduling: Optional[RunScheduling] = None
+    ) -> ApiRun:
+        scheduling = scheduling or RunScheduling()
         new_run = _make_run(run_create)
         run_info = RunInfo(
             run_id=new_run["run_id"],
@@ -172,7 +327,15 @@ class Runs:
         DB.create_run(new_run)
         DB.create_run_info(run_info)
 
-        await RUNS_QUEUE.put(new_run["run_id"])
+        await RUNS_QUEUE.put(
+            QueuedRun(
+                run_id=new_run["run_id"],
+                agent_id=new_run["agent_id"],
+                priority=scheduling.resolve_priority(new_run["metadata"]),
+                tenant=scheduling.tenant,
+                trace_context=tracing.inject(),
+            )
+        )
         return _to_api_model(new_run)
 
     @staticmethod
@@ -220,7 +383,10 @@ class Runs:
         return [_to_api_model(run) for run in filtered_list]
 
     @staticmethod
-    async def resume(run_id: str, user_input: Any) -> ApiRun:
+    async def resume(
+        run_id: str, user_input: Any, scheduling: Optional[RunScheduling] = None
+    ) -> ApiRun:
+        scheduling = scheduling or RunScheduling()
         run = DB.get_run(run_id)
         check_run_is_interrupted(run)
 
@@ -231,7 +397,16 @@ class Runs:
         DB.update_run_info(run_id, {"attempts": 0, "queued_at": datetime.now()})
         updated = DB.update_run_status(run_id, "pending")
 
-        await RUNS_QUEUE.put(updated["run_id"])
+        await RUNS_QUEUE.put(
+            QueuedRun(
+                run_id=updated["run_id"],
+                agent_id=updated["agent_id"],
+                priority=scheduling.resolve_priority(updated["metadata"]),
+                tenant=scheduling.tenant,
+                resumed=True,
+                trace_context=tracing.inject(),
+            )
+        )
         return _to_api_model(updated)
 
     @staticmethod
@@ -241,11 +416,13 @@ class Runs:
             raise Exception("Run not found")
 
         run = DB.update_run_status(run_id, status)
-        await _call_webhook(run)
+        _call_webhook(run)
 
         if status != "pending":
-            async with cvs_pending_run[run_id]:
-                cvs_pending_run[run_id].notify_all()
+            await notify_run_status(run_id, run)
+            broker = get_broker_client()
+            if broker is not None:
+                broker.notify_status(run_id)
 
     @staticmethod
     async def wait(run_id: str):
@@ -265,86 +442,39 @@ class Runs:
     async def wait_for_output(
         run_id: str, timeout: float = None
     ) -> tuple[ApiRun | None, Any]:
-        run = DB.get_run(run_id)
-
-        if run is None:
-            return None, None
-
-        if run["status"] != "pending":
-            # If the run is already completed, return the stored output immediately
-            return _to_api_model(run), DB.get_run_output(run_id)
-
-        # TODO: handle removing cvs when run is completed and there are no more subscribers
         try:
-            async with cvs_pending_run[run_id]:
-                await asyncio.wait_for(
-                    cvs_pending_run[run_id].wait_for(
-                        lambda: DB.get_run_status(run_id) != "pending"
-                    ),
-                    timeout=timeout,
-                )
-                run = DB.get_run(run_id)
-                return _to_api_model(run), DB.get_run_output(run_id)
+            run, output = await wait_for_completion(run_id, timeout)
         except asyncio.TimeoutError:
             logger.warning(f"Timeout reached while waiting for run {run_id}")
             raise TimeoutError
-
-        return None, None
+        if run is None:
+            # Deleted, e.g. cancelled with rollback
+            return None, None
+        return _to_api_model(run), output
 
     @staticmethod
-    async def stream_events(run_id: str) -> AsyncIterator[StreamEventPayload | None]:
-        async for message in Runs.Stream.join(run_id):
-            msg_data = message.data
-
+    async def stream_frames(
+        run_id: str, last_event_id: Optional[int] = None
+    ) -> AsyncIterator[bytes]:
+        """SSE frames of the run stream, starting after `last_event_id` if the
+        run messages are still buffered. The frames are encoded once when
+        published and shared by all the subscribers."""
+        async for message in Runs.Stream.join(run_id, last_event_id):
             if message.type == "control":
                 if message.data == "done":
                     break
                 elif message.data == "timeout":
-                    yield None
-                    continue
+                    yield KEEPALIVE_FRAME
                 else:
                     logger.error(
                         f'received unknown control message "{message.data}" in stream events for run: {run_id}'
                     )
-                    continue
+                continue
 
-            # We need to get the latest value to return
-            run = DB.get_run(run_id)
-            if run is None:
-                raise ValueError(f"Run {run_id} not found")
-
-            run_status = run["status"]
-            if run_status == "interrupted":
-                yield StreamEventPayload(
-                    ValueRunInterruptUpdate(
-                        type="interrupt",
-                        run_id=run["run_id"],
-                        status=run_status,
-                        interrupt=msg_data,
-                    )
-                )
-            elif run_status == "success" or run_status == "pending":
-                yield StreamEventPayload(
-                    ValueRunResultUpdate(
-                        type="values",
-                        run_id=run["run_id"],
-                        status=run_status,
-                        values=msg_data,
-                    )
-                )
-            elif run_status == "error":
-                yield StreamEventPayload(
-                    ValueRunErrorUpdate(
-                        type="error",
-                        run_id=run["run_id"],
-                        status=run_status,
-                        description=msg_data,
-                        # FIXME: we have not defined the errcodes
-                        errcode=0,
-                    )
-                )
-            else:
-                raise ValueError(f"Run status {run_status} unknown")
+            if message.frame is None:
+                # Put on the stream manager without Runs.Stream.publish
+                message.frame = encode_frame(run_id, DB.get_run_status(run_id), message)
+            yield message.frame
 
     class Interrupts:
         @staticmethod
@@ -356,34 +486,73 @@ class Runs:
     class Stream:
         @staticmethod
         async def publish(run_id: str, message: Message) -> None:
+            stream_manager.sequence(run_id, message)
+            if message.frame is None:
+                message.frame = encode_frame(run_id, DB.get_run_status(run_id), message)
             await stream_manager.put_message(run_id, message)
+            broker = get_broker_client()
+            if broker is not None:
+                broker.publish(run_id, message)
 
         @staticmethod
-        async def subscribe(run_id: str) -> asyncio.Queue:
+        async def subscribe(run_id: str) -> SubscriberQueue:
             queue = await stream_manager.add_queue(run_id)
             logger.debug(f"Subscribed to queue for run_id {run_id}")
             return queue
 
         @staticmethod
         async def join(
-            run_id: str,
+            run_id: str, last_seq: Optional[int] = None
         ) -> AsyncGenerator[Message, None]:
+            """Messages of the run stream. The buffered messages published
+            before the call (after `last_seq` if set) are replayed first."""
             queue = await Runs.Stream.subscribe(run_id)
+            broker = get_broker_client()
+            brokered = False
+            try:
+                run = DB.get_run(run_id)
+                if (
+                    broker is not None
+                    and run is not None
+                    and run["status"] == "pending"
+                ):
+                    # The run may be executed by another process
+                    await broker.subscribe(run_id)
+                    brokered = True
+
+                replayed, last_seq = await _replay(run_id, last_seq)
+
+                # Check after subscribe whether the run is completed to
+                # avoid race condition.
+                run = DB.get_run(run_id)
+                if run is None:
+                    raise ValueError(f"Run {run_id} not found")
 
-            # Check after subscribe whether the run is completed to
-            # avoid race condition.
-            run = DB.get_run(run_id)
-            if run is None:
-                raise ValueError(f"Run {run_id} not found")
-            if run["status"] != "pending" and queue.empty():
-                return
-
-            while True:
-                try:
-                    message: Message = await asyncio.wait_for(queue.get(), timeout=10)
+                for message in replayed:
                     yield message
                     if message.type == "control" and message.data == "done":
-                        break
-                except TimeoutError as error:
-                    logger.error(f"Timeout waiting for run {run_id}: {error}")
-                    yield Message(type="control", data="timeout")
+                        return
+                if run["status"] != "pending" and queue.empty():
+                    return
+
+                while True:
+                    try:
+                        message: Message = await asyncio.wait_for(
+                            queue.get(), timeout=10
+                        )
+                        if message.seq is not None and message.seq <= last_seq:
+                            # Already replayed
+                            continue
+                        yield message
+                        if message.type == "control" and message.data == "done":
+                            break
+                    except TimeoutError as error:
+                        logger.error(f"Timeout waiting for run {run_id}: {error}")
+                        yield Message(type="control", data="timeout")
+            except SlowConsumerError as error:
+                # The client can reconnect and resume from the replay buffer
+                logger.warning(str(error))
+            finally:
+                await stream_manager.remove_queue(run_id, queue)
+                if brokered:
+                    broker.unsubscribe(run_id)
@@ -0,0 +1,345 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import hashlib
+import heapq
+import itertools
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from collections import defaultdict, deque
+from typing import (
+    Any,
+    Deque,
+    Dict,
+    Hashable,
+    List,
+    Literal,
+    NamedTuple,
+    Optional,
+    Tuple,
+    get_args,
+)
+
+logger = logging.getLogger(__name__)
+
+RunPriority = Literal["interactive", "normal", "batch"]
+RUN_PRIORITIES: Tuple[str, ...] = get_args(RunPriority)
+DEFAULT_RUN_PRIORITY: RunPriority = "normal"
+
+# Run metadata key selecting the priority class of a run
+PRIORITY_METADATA_KEY = "priority"
+
+# Share of the workers each lane gets when all of them have queued runs.
+# Resumed interrupts have their own lane: a human is waiting for them.
+DEFAULT_LANE_WEIGHTS: Dict[str, float] = {
+    "resume": 32,
+    "interactive": 16,
+    "normal": 4,
+    "batch": 1,
+}
+
+
+class QueuedRun(NamedTuple):
+    """A run waiting to be executed"""
+
+    run_id: str
+    agent_id: str
+    priority: RunPriority = DEFAULT_RUN_PRIORITY
+    # Hash of the API key that created the run, if any
+    tenant: Optional[str] = None
+    resumed: bool = False
+    # Trace context of the request that queued the run, see services/tracing.py
+    trace_context: Optional[Dict[str, str]] = None
+
+    @property
+    def lane(self) -> str:
+        return "resume" if self.resumed else self.priority
+
+
+class RunScheduling(NamedTuple):
+    """Scheduling parameters of a request creating runs"""
+
+    # Explicitly requested priority (e.g. with a request header)
+    priority: Optional[RunPriority] = None
+    # Priority when neither the request nor the run metadata set it
+    default_priority: RunPriority = DEFAULT_RUN_PRIORITY
+    tenant: Optional[str] = None
+
+    def resolve_priority(self, metadata: Optional[Dict[str, Any]]) -> RunPriority:
+        if self.priority is not None:
+            return self.priority
+        if metadata and metadata.get(PRIORITY_METADATA_KEY) is not None:
+            priority = metadata[PRIORITY_METADATA_KEY]
+            if priority in RUN_PRIORITIES:
+                return priority
+            logger.warning(f'Ignoring unknown run priority "{priority}"')
+        return self.default_priority
+
+
+def tenant_of(api_key: Optional[str]) -> Optional[str]:
+    """Identify a tenant by its API key without keeping the key around"""
+    if not api_key:
+        return None
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+# Flow entry: (finish tag, sequence, start tag, run)
+_Entry = Tuple[float, int, float, QueuedRun]
+
+
+class RunScheduler(ABC):
+    """Queue of the runs to execute, with the interface of asyncio.Queue.
+
+    Runs are grouped in flows, each one a FIFO. The next run is taken from the
+    head of the flows with the lowest finish tag. Agents can have a max number
+    of concurrent runs: once reached, their flows are parked until one of
+    their runs is released."""
+
+    def __init__(self, concurrency_limits: Optional[Dict[str, int]] = None):
+        self.concurrency_limits: Dict[str, int] = dict(concurrency_limits or {})
+        self._flows: Dict[Hashable, Deque[_Entry]] = {}
+        # Heads of the flows that are not parked
+        self._heads: List[Tuple[float, int, float, QueuedRun, Hashable]] = []
+        self._parked: Dict[str, List[Hashable]] = defaultdict(list)
+        self._queued: Dict[str, int] = defaultdict(int)
+        self._running: Dict[str, int] = defaultdict(int)
+        self._seq = itertools.count()
+        self._size = 0
+        # Futures of the callers waiting in `get`, created on their event loop
+        self._getters: Deque[asyncio.Future] = deque()
+        self._unfinished = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    @abstractmethod
+    def _flow_key(self, run: QueuedRun) -> Hashable:
+        pass
+
+    @abstractmethod
+    def _tags(self, flow: Hashable, run: QueuedRun) -> Tuple[float, float]:
+        """Start and finish tags of a run queued in `flow`"""
+        pass
+
+    def _on_dequeue(self, start: float) -> None:
+        pass
+
+    def _on_idle(self) -> None:
+        pass
+
+    def _wakeup_getters(self) -> None:
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+
+    def set_concurrency_limit(self, agent_id: str, limit: Optional[int]) -> None:
+        if limit is None:
+            self.concurrency_limits.pop(agent_id, None)
+        else:
+            self.concurrency_limits[agent_id] = limit
+        self._unpark(agent_id)
+
+    def _at_limit(self, agent_id: str) -> bool:
+        limit = self.concurrency_limits.get(agent_id)
+        return limit is not None and self._running.get(agent_id, 0) >= limit
+
+    def _push_head(self, flow: Hashable) -> None:
+        finish, seq, start, run = self._flows[flow][0]
+        heapq.heappush(self._heads, (finish, seq, start, run, flow))
+
+    def _unpark(self, agent_id: str) -> None:
+        flows = self._parked.pop(agent_id, None)
+        if flows:
+            for flow in flows:
+                self._push_head(flow)
+            self._wakeup_getters()
+
+    def _pop_runnable(self) -> Optional[QueuedRun]:
+        while self._heads:
+            _, _, start, run, flow = heapq.heappop(self._heads)
+            if self._at_limit(run.agent_id):
+                self._parked[run.agent_id].append(flow)
+                continue
+            entries = self._flows[flow]
+            entries.popleft()
+            if entries:
+                self._push_head(flow)
+            else:
+                del self._flows[flow]
+            self._size -= 1
+            self._queued[run.agent_id] -= 1
+            if not self._queued[run.agent_id]:
+                del self._queued[run.agent_id]
+            self._running[run.agent_id] += 1
+            self._on_dequeue(start)
+            if not self._size:
+                self._on_idle()
+            return run
+        return None
+
+    def qsize(self) -> int:
+        return self._size
+
+    def empty(self) -> bool:
+        return self._size == 0
+
+    def runnable_size(self) -> int:
+        """Number of queued runs that can start now, given the concurrency limits"""
+        size = 0
+        for agent_id, queued in self._queued.items():
+            limit = self.concurrency_limits.get(agent_id)
+            if limit is None:
+                size += queued
+            else:
+                size += max(0, min(queued, limit - self._running.get(agent_id, 0)))
+        return size
+
+    def running(self, agent_id: str) -> int:
+        return self._running.get(agent_id, 0)
+
+    def __contains__(self, run_id: str) -> bool:
+        """Whether the run is queued, not taken by a worker yet"""
+        return any(
+            run.run_id == run_id
+            for entries in self._flows.values()
+            for _, _, _, run in entries
+        )
+
+    def put_nowait(self, run: QueuedRun) -> None:
+        flow = self._flow_key(run)
+        start, finish = self._tags(flow, run)
+        entries = self._flows.get(flow)
+        if entries is None:
+            entries = self._flows[flow] = deque()
+        entries.append((finish, next(self._seq), start, run))
+        if len(entries) == 1:
+            if self._at_limit(run.agent_id):
+                self._parked[run.agent_id].append(flow)
+            else:
+                self._push_head(flow)
+        self._size += 1
+        self._queued[run.agent_id] += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wakeup_getters()
+
+    async def put(self, run: QueuedRun) -> None:
+        self.put_nowait(run)
+
+    async def get(self) -> QueuedRun:
+        """Wait for the next run that can start. Callers must `release` it
+        once executed."""
+        while True:
+            run = self._pop_runnable()
+            if run is not None:
+                return run
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except asyncio.CancelledError:
+                if getter in self._getters:
+                    self._getters.remove(getter)
+                raise
+
+    def release(self, run: QueuedRun) -> None:
+        """Free the concurrency slot taken by a run returned by `get`"""
+        self._running[run.agent_id] -= 1
+        if not self._running[run.agent_id]:
+            del self._running[run.agent_id]
+        self._unpark(run.agent_id)
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if self._unfinished == 0:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+
+class FifoScheduler(RunScheduler):
+    """Runs are executed in the order they are queued"""
+
+    def _flow_key(self, run: QueuedRun) -> Hashable:
+        return run.agent_id
+
+    def _tags(self, flow: Hashable, run: QueuedRun) -> Tuple[float, float]:
+        return 0.0, 0.0
+
+
+class FairScheduler(RunScheduler):
+    """Start-time fair queuing over flows of runs.
+
+    A flow is the runs of one lane (priority class or resumed interrupts),
+    tenant and agent. Backlogged flows share the workers in proportion to
+    their weight: the lane weight times the agent weight. A burst in one flow
+    only delays the runs of that flow, and a run arriving in an idle flow is
+    served ahead of the backlog of lower weight flows."""
+
+    def __init__(
+        self,
+        lane_weights: Optional[Dict[str, float]] = None,
+        agent_weights: Optional[Dict[str, float]] = None,
+        concurrency_limits: Optional[Dict[str, int]] = None,
+    ):
+        super().__init__(concurrency_limits)
+        self.lane_weights = {**DEFAULT_LANE_WEIGHTS, **(lane_weights or {})}
+        self.agent_weights = agent_weights or {}
+        self._virtual_time = 0.0
+        self._flow_finish: Dict[Hashable, float] = {}
+
+    def _weight(self, run: QueuedRun) -> float:
+        return self.lane_weights[run.lane] * self.agent_weights.get(run.agent_id, 1)
+
+    def _flow_key(self, run: QueuedRun) -> Hashable:
+        return (run.lane, run.tenant, run.agent_id)
+
+    def _tags(self, flow: Hashable, run: QueuedRun) -> Tuple[float, float]:
+        start = max(self._virtual_time, self._flow_finish.get(flow, 0.0))
+        finish = start + 1 / self._weight(run)
+        self._flow_finish[flow] = finish
+        return start, finish
+
+    def _on_dequeue(self, start: float) -> None:
+        self._virtual_time = max(self._virtual_time, start)
+
+    def _on_idle(self) -> None:
+        # All the flows are idle: forget them
+        self._flow_finish.clear()
+
+
+def _load_env_dict(env: str, value_type: type) -> Dict[str, Any]:
+    try:
+        values = json.loads(os.getenv(env) or "{}")
+        return {key: value_type(value) for key, value in values.items()}
+    except (json.JSONDecodeError, AttributeError, TypeError, ValueError):
+        raise ValueError(
+            f"Invalid format for {env} environment variable. Must be a dictionary of name -> {value_type.__name__}."
+        )
+
+
+def load_concurrency_limits() -> Dict[str, int]:
+    """Max concurrent runs per agent_id set with AGWS_AGENT_CONCURRENCY"""
+    return _load_env_dict("AGWS_AGENT_CONCURRENCY", int)
+
+
+def create_scheduler() -> RunScheduler:
+    """Create the scheduler selected with AGWS_SCHEDULER"""
+    kind = os.getenv("AGWS_SCHEDULER", "fair").lower()
+    if kind == "fifo":
+        return FifoScheduler(concurrency_limits=load_concurrency_limits())
+    elif kind == "fair":
+        return FairScheduler(
+            lane_weights=_load_env_dict("AGWS_SCHEDULER_LANE_WEIGHTS", float),
+            agent_weights=_load_env_dict("AGWS_SCHEDULER_AGENT_WEIGHTS", float),
+            concurrency_limits=load_concurrency_limits(),
+        )
+    raise ValueError(
+        f'Invalid AGWS_SCHEDULER "{kind}". Supported values are "fair" and "fifo".'
+    )
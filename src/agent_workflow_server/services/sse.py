@@ -0,0 +1,83 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import logging
+from typing import Any, Dict, Optional
+
+from agent_workflow_server.storage.models import RunStatus
+
+from .message import Message
+
+try:
+    import orjson
+except ImportError:  # optional dependency, see the "fast-json" extra
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+SSE_EVENT_NAME = "agent_event"
+# Comment line keeping idle connections open
+KEEPALIVE_FRAME = b":\n\n"
+
+
+def dumps(obj: Any) -> bytes:
+    """Compact JSON encoding, with orjson when installed"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            # e.g. integers over 64 bits or non string keys
+            pass
+    return json.dumps(
+        obj, separators=(",", ":"), ensure_ascii=False, default=str
+    ).encode("utf-8")
+
+
+def event_payload(
+    run_id: str, status: Optional[RunStatus], message: Message
+) -> Dict[str, Any]:
+    """Stream event payload of a message, the dict form of the StreamEventPayload
+    of the API. `status` is the run status when the message was published."""
+    if status == "interrupted":
+        return {
+            "type": "interrupt",
+            "interrupt": message.data,
+            "run_id": run_id,
+            "status": status,
+        }
+    elif status in ("error", "timeout"):
+        return {
+            "type": "error",
+            "run_id": run_id,
+            # FIXME: we have not defined the errcodes
+            "errcode": 0,
+            "description": str(message.data),
+            "status": status,
+        }
+    return {
+        "type": "values",
+        "run_id": run_id,
+        "status": status or "pending",
+        "values": message.data,
+    }
+
+
+def encode_frame(
+    run_id: str, status: Optional[RunStatus], message: Message
+) -> Optional[bytes]:
+    """SSE frame of a published message, None for control messages"""
+    if message.type == "control":
+        return None
+    id_line = b"id: %d\n" % message.seq if message.seq is not None else b""
+    return b"%sevent: %s\ndata: %s\n\n" % (
+        id_line,
+        SSE_EVENT_NAME.encode("ascii"),
+        dumps(event_payload(run_id, status, message)),
+    )
+
+
+def frame_data(frame: bytes) -> memoryview:
+    """JSON payload of an SSE frame encoded by `encode_frame`, without copy"""
+    start = frame.index(b"\ndata: ") + len(b"\ndata: ")
+    return memoryview(frame)[start:-2]
@@ -1,50 +1,56 @@
 # Copyright AGNTCY Contributors (https://github.com/agntcy)
 # SPDX-License-Identifier: Apache-2.0
 
-from typing import AsyncGenerator, List
-
-import jsonschema
+import time
+from typing import AsyncGenerator
 
 from agent_workflow_server.agents.load import get_agent_info
-from agent_workflow_server.generated.models.agent_acp_spec_interrupts_inner import (
-    AgentACPSpecInterruptsInner,
-)
+from agent_workflow_server.agents.validators import InterruptClassifier
 from agent_workflow_server.storage.models import Run
 
+from . import tracing
+from .metrics import VALIDATION_SECONDS
 from .runs import Message
 
 
-def _insert_interrupt_name(
-    interrupts: List[AgentACPSpecInterruptsInner], interrupt_message: Message
-):
+def _insert_interrupt_name(classifier: InterruptClassifier, interrupt_message: Message):
     """
-    Iterates over the 'interrupt' schema in the ACP Descriptor to find the interrupt name, and inserts it into the Message.
+    Finds the interrupt name of the 'interrupt' schema in the ACP Descriptor validating the Message, and inserts it into the Message.
     """
-    for interrupt in interrupts:
-        # Return the first interrupt_type that validates the json schema
-        try:
-            jsonschema.validate(
-                instance=interrupt_message.data, schema=interrupt.interrupt_payload
-            )
-            interrupt_message.interrupt_name = interrupt.interrupt_type
-            break
-        except jsonschema.ValidationError:
-            # If the validation fails, continue and try the next one
-            continue
-    else:
+    started = time.perf_counter()
+    with tracing.span("validate interrupt"):
+        interrupt_name = classifier.classify(interrupt_message.data)
+    VALIDATION_SECONDS.observe(time.perf_counter() - started, "interrupt")
+    if interrupt_name is None:
         raise ValueError(
             f"Interrupt schemas mismatch: could not find matching interrupt type for the received interrupt payload: {interrupt_message.data}. Check the interrupts schemas in the ACP Descriptor."
         )
 
+    interrupt_message.interrupt_name = interrupt_name
     return interrupt_message
 
 
 async def stream_run(run: Run) -> AsyncGenerator[Message, None]:
     agent_info = get_agent_info(run["agent_id"])
     agent = agent_info.agent
-    async for message in agent.astream(run=run):
-        if message.type == "interrupt":
-            message = _insert_interrupt_name(
-                agent_info.acp_descriptor.specs.interrupts, message
-            )
-        yield message
+    # Not current across the yields: the generator runs in the context of its
+    # consumer, and can be closed from another one
+    span = tracing.start_span(
+        "agent.astream", {"run.id": run["run_id"], "agent.id": run["agent_id"]}
+    )
+    try:
+        stream = agent.astream(run=run)
+        while True:
+            # Current only while the agent runs
+            with tracing.use_span(span):
+                try:
+                    message = await anext(stream)
+                except StopAsyncIteration:
+                    break
+                if message.type == "interrupt":
+                    message = _insert_interrupt_name(
+                        agent_info.validators.interrupt_classifier, message
+                    )
+            yield message
+    finally:
+        tracing.end_span(span)
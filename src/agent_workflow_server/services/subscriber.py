@@ -0,0 +1,171 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import logging
+import os
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, Literal, NamedTuple, Optional, Tuple, get_args
+
+from .message import Message
+
+logger = logging.getLogger(__name__)
+
+OverflowPolicy = Literal["drop_oldest", "coalesce", "disconnect"]
+OVERFLOW_POLICIES: Tuple[str, ...] = get_args(OverflowPolicy)
+
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 100
+DEFAULT_OVERFLOW_POLICY: OverflowPolicy = "disconnect"
+
+
+class SubscriberPolicy(NamedTuple):
+    # Max number of messages waiting to be read by a subscriber
+    max_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE
+    # What to do when a subscriber does not keep up:
+    # - disconnect: end the subscription, the client can reconnect and
+    #   resume from the replay buffer
+    # - coalesce: replace the waiting snapshots by the latest one, see
+    #   Message.snapshot. Disconnect on other messages, e.g. the node
+    #   updates streamed by the LangGraph adapter, which cannot be merged
+    # - drop_oldest: drop the oldest waiting message
+    overflow: OverflowPolicy = DEFAULT_OVERFLOW_POLICY
+
+
+def load_subscriber_policy() -> SubscriberPolicy:
+    """Read the stream subscriber policy from the environment"""
+    overflow = os.getenv("AGWS_STREAM_OVERFLOW_POLICY", DEFAULT_OVERFLOW_POLICY)
+    if overflow not in OVERFLOW_POLICIES:
+        raise ValueError(
+            f'Invalid AGWS_STREAM_OVERFLOW_POLICY "{overflow}". Supported values are {", ".join(OVERFLOW_POLICIES)}.'
+        )
+    max_size = int(
+        os.getenv("AGWS_STREAM_SUBSCRIBER_QUEUE_SIZE", DEFAULT_SUBSCRIBER_QUEUE_SIZE)
+    )
+    if max_size < 1:
+        raise ValueError("AGWS_STREAM_SUBSCRIBER_QUEUE_SIZE must be at least 1")
+    return SubscriberPolicy(max_size=max_size, overflow=overflow)
+
+
+class SlowConsumerError(Exception):
+    """Raised to a subscriber disconnected because it did not keep up"""
+
+
+def _is_control(message: Message) -> bool:
+    # Control and interrupt messages are never dropped
+    return message.type != "message"
+
+
+class SubscriberQueue:
+    """Bounded queue of the messages of a run waiting to be read by one
+    subscriber. Putting a message never blocks: when the queue is full the
+    overflow policy is applied."""
+
+    def __init__(self, run_id: str, policy: SubscriberPolicy):
+        self.run_id = run_id
+        self.policy = policy
+        self._messages: Deque[Message] = deque()
+        self._getter: Optional[asyncio.Future] = None
+        self.connected_at = datetime.now()
+        self.disconnected = False
+        self.received = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.max_lag = 0
+        # Sequence id of the last published and last read messages
+        self.last_published_seq: Optional[int] = None
+        self.last_delivered_seq: Optional[int] = None
+
+    def qsize(self) -> int:
+        return len(self._messages)
+
+    def empty(self) -> bool:
+        return not self._messages
+
+    def _wakeup(self) -> None:
+        if self._getter is not None and not self._getter.done():
+            self._getter.set_result(None)
+
+    def _drop_oldest(self) -> bool:
+        for i, message in enumerate(self._messages):
+            if not _is_control(message):
+                del self._messages[i]
+                self.dropped += 1
+                return True
+        return False
+
+    def _coalesce(self) -> bool:
+        # The new snapshot replaces the waiting ones
+        kept = deque(m for m in self._messages if not m.snapshot)
+        coalesced = len(self._messages) - len(kept)
+        self._messages = kept
+        self.coalesced += coalesced
+        return coalesced > 0
+
+    def put_nowait(self, message: Message) -> None:
+        if self.disconnected:
+            return
+        self.received += 1
+        self.last_published_seq = message.seq
+
+        if len(self._messages) >= self.policy.max_size:
+            if self.policy.overflow == "drop_oldest":
+                made_room = self._drop_oldest()
+            elif self.policy.overflow == "coalesce" and message.snapshot:
+                made_room = self._coalesce()
+            else:
+                self.disconnect()
+                return
+            if not made_room:
+                # Only messages that cannot be dropped are waiting
+                logger.debug(f"Subscriber queue of run {self.run_id} over its size")
+
+        self._messages.append(message)
+        self.max_lag = max(self.max_lag, len(self._messages))
+        self._wakeup()
+
+    def disconnect(self) -> None:
+        if not self.disconnected:
+            logger.warning(
+                f"Disconnecting slow subscriber of run {self.run_id} ({len(self._messages)} messages waiting)"
+            )
+        self.disconnected = True
+        self._messages.clear()
+        self._wakeup()
+
+    async def get(self) -> Message:
+        while not self._messages:
+            if self.disconnected:
+                raise SlowConsumerError(
+                    f"Subscriber of run {self.run_id} disconnected, it did not keep up with the stream"
+                )
+            self._getter = asyncio.get_running_loop().create_future()
+            try:
+                await self._getter
+            finally:
+                self._getter = None
+        message = self._messages.popleft()
+        self.delivered += 1
+        if message.seq is not None:
+            self.last_delivered_seq = message.seq
+        return message
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "run_id": self.run_id,
+            "connected_at": self.connected_at.isoformat(),
+            "overflow": self.policy.overflow,
+            "lag": len(self._messages),
+            "max_lag": self.max_lag,
+            # Messages published since the last one read, including the dropped ones
+            "lag_seq": self.last_published_seq - self.last_delivered_seq
+            if self.last_published_seq is not None
+            and self.last_delivered_seq is not None
+            else None,
+            "received": self.received,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "disconnected": self.disconnected,
+        }
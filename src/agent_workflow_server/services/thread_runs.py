@@ -13,7 +13,14 @@ from agent_workflow_server.generated.models.run_create_stateful import (
 from agent_workflow_server.generated.models.run_stateful import (
     RunStateful as ApiRunStateful,
 )
-from agent_workflow_server.services.runs import RUNS_QUEUE, cvs_pending_run
+from agent_workflow_server.services import tracing
+from agent_workflow_server.services.queue import RunNotFoundError, cancel_run
+from agent_workflow_server.services.runs import (
+    RUNS_QUEUE,
+    stream_manager,
+    wait_for_completion,
+)
+from agent_workflow_server.services.scheduler import QueuedRun, RunScheduling
 from agent_workflow_server.services.threads import PendingRunError, Threads
 from agent_workflow_server.storage.models import Run, RunInfo
 from agent_workflow_server.storage.storage import DB
@@ -125,8 +132,13 @@ class ThreadRuns:
         return []
 
     @staticmethod
-    async def put(run_create: ApiRunCreateStateful, thread_id: str) -> ApiRunStateful:
+    async def put(
+        run_create: ApiRunCreateStateful,
+        thread_id: str,
+        scheduling: Optional[RunScheduling] = None,
+    ) -> ApiRunStateful:
         """Create a new run."""
+        scheduling = scheduling or RunScheduling()
         # Check if the thread exists
         thread = await Threads.get_thread_by_id(thread_id)
         if not thread:
@@ -149,37 +161,43 @@ class ThreadRuns:
         DB.create_run(new_run)
         DB.create_run_info(run_info)
 
-        await RUNS_QUEUE.put(new_run["run_id"])
+        await RUNS_QUEUE.put(
+            QueuedRun(
+                run_id=new_run["run_id"],
+                agent_id=new_run["agent_id"],
+                priority=scheduling.resolve_priority(new_run["metadata"]),
+                tenant=scheduling.tenant,
+                trace_context=tracing.inject(),
+            )
+        )
+        stream_manager.announce_run(thread_id, new_run["run_id"])
 
         return _to_api_model(new_run)
 
     @staticmethod
     async def wait_for_output(run_id: str, timeout: float = None):
-        run = DB.get_run(run_id)
-
-        if run is None:
-            return None, None
-
-        if run["status"] != "pending":
-            # If the run is already completed, return the stored output immediately
-            return _to_api_model(run), DB.get_run_output(run_id)
-
-        # TODO: handle removing cvs when run is completed and there are no more subscribers
         try:
-            async with cvs_pending_run[run_id]:
-                await asyncio.wait_for(
-                    cvs_pending_run[run_id].wait_for(
-                        lambda: DB.get_run_status(run_id) != "pending"
-                    ),
-                    timeout=timeout,
-                )
-                run = DB.get_run(run_id)
-                return _to_api_model(run), DB.get_run_output(run_id)
+            run, output = await wait_for_completion(run_id, timeout)
         except asyncio.TimeoutError:
             logger.warning(f"Timeout reached while waiting for run {run_id}")
             raise TimeoutError
+        if run is None:
+            # Deleted, e.g. cancelled with rollback
+            return None, None
+        return _to_api_model(run), output
+
+    @staticmethod
+    async def cancel(thread_id: str, run_id: str, action: str, wait: bool = False):
+        """Cancel a pending run of a thread."""
+        if not DB.get_thread(thread_id):
+            logger.error(f"Thread with ID {thread_id} does not exist.")
+            raise ThreadNotFoundError(f"Thread with ID {thread_id} does not exist.")
+
+        run = DB.get_run(run_id)
+        if not run or run["thread_id"] != thread_id:
+            raise RunNotFoundError(f"Run {run_id} not found in thread {thread_id}")
 
-        return None, None
+        await cancel_run(run_id, action, wait=wait)
 
     @staticmethod
     async def delete(thread_id: str, run_id: str):
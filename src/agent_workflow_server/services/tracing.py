@@ -0,0 +1,264 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+"""OpenTelemetry spans of the stages of a run: HTTP request, validation,
+queue, agent execution and its steps, webhook delivery.
+
+The trace context of the request creating a run travels with the queued run
+to the worker executing it, and with its webhook deliveries. Without the
+"tracing" extra every helper is a no-op."""
+
+import logging
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Dict, Optional
+
+try:
+    from opentelemetry import context as otel_context
+    from opentelemetry import propagate, trace
+    from opentelemetry.trace import Span, SpanKind, Status, StatusCode
+except ImportError:  # optional dependency, see the "tracing" extra
+    trace = None
+
+logger = logging.getLogger(__name__)
+
+TRACER_NAME = "agent_workflow_server"
+TRACING_EXPORTERS = ("otlp", "file", "console")
+DEFAULT_SERVICE_NAME = "agent-workflow-server"
+
+# Serialized trace context (W3C traceparent and tracestate headers)
+Carrier = Dict[str, str]
+
+
+def _tracer():
+    return trace.get_tracer(TRACER_NAME)
+
+
+def _context(carrier: Optional[Carrier]):
+    return propagate.extract(carrier) if carrier else None
+
+
+def _make_exporter(name: str):
+    if name == "otlp":
+        # Configured by the OTEL_EXPORTER_OTLP_* environment variables
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import (
+            OTLPSpanExporter,
+        )
+
+        return OTLPSpanExporter()
+    if name == "file":
+        from .otlp_file import OTLPFileSpanExporter
+
+        return OTLPFileSpanExporter(os.getenv("AGWS_TRACING_FILE", "traces.jsonl"))
+    from opentelemetry.sdk.trace.export import ConsoleSpanExporter
+
+    return ConsoleSpanExporter()
+
+
+def setup_tracing() -> bool:
+    """Export the spans with the exporter of AGWS_TRACING_EXPORTER. When not
+    set, the spans go to the tracer provider set up by the application, if
+    any. Returns whether the server traces the HTTP requests itself."""
+    exporter = os.getenv("AGWS_TRACING_EXPORTER")
+    if not exporter:
+        return False
+    if exporter not in TRACING_EXPORTERS:
+        raise ValueError(
+            f'Invalid AGWS_TRACING_EXPORTER "{exporter}". Supported values are {", ".join(TRACING_EXPORTERS)}.'
+        )
+    if trace is None:
+        logger.warning(
+            "AGWS_TRACING_EXPORTER is set but OpenTelemetry is not installed, see the tracing extra"
+        )
+        return False
+
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor
+
+    attributes = {}
+    if not os.getenv("OTEL_SERVICE_NAME"):
+        attributes["service.name"] = DEFAULT_SERVICE_NAME
+    provider = TracerProvider(resource=Resource.create(attributes))
+    provider.add_span_processor(BatchSpanProcessor(_make_exporter(exporter)))
+    trace.set_tracer_provider(provider)
+    logger.info(f"Exporting traces with the {exporter} exporter")
+    return True
+
+
+def flush() -> None:
+    """Export the ended spans now, e.g. in a process that may be killed"""
+    if trace is None:
+        return
+    force_flush = getattr(trace.get_tracer_provider(), "force_flush", None)
+    if force_flush is not None:
+        force_flush()
+
+
+def inject() -> Optional[Carrier]:
+    """Trace context of the current span, None if not traced"""
+    if trace is None or not trace.get_current_span().get_span_context().is_valid:
+        return None
+    carrier: Carrier = {}
+    propagate.inject(carrier)
+    return carrier
+
+
+@contextmanager
+def use_context(carrier: Optional[Carrier]):
+    """Make the trace context of `carrier` the current one, e.g. in the
+    process executing a run"""
+    if trace is None or not carrier:
+        yield
+        return
+    token = otel_context.attach(propagate.extract(carrier))
+    try:
+        yield
+    finally:
+        otel_context.detach(token)
+
+
+def span(
+    name: str,
+    attributes: Optional[Dict[str, Any]] = None,
+    carrier: Optional[Carrier] = None,
+):
+    """Context manager of a span, the current span while in it. Its parent is
+    the trace context of `carrier` when given, else the current span."""
+    if trace is None:
+        return nullcontext()
+    return _tracer().start_as_current_span(
+        name, context=_context(carrier), attributes=attributes
+    )
+
+
+def start_span(
+    name: str, attributes: Optional[Dict[str, Any]] = None
+) -> Optional["Span"]:
+    """Start a child span of the current one, without making it current. It
+    is made current with `use_span` and ended with `end_span`."""
+    if trace is None:
+        return None
+    return _tracer().start_span(name, attributes=attributes)
+
+
+def end_span(span: Optional["Span"]) -> None:
+    if span is not None:
+        span.end()
+
+
+def use_span(span: Optional["Span"]):
+    """Make a span the current one, without ending it. Exceptions raised in
+    the block are recorded on the span."""
+    if trace is None or span is None:
+        return nullcontext()
+    return trace.use_span(span, end_on_exit=False)
+
+
+class ActiveSpan:
+    """Span current from its start to its end, for code that cannot be
+    wrapped in a `with` block. It must be ended by the task that started it."""
+
+    def __init__(
+        self,
+        name: str,
+        attributes: Optional[Dict[str, Any]] = None,
+        carrier: Optional[Carrier] = None,
+    ):
+        self.span: Optional[Span] = None
+        self._token = None
+        if trace is None:
+            return
+        self.span = _tracer().start_span(
+            name, context=_context(carrier), attributes=attributes
+        )
+        self._token = otel_context.attach(trace.set_span_in_context(self.span))
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.span is not None:
+            self.span.set_attribute(key, value)
+
+    def end(self, error: Optional[str] = None) -> None:
+        if self.span is None:
+            return
+        if error is not None:
+            self.span.set_status(Status(StatusCode.ERROR, error))
+        otel_context.detach(self._token)
+        self.span.end()
+
+
+def record_span(
+    name: str,
+    start_s: float,
+    end_s: float,
+    attributes: Optional[Dict[str, Any]] = None,
+    carrier: Optional[Carrier] = None,
+) -> None:
+    """Span of a stage already over, e.g. the time a run waited in the queue.
+    Times are epoch seconds."""
+    if trace is None:
+        return
+    span = _tracer().start_span(
+        name,
+        context=_context(carrier),
+        attributes=attributes,
+        start_time=int(start_s * 1e9),
+    )
+    span.end(end_time=int(end_s * 1e9))
+
+
+class StepSpans:
+    """Spans of the steps of an agent (LangGraph nodes, LlamaIndex step
+    events), children of the current span. A step is reported once done, so
+    its span covers the time since the previous step."""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._last = time.time()
+
+    def step(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        now = time.time()
+        record_span(f"{self.prefix} {name}", self._last, now, attributes)
+        self._last = now
+
+
+class TracingMiddleware:
+    """Server span of each HTTP request, child of the trace context of the
+    request headers. It includes parsing the request body."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if trace is None or scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        carrier = {
+            key.decode("latin-1"): value.decode("latin-1")
+            for key, value in scope["headers"]
+        }
+        with _tracer().start_as_current_span(
+            f"{scope['method']} {scope['path']}",
+            context=propagate.extract(carrier),
+            kind=SpanKind.SERVER,
+            attributes={
+                "http.request.method": scope["method"],
+                "url.path": scope["path"],
+            },
+        ) as span:
+
+            async def send_with_status(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.response.status_code", message["status"])
+                    if message["status"] >= 500:
+                        span.set_status(Status(StatusCode.ERROR))
+                await send(message)
+
+            try:
+                await self.app(scope, receive, send_with_status)
+            finally:
+                route = scope.get("route")
+                if route is not None and hasattr(route, "path"):
+                    span.update_name(f"{scope['method']} {route.path}")
+                    span.set_attribute("http.route", route.path)
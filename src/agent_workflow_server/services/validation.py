@@ -2,11 +2,16 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import logging
+import time
 from typing import Any, List
 
 import jsonschema
 
 from agent_workflow_server.agents.load import AGENTS
+from agent_workflow_server.agents.validators import (
+    InterruptValidators,
+    SchemaValidator,
+)
 from agent_workflow_server.generated.models.agent_acp_spec_interrupts_inner import (
     AgentACPSpecInterruptsInner,
 )
@@ -16,6 +21,8 @@ from agent_workflow_server.generated.models.run_create_stateful import (
 from agent_workflow_server.generated.models.run_create_stateless import (
     RunCreateStateless,
 )
+from agent_workflow_server.services import tracing
+from agent_workflow_server.services.metrics import VALIDATION_SECONDS
 from agent_workflow_server.services.utils import check_run_is_interrupted
 from agent_workflow_server.storage.storage import DB
 
@@ -29,9 +36,14 @@ class InvalidFormatException(Exception):
 
 
 def validate_against_schema(
-    instance: Any, schema: dict, error_prefix: str = ""
+    instance: Any,
+    schema: dict | SchemaValidator,
+    error_prefix: str = "",
+    kind: str = "other",
 ) -> None:
-    """Validate an instance against a JSON schema"""
+    """Validate an instance against a JSON schema, or its compiled validator.
+    `kind` labels the time it takes in the metrics and names its span."""
+    started = time.perf_counter()
     # Convert Pydantic models to dict if needed
     if hasattr(instance, "model_dump"):
         # For Pydantic v2
@@ -46,24 +58,30 @@ def validate_against_schema(
         instance = instance.actual_instance
 
     try:
-        jsonschema.validate(instance=instance, schema=schema)
+        with tracing.span(f"validate {kind}"):
+            if isinstance(schema, SchemaValidator):
+                schema.validate(instance)
+            else:
+                jsonschema.validate(instance=instance, schema=schema)
     except jsonschema.ValidationError as e:
         logger.error(f"{error_prefix}: {str(e)}")
         raise InvalidFormatException(f"{error_prefix}: {str(e)}")
+    finally:
+        VALIDATION_SECONDS.observe(time.perf_counter() - started, kind)
 
 
 def get_agent_schemas(agent_id: str):
-    """Get input, output and config schemas for an agent"""
+    """Get the compiled input, output, config and interrupts schemas of an agent"""
     agent_info = AGENTS.get(agent_id)
     if not agent_info:
         raise ValueError(f"Agent {agent_id} not found")
 
-    specs = agent_info.acp_descriptor.specs
+    validators = agent_info.validators
     return {
-        "input": specs.input,
-        "output": specs.output,
-        "config": specs.config,
-        "interrupts": specs.interrupts,
+        "input": validators.input,
+        "output": validators.output,
+        "config": validators.config,
+        "interrupts": validators.interrupts,
     }
 
 
@@ -75,6 +93,7 @@ def validate_output(run_id, agent_id: str, output: Any) -> None:
             instance=output,
             schema=schemas["output"],
             error_prefix=f"Output validation failed for run {run_id}",
+            kind="output",
         )
 
 
@@ -89,10 +108,12 @@ def validate_run_create(
         raise InvalidFormatException('"config" is required for this agent')
 
     if run_create.input:
-        validate_against_schema(run_create.input, schemas["input"])
+        validate_against_schema(run_create.input, schemas["input"], kind="input")
 
     if run_create.config and run_create.config.configurable:
-        validate_against_schema(run_create.config.configurable, schemas["config"])
+        validate_against_schema(
+            run_create.config.configurable, schemas["config"], kind="config"
+        )
 
     return run_create
 
@@ -102,9 +123,9 @@ def validate_resume_run(run_id: str, body: Any):
     check_run_is_interrupted(run)
 
     interrupt_name = run["interrupt"]["name"]
-    interrupts_schemas: List[AgentACPSpecInterruptsInner] = get_agent_schemas(
-        run["agent_id"]
-    )["interrupts"]
+    interrupts_schemas: List[AgentACPSpecInterruptsInner | InterruptValidators] = (
+        get_agent_schemas(run["agent_id"])["interrupts"]
+    )
 
     # Get interrupt_schema given the interrupt_name
     for interrupt_schema in interrupts_schemas:
@@ -114,5 +135,5 @@ def validate_resume_run(run_id: str, body: Any):
         raise ValueError(f"Interrupt {interrupt_name} not found")
 
     validate_against_schema(
-        body, interrupt_schema.resume_payload, "Resume payload not valid"
+        body, interrupt_schema.resume_payload, "Resume payload not valid", "resume"
     )
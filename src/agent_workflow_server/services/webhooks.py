@@ -0,0 +1,277 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+import httpx
+
+from . import tracing
+from .metrics import WEBHOOK_SECONDS
+from .retry import RetryPolicy, parse_retry_policy
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WEBHOOK_QUEUE_SIZE = 10000
+DEFAULT_WEBHOOK_MAX_PER_HOST = 8
+DEFAULT_WEBHOOK_TIMEOUT = 10.0
+DEFAULT_WEBHOOK_RETRY_POLICY = RetryPolicy(
+    max_attempts=5, base_delay=0.5, max_delay=30.0, multiplier=2.0, jitter=0.5
+)
+
+
+class WebhookPolicy(NamedTuple):
+    # Max number of deliveries waiting or in progress, the oldest waiting one
+    # is dropped when full
+    queue_size: int = DEFAULT_WEBHOOK_QUEUE_SIZE
+    # Max number of concurrent requests to the same host
+    max_per_host: int = DEFAULT_WEBHOOK_MAX_PER_HOST
+    # Timeout of a request, in seconds
+    timeout: float = DEFAULT_WEBHOOK_TIMEOUT
+    retry: RetryPolicy = DEFAULT_WEBHOOK_RETRY_POLICY
+
+
+def load_webhook_policy() -> WebhookPolicy:
+    """Read the webhook delivery policy from the environment"""
+    try:
+        retry = json.loads(os.getenv("AGWS_WEBHOOK_RETRY_POLICY") or "{}")
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid webhook retry policy: {e}")
+    policy = WebhookPolicy(
+        queue_size=int(
+            os.getenv("AGWS_WEBHOOK_QUEUE_SIZE", DEFAULT_WEBHOOK_QUEUE_SIZE)
+        ),
+        max_per_host=int(
+            os.getenv("AGWS_WEBHOOK_MAX_PER_HOST", DEFAULT_WEBHOOK_MAX_PER_HOST)
+        ),
+        timeout=float(os.getenv("AGWS_WEBHOOK_TIMEOUT", DEFAULT_WEBHOOK_TIMEOUT)),
+        retry=parse_retry_policy(
+            "AGWS_WEBHOOK_RETRY_POLICY", retry, DEFAULT_WEBHOOK_RETRY_POLICY
+        ),
+    )
+    if policy.queue_size < 1 or policy.max_per_host < 1:
+        raise ValueError(
+            "AGWS_WEBHOOK_QUEUE_SIZE and AGWS_WEBHOOK_MAX_PER_HOST must be at least 1"
+        )
+    return policy
+
+
+class WebhookDeliveryError(Exception):
+    """Raised when a webhook still fails after its last attempt"""
+
+
+class WebhookDelivery(NamedTuple):
+    run_id: str
+    url: str
+    # Run JSON, as of the status change
+    payload: bytes
+    submitted_at: float
+    # Trace context of the run execution, see services/tracing.py
+    trace_context: Optional[Dict[str, str]] = None
+
+
+def _is_retryable(response: httpx.Response) -> bool:
+    return response.status_code == 429 or response.status_code >= 500
+
+
+class WebhookDispatcher:
+    """Delivers the run status changes to the run webhooks in the background.
+
+    Submitting never blocks the caller. Deliveries share one pooled HTTP
+    client, are limited per host and retried with backoff. The deliveries of
+    a run are sent in order, one at a time: the status changes submitted while
+    one is in progress are coalesced, only the latest one is sent."""
+
+    def __init__(
+        self,
+        policy: Optional[WebhookPolicy] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.policy = policy or load_webhook_policy()
+        self._transport = transport
+        self._client: Optional[httpx.AsyncClient] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # Closing of the client of the previous event loop
+        self._closing: Optional[asyncio.Task] = None
+        self._host_slots: Dict[str, asyncio.Semaphore] = {}
+        # Latest delivery waiting per run, in submission order
+        self._pending: "OrderedDict[str, WebhookDelivery]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.submitted = 0
+        self.delivered = 0
+        self.failed = 0
+        self.retried = 0
+        self.coalesced = 0
+        self.dropped = 0
+        self.avg_latency_s: Optional[float] = None
+
+    def _bind_loop(self) -> None:
+        # The client connections and the tasks belong to the event loop
+        loop = asyncio.get_running_loop()
+        if loop is self._loop:
+            return
+        if self._client is not None:
+            self._closing = loop.create_task(self._close_client(self._client))
+        self._loop = loop
+        self._client = httpx.AsyncClient(
+            timeout=self.policy.timeout,
+            transport=self._transport,
+            limits=httpx.Limits(max_keepalive_connections=100, keepalive_expiry=30),
+        )
+        self._host_slots = {}
+        self._pending = OrderedDict()
+        self._in_flight = {}
+
+    def submit(self, run_id: str, url: str, payload: bytes) -> None:
+        """Queue the delivery of a run status change"""
+        self._bind_loop()
+        self.submitted += 1
+        if run_id in self._pending:
+            self.coalesced += 1
+            del self._pending[run_id]
+        elif len(self._pending) + len(self._in_flight) >= self.policy.queue_size:
+            if not self._pending:
+                self.dropped += 1
+                logger.warning(
+                    f"Webhook queue full, dropping the delivery of run {run_id}"
+                )
+                return
+            dropped, _ = self._pending.popitem(last=False)
+            self.dropped += 1
+            logger.warning(
+                f"Webhook queue full, dropping the delivery of run {dropped}"
+            )
+
+        self._pending[run_id] = WebhookDelivery(
+            run_id, url, payload, time.monotonic(), tracing.inject()
+        )
+        if run_id not in self._in_flight:
+            self._start(run_id)
+
+    def _start(self, run_id: str) -> None:
+        delivery = self._pending.pop(run_id)
+        self._in_flight[run_id] = asyncio.create_task(self._deliver(delivery))
+
+    def _host_slot(self, url: str) -> asyncio.Semaphore:
+        host = urlsplit(url).netloc
+        slot = self._host_slots.get(host)
+        if slot is None:
+            slot = self._host_slots[host] = asyncio.Semaphore(self.policy.max_per_host)
+        return slot
+
+    async def _deliver(self, delivery: WebhookDelivery) -> None:
+        try:
+            with tracing.span(
+                "webhook.deliver",
+                {
+                    "run.id": delivery.run_id,
+                    "server.address": urlsplit(delivery.url).netloc,
+                },
+                delivery.trace_context,
+            ):
+                await self._send(delivery)
+        except Exception as e:
+            self.failed += 1
+            logger.error(f"Error calling webhook for run {delivery.run_id}: {e}")
+        finally:
+            if self._in_flight.get(delivery.run_id) is asyncio.current_task():
+                del self._in_flight[delivery.run_id]
+            if (
+                delivery.run_id in self._pending
+                and delivery.run_id not in self._in_flight
+            ):
+                self._start(delivery.run_id)
+
+    async def _send(self, delivery: WebhookDelivery) -> None:
+        retry = self.policy.retry
+        # The receiver can continue the trace of the run
+        headers = {"Content-Type": "application/json", **(tracing.inject() or {})}
+        attempt = 1
+        while True:
+            try:
+                async with self._host_slot(delivery.url):
+                    response = await self._client.post(
+                        delivery.url, content=delivery.payload, headers=headers
+                    )
+                if not _is_retryable(response):
+                    # Other client errors are not retried
+                    response.raise_for_status()
+                    break
+                error = f"status {response.status_code}"
+            except httpx.RequestError as e:
+                error = str(e) or type(e).__name__
+
+            if attempt >= retry.max_attempts:
+                raise WebhookDeliveryError(f"{error} after {attempt} attempts")
+            if delivery.run_id in self._pending:
+                # Superseded by a newer status of the run
+                self.coalesced += 1
+                return
+            self.retried += 1
+            await asyncio.sleep(retry.delay(attempt))
+            attempt += 1
+
+        self._record_latency(delivery)
+        self.delivered += 1
+        logger.info(f"Webhook called successfully for run {delivery.run_id}")
+
+    def _record_latency(self, delivery: WebhookDelivery) -> None:
+        latency = time.monotonic() - delivery.submitted_at
+        WEBHOOK_SECONDS.observe(latency)
+        if self.avg_latency_s is None:
+            self.avg_latency_s = latency
+        else:
+            self.avg_latency_s += 0.1 * (latency - self.avg_latency_s)
+
+    async def flush(self) -> None:
+        """Wait for the queued deliveries to be done"""
+        while self._in_flight:
+            await asyncio.gather(*self._in_flight.values(), return_exceptions=True)
+
+    @staticmethod
+    async def _close_client(client: httpx.AsyncClient) -> None:
+        try:
+            await client.aclose()
+        except Exception as e:
+            # e.g. connections of an event loop already closed
+            logger.debug(f"Error closing the webhook HTTP client: {e}")
+
+    async def aclose(self) -> None:
+        """Give the deliveries in progress up to the request timeout to
+        finish, cancel the others and close the HTTP client"""
+        if self._client is None or self._loop is not asyncio.get_running_loop():
+            return
+        try:
+            await asyncio.wait_for(self.flush(), self.policy.timeout)
+        except asyncio.TimeoutError:
+            self._pending.clear()
+            tasks = list(self._in_flight.values())
+            logger.warning(f"Cancelling {len(tasks)} webhook deliveries")
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        await self._close_client(self._client)
+        self._client = None
+        self._loop = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self._pending),
+            "in_flight": len(self._in_flight),
+            "submitted": self.submitted,
+            "delivered": self.delivered,
+            "failed": self.failed,
+            "retried": self.retried,
+            "coalesced": self.coalesced,
+            "dropped": self.dropped,
+            "avg_latency_s": self.avg_latency_s,
+        }
+
+
+webhook_dispatcher = WebhookDispatcher()
@@ -0,0 +1,119 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+from enum import Enum
+from itertools import count
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Set, Tuple
+
+IndexKey = Tuple[str, ...]
+
+
+def _normalize(value: Any) -> Hashable:
+    """Normalize a value so that equal values hash to the same posting.
+    str based Enums (e.g. RunStatus) compare equal to their value but do not hash like it."""
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+class RecordIndex:
+    """Hash indexes over a set of records.
+
+    Each index is keyed by one or more record fields and maps the (tuple of) field
+    values to the set of record IDs having them (the posting set)."""
+
+    def __init__(self, keys: Iterable[IndexKey]):
+        self._keys: List[IndexKey] = list(keys)
+        self._postings: Dict[IndexKey, Dict[Hashable, Set[str]]] = {
+            key: {} for key in self._keys
+        }
+        # Insertion sequence of every record, to return results in insertion order
+        self._seq: Dict[str, int] = {}
+        self._counter = count()
+
+    def __len__(self) -> int:
+        return len(self._seq)
+
+    def _values(self, key: IndexKey, record: Mapping[str, Any]) -> Hashable:
+        return tuple(_normalize(record.get(field)) for field in key)
+
+    def add(self, record_id: str, record: Mapping[str, Any]) -> None:
+        """Index a new record"""
+        self._seq.setdefault(record_id, next(self._counter))
+        for key in self._keys:
+            values = self._values(key, record)
+            try:
+                self._postings[key].setdefault(values, set()).add(record_id)
+            except TypeError:
+                # Unhashable values are not indexed, lookups fall back to a scan
+                continue
+
+    def remove(self, record_id: str, record: Mapping[str, Any]) -> None:
+        """Remove a record from the indexes"""
+        self._seq.pop(record_id, None)
+        self._discard(record_id, record)
+
+    def update(
+        self, record_id: str, old: Mapping[str, Any], new: Mapping[str, Any]
+    ) -> None:
+        """Move a record to the postings matching its new values"""
+        for key in self._keys:
+            old_values = self._values(key, old)
+            new_values = self._values(key, new)
+            if old_values == new_values:
+                continue
+            self._discard_key(key, record_id, old_values)
+            try:
+                self._postings[key].setdefault(new_values, set()).add(record_id)
+            except TypeError:
+                continue
+
+    def _discard(self, record_id: str, record: Mapping[str, Any]) -> None:
+        for key in self._keys:
+            self._discard_key(key, record_id, self._values(key, record))
+
+    def _discard_key(self, key: IndexKey, record_id: str, values: Hashable) -> None:
+        try:
+            posting = self._postings[key].get(values)
+        except TypeError:
+            return
+        if posting is not None:
+            posting.discard(record_id)
+            if not posting:
+                del self._postings[key][values]
+
+    def rebuild(self, records: Mapping[str, Mapping[str, Any]]) -> None:
+        """Rebuild all indexes from scratch"""
+        self._postings = {key: {} for key in self._keys}
+        self._seq = {}
+        for record_id, record in records.items():
+            self.add(record_id, record)
+
+    def lookup(self, filters: Mapping[str, Any]) -> Tuple[Optional[List[str]], dict]:
+        """Find the IDs of the records matching the indexed filters.
+
+        Returns the candidate IDs (in insertion order), or None if no index covers
+        the filters, and the filters that still have to be checked on each record."""
+        remaining = dict(filters)
+        postings: List[Set[str]] = []
+        # Longest (composite) keys first, so that they cover as many filters as possible
+        for key in sorted(self._keys, key=len, reverse=True):
+            if not all(field in remaining for field in key):
+                continue
+            try:
+                values = tuple(_normalize(remaining[field]) for field in key)
+                posting = self._postings[key].get(values, set())
+            except TypeError:
+                continue
+            postings.append(posting)
+            for field in key:
+                del remaining[field]
+
+        if not postings:
+            return None, remaining
+
+        postings.sort(key=len)
+        candidates = postings[0].intersection(*postings[1:])
+        return sorted(
+            candidates, key=lambda record_id: self._seq.get(record_id, -1)
+        ), remaining
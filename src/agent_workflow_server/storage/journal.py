@@ -0,0 +1,160 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+import json
+import logging
+import os
+import pickle
+import shutil
+import threading
+from datetime import datetime
+from typing import Any, Iterator, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# A journal record: (table, key, value). A None value is a deletion.
+JournalRecord = Tuple[str, str, Optional[Any]]
+
+
+# Type tags are single key objects whose key starts with "$". User keys
+# starting with "$" are escaped with another "$", so that values from requests
+# (run input, output, metadata, thread values) can never be read as a tag.
+_TAG_PREFIX = "$"
+
+
+def _escape_key(key: Any) -> Any:
+    if isinstance(key, str) and key.startswith(_TAG_PREFIX):
+        return _TAG_PREFIX + key
+    return key
+
+
+def _encode_value(value: Any) -> Any:
+    """Convert a value to JSON native types, tagging the other ones"""
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return value
+    if isinstance(value, dict):
+        return {_escape_key(k): _encode_value(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_encode_value(v) for v in value]
+    if isinstance(value, datetime):
+        return {"$dt": value.isoformat()}
+    # Objects of the server itself (e.g. enums, models), never request data
+    return {"$pickle": base64.b64encode(pickle.dumps(value)).decode("ascii")}
+
+
+def _decode_value(obj: dict) -> Any:
+    if len(obj) == 1:
+        if "$dt" in obj:
+            return datetime.fromisoformat(obj["$dt"])
+        if "$pickle" in obj:
+            return pickle.loads(base64.b64decode(obj["$pickle"]))
+    if any(isinstance(k, str) and k.startswith(_TAG_PREFIX) for k in obj):
+        return {k[1:] if k.startswith(_TAG_PREFIX) else k: v for k, v in obj.items()}
+    return obj
+
+
+def encode_record(table: str, key: str, value: Optional[Any]) -> bytes:
+    """Encode a record as a JSON line"""
+    if value is None:
+        record = {"t": table, "k": key, "d": True}
+    else:
+        record = {"t": table, "k": key, "v": _encode_value(value)}
+    return (json.dumps(record, separators=(",", ":")) + "\n").encode("utf-8")
+
+
+def decode_record(line: bytes) -> JournalRecord:
+    """Decode a JSON line record"""
+    record = json.loads(line, object_hook=_decode_value)
+    return record["t"], record["k"], None if record.get("d") else record["v"]
+
+
+def read_journal(path: str) -> Iterator[JournalRecord]:
+    """Read all the records of a journal file. A truncated trailing record
+    (e.g. a crash in the middle of a write) is skipped."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb") as f:
+        for line_no, line in enumerate(f, start=1):
+            if not line.strip():
+                continue
+            try:
+                yield decode_record(line)
+            except (ValueError, KeyError) as e:
+                logger.warning(
+                    "Skipping corrupted journal record %s:%d: %s", path, line_no, e
+                )
+
+
+class Journal:
+    """Append-only journal file.
+
+    Records are appended to a buffered file and flushed and fsync-ed in batches
+    (group commit) by a background thread every `fsync_interval` seconds."""
+
+    def __init__(self, path: str, fsync_interval: float):
+        self.path = path
+        self.lock = threading.Lock()
+        self._fsync_interval = fsync_interval
+        self._file = open(path, "ab")
+        self._dirty = False
+        self._closed = threading.Event()
+        self._flusher = threading.Thread(
+            target=self._flush_loop, name="agws-journal-flusher", daemon=True
+        )
+        self._flusher.start()
+
+    def append(self, table: str, key: str, value: Optional[Any]) -> None:
+        """Append a record. It is durable after the next group commit."""
+        data = encode_record(table, key, value)
+        with self.lock:
+            if self._file.closed:
+                return
+            self._file.write(data)
+            self._dirty = True
+
+    def _sync(self) -> None:
+        """Flush and fsync pending records. Must be called holding the lock."""
+        if self._dirty and not self._file.closed:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._dirty = False
+
+    def sync(self) -> None:
+        with self.lock:
+            self._sync()
+
+    def _flush_loop(self) -> None:
+        while not self._closed.wait(self._fsync_interval):
+            try:
+                self.sync()
+            except Exception as e:
+                logger.error("Failed to sync journal %s: %s", self.path, str(e))
+
+    def rotate(self) -> str:
+        """Move the current journal aside and start a new one.
+        Must be called holding the lock. Returns the path of the rotated journal."""
+        self._sync()
+        self._file.close()
+        rotated_path = self.path + ".old"
+        if os.path.exists(rotated_path):
+            # The previous compaction failed: keep its records, in order
+            with open(rotated_path, "ab") as rotated, open(self.path, "rb") as current:
+                shutil.copyfileobj(current, rotated)
+                rotated.flush()
+                os.fsync(rotated.fileno())
+            os.remove(self.path)
+        else:
+            os.replace(self.path, rotated_path)
+        self._file = open(self.path, "ab")
+        return rotated_path
+
+    def size(self) -> int:
+        with self.lock:
+            return self._file.tell()
+
+    def close(self) -> None:
+        self._closed.set()
+        with self.lock:
+            self._sync()
+            self._file.close()
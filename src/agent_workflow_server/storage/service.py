@@ -1,11 +1,16 @@
 # Copyright AGNTCY Contributors (https://github.com/agntcy)
 # SPDX-License-Identifier: Apache-2.0
 
+import heapq
 from datetime import datetime
 from typing import Any, Dict, List, Optional
 
+from .index import RecordIndex
 from .models import Run, RunInfo, RunStatus, Thread
 
+RUN_INDEX_KEYS = [("agent_id",), ("thread_id",), ("status",), ("thread_id", "status")]
+THREAD_INDEX_KEYS = [("status",)]
+
 
 class DBOperations:
     """CRUD operations for Runs"""
@@ -21,6 +26,46 @@ class DBOperations:
         self._runs_info: Dict[str, RunInfo] = runs_info
         self._runs_output: Dict[str, Any] = runs_output
         self._threads: Dict[str, Thread] = threads
+        self._runs_index = RecordIndex(RUN_INDEX_KEYS)
+        self._threads_index = RecordIndex(THREAD_INDEX_KEYS)
+        self.reindex()
+
+    def reindex(self) -> None:
+        """Rebuild the search indexes. The CRUD operations keep them up to
+        date, this is only needed after changing the records directly."""
+        self._runs_index.rebuild(self._runs)
+        self._threads_index.rebuild(self._threads)
+
+    def _record_change(self, table: str, key: str, value: Optional[Any]) -> None:
+        """Called after every change of a record (a None value is a deletion).
+        Subclasses can override it to persist changes incrementally."""
+        pass
+
+    @staticmethod
+    def _search_indexed(
+        records: Dict[str, Dict[str, Any]], index: RecordIndex, filters: dict
+    ) -> List[Dict[str, Any]]:
+        """Search records using the index postings, checking non indexed filters on each candidate"""
+        candidate_ids, remaining = index.lookup(filters)
+        if candidate_ids is None:
+            candidates = records.values()
+        else:
+            candidates = (
+                records[record_id]
+                for record_id in candidate_ids
+                if record_id in records
+            )
+
+        results = []
+        for record in candidates:
+            matches = True
+            for key, value in remaining.items():
+                if key not in record or record[key] != value:
+                    matches = False
+                    break
+            if matches:
+                results.append(record)
+        return results
 
     def create_run(self, run: Run) -> Run:
         """Create a new Run"""
@@ -28,6 +73,8 @@ class DBOperations:
         if run_id in self._runs:
             raise ValueError(f"Run with ID {run_id} already exists")
         self._runs[run_id] = run
+        self._runs_index.add(run_id, run)
+        self._record_change("runs", run_id, run)
         return run
 
     def get_run(self, run_id: str) -> Optional[Run]:
@@ -38,6 +85,10 @@ class DBOperations:
         """List all Runs"""
         return list(self._runs.values())
 
+    def count_runs(self) -> int:
+        """Count all Runs"""
+        return len(self._runs)
+
     def update_run(self, run_id: str, updates: dict) -> Optional[Run]:
         """Update a Run with the given updates"""
         if run_id not in self._runs:
@@ -45,31 +96,44 @@ class DBOperations:
         run = self._runs[run_id]
         updated_run = {**run, **updates, "updated_at": datetime.now()}
         self._runs[run_id] = updated_run
+        self._runs_index.update(run_id, run, updated_run)
+        self._record_change("runs", run_id, updated_run)
         return updated_run
 
     def delete_run(self, run_id: str) -> bool:
         """Delete a Run and its associated info and output"""
         if run_id not in self._runs:
             return False
-        del self._runs[run_id]
+        self._runs_index.remove(run_id, self._runs.pop(run_id))
+        self._record_change("runs", run_id, None)
         if run_id in self._runs_info:
             del self._runs_info[run_id]
+            self._record_change("runs_info", run_id, None)
         if run_id in self._runs_output:
             del self._runs_output[run_id]
+            self._record_change("runs_output", run_id, None)
         return True
 
     def search_run(self, filters: dict) -> List[Run]:
         """Search Runs by filters"""
-        results = []
-        for run in self._runs.values():
-            matches = True
-            for key, value in filters.items():
-                if key not in run or run[key] != value:
-                    matches = False
-                    break
-            if matches:
-                results.append(run)
-        return results
+        return self._search_indexed(self._runs, self._runs_index, filters)
+
+    def search_runs_updated_before(
+        self, status: RunStatus, before: datetime, limit: int
+    ) -> List[Run]:
+        """Runs with the given status not updated since `before`, at most
+        `limit`, least recently updated first"""
+        expired = (
+            run
+            for run in self.search_run({"status": status})
+            if run["updated_at"] <= before
+        )
+        return heapq.nsmallest(limit, expired, key=lambda run: run["updated_at"])
+
+    def least_recently_updated_runs(self, limit: int) -> List[Run]:
+        """The `limit` least recently updated runs that are not pending"""
+        finished = (run for run in self._runs.values() if run["status"] != "pending")
+        return heapq.nsmallest(limit, finished, key=lambda run: run["updated_at"])
 
     def get_run_status(self, run_id: str) -> Optional[RunStatus]:
         """Get the status of a Run"""
@@ -83,6 +147,7 @@ class DBOperations:
     def add_run_output(self, run_id: str, output: Any) -> None:
         """Add the output of a Run"""
         self._runs_output[run_id] = output
+        self._record_change("runs_output", run_id, output)
 
     def get_run_output(self, run_id: str) -> Optional[Any]:
         """Get the output of a Run"""
@@ -92,6 +157,7 @@ class DBOperations:
         """Create a new Run info in the database"""
         run_id = str(run_info["run_id"])
         self._runs_info[run_id] = run_info
+        self._record_change("runs_info", run_id, run_info)
         return run_info
 
     def get_run_info(self, run_id: str) -> Optional[RunInfo]:
@@ -108,6 +174,7 @@ class DBOperations:
         if run_id not in self._runs_info:
             return False
         del self._runs_info[run_id]
+        self._record_change("runs_info", run_id, None)
         return True
 
     def update_run_info(self, run_id: str, updates: dict) -> Optional[RunInfo]:
@@ -117,6 +184,7 @@ class DBOperations:
         run_info = self._runs_info[run_id]
         updated_run_info = {**run_info, **updates}
         self._runs_info[run_id] = updated_run_info
+        self._record_change("runs_info", run_id, updated_run_info)
         return updated_run_info
 
     def create_thread(self, thread: Thread) -> Thread:
@@ -125,6 +193,8 @@ class DBOperations:
         if thread_id in self._threads:
             raise ValueError(f"Thread with ID {thread_id} already exists")
         self._threads[thread_id] = thread
+        self._threads_index.add(thread_id, thread)
+        self._record_change("threads", thread_id, thread)
         return thread
 
     def get_thread(self, thread_id: str) -> Optional[Thread]:
@@ -142,24 +212,18 @@ class DBOperations:
         thread = self._threads[thread_id]
         updated_thread = {**thread, **updates, "updated_at": datetime.now()}
         self._threads[thread_id] = updated_thread
+        self._threads_index.update(thread_id, thread, updated_thread)
+        self._record_change("threads", thread_id, updated_thread)
         return updated_thread
 
     def delete_thread(self, thread_id: str) -> bool:
         """Delete a Thread"""
         if thread_id not in self._threads:
             return False
-        del self._threads[thread_id]
+        self._threads_index.remove(thread_id, self._threads.pop(thread_id))
+        self._record_change("threads", thread_id, None)
         return True
 
     def search_thread(self, filters: dict) -> List[Thread]:
         """Search Threads by filters"""
-        results = []
-        for thread in self._threads.values():
-            matches = True
-            for key, value in filters.items():
-                if key not in thread or thread[key] != value:
-                    matches = False
-                    break
-            if matches:
-                results.append(thread)
-        return results
+        return self._search_indexed(self._threads, self._threads_index, filters)
@@ -0,0 +1,428 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import atexit
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+from datetime import datetime
+from enum import Enum
+from typing import Any, Dict, List, Optional, Tuple
+
+from .models import Run, RunInfo, RunStatus, Thread
+from .service import DBOperations
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SQLITE_PATH = "agws_storage.db"
+
+# In WAL mode NORMAL only syncs the WAL on checkpoints: commits do not wait for
+# the disk, a crash of the process loses nothing, a power loss may lose the
+# last commits. FULL syncs every commit.
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL")
+DEFAULT_SYNCHRONOUS = "NORMAL"
+
+_SQLITE_HEADER = b"SQLite format 3\x00"
+
+# Columns that are stored next to the pickled record so that they can be
+# filtered (and indexed) by SQLite instead of in Python.
+RUN_COLUMNS = ("agent_id", "thread_id", "status", "created_at", "updated_at")
+THREAD_COLUMNS = ("status", "created_at", "updated_at")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    agent_id TEXT,
+    thread_id TEXT,
+    status TEXT,
+    created_at REAL,
+    updated_at REAL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_runs_agent_id ON runs (agent_id);
+CREATE INDEX IF NOT EXISTS idx_runs_thread_id ON runs (thread_id);
+CREATE INDEX IF NOT EXISTS idx_runs_status ON runs (status);
+CREATE INDEX IF NOT EXISTS idx_runs_created_at ON runs (created_at);
+CREATE INDEX IF NOT EXISTS idx_runs_thread_id_status ON runs (thread_id, status);
+CREATE INDEX IF NOT EXISTS idx_runs_updated_at ON runs (updated_at);
+CREATE INDEX IF NOT EXISTS idx_runs_status_updated_at ON runs (status, updated_at);
+
+CREATE TABLE IF NOT EXISTS runs_info (
+    run_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS runs_output (
+    run_id TEXT PRIMARY KEY,
+    data BLOB NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    status TEXT,
+    created_at REAL,
+    updated_at REAL,
+    data BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_threads_status ON threads (status);
+CREATE INDEX IF NOT EXISTS idx_threads_created_at ON threads (created_at);
+"""
+
+
+def _column_value(value: Any) -> Any:
+    """Convert a record value to something SQLite can index"""
+    if isinstance(value, datetime):
+        return value.timestamp()
+    if isinstance(value, Enum):
+        return value.value
+    return value
+
+
+def _upsert_sql(table: str, key: str, columns: Tuple[str, ...], insert: bool) -> str:
+    """Build an INSERT (failing on duplicates) or an upsert that keeps the rowid,
+    and therefore the insertion order, of existing records"""
+    all_columns = (key, *columns, "data")
+    sql = f"INSERT INTO {table} ({', '.join(all_columns)}) VALUES ({', '.join('?' * len(all_columns))})"
+    if not insert:
+        updates = ", ".join(
+            f"{column} = excluded.{column}" for column in all_columns[1:]
+        )
+        sql += f" ON CONFLICT({key}) DO UPDATE SET {updates}"
+    return sql
+
+
+def _dumps(record: Any) -> bytes:
+    return pickle.dumps(record, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def _loads(data: bytes) -> Any:
+    return pickle.loads(data)
+
+
+def _load_synchronous() -> str:
+    """Read the synchronous mode from AGWS_SQLITE_SYNCHRONOUS"""
+    mode = (os.getenv("AGWS_SQLITE_SYNCHRONOUS") or DEFAULT_SYNCHRONOUS).upper()
+    if mode not in SYNCHRONOUS_MODES:
+        raise ValueError(
+            f'Invalid AGWS_SQLITE_SYNCHRONOUS "{mode}". Supported values are "OFF", "NORMAL" and "FULL".'
+        )
+    return mode
+
+
+def _check_database_file(path: str) -> None:
+    """Fail clearly on an existing file that is not a SQLite database, e.g. the
+    snapshot of the memory backend, instead of on the first query"""
+    if not os.path.isfile(path) or os.path.getsize(path) == 0:
+        return
+    with open(path, "rb") as f:
+        header = f.read(len(_SQLITE_HEADER))
+    if header != _SQLITE_HEADER:
+        raise ValueError(
+            f'AGWS_STORAGE_PATH "{path}" is not a SQLite database. It may have been written by the memory backend: use another path with AGWS_STORAGE_BACKEND=sqlite.'
+        )
+
+
+def _is_shared() -> bool:
+    """Whether several API processes use the database (AGWS_API_WORKERS > 1,
+    see main._check_shared_storage)"""
+    return int(os.getenv("AGWS_API_WORKERS", "1") or 1) > 1
+
+
+class SQLiteDB(DBOperations):
+    """SQLite database in WAL mode. Every write is committed immediately (synced
+    according to AGWS_SQLITE_SYNCHRONOUS), records are read on demand so startup
+    time does not depend on the stored history."""
+
+    def __init__(self):
+        self._presist_threads: bool = False
+        self._lock = threading.RLock()
+        self._closed: bool = False
+
+        use_fs_storage = os.getenv("AGWS_STORAGE_PERSIST", "True") == "True"
+        if use_fs_storage:
+            self.storage_file = os.getenv("AGWS_STORAGE_PATH") or DEFAULT_SQLITE_PATH
+            synchronous = _load_synchronous()
+            _check_database_file(self.storage_file)
+        else:
+            self.storage_file = ":memory:"
+
+        self._conn = sqlite3.connect(
+            self.storage_file, isolation_level=None, check_same_thread=False
+        )
+        if use_fs_storage:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(f"PRAGMA synchronous={synchronous}")
+            # Wait for other writers (e.g. other server processes) instead of failing
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            logger.debug("Registering database cleanup handler on exit")
+            atexit.register(self._close, at_exit=True)
+        self._conn.executescript(_SCHEMA)
+        logger.info(
+            f"SQLiteDB initialized at {os.path.abspath(self.storage_file) if use_fs_storage else self.storage_file}"
+        )
+
+    def set_persist_threads(self, persist: bool) -> None:
+        """Set whether to persist threads across restarts"""
+        self._presist_threads = persist
+        logger.info("Set persist_threads to %s", persist)
+
+    def reindex(self) -> None:
+        """The indexes are maintained by SQLite"""
+        pass
+
+    def _close(self, at_exit: bool = False) -> None:
+        """Drop non persistent threads and close the connection. Nothing is
+        logged at interpreter exit: the logging streams may be closed.
+
+        The threads are kept when the database is shared: the other API
+        processes still use them, and the supervisor process never loads the
+        agents that decide whether threads persist."""
+        if self._closed:
+            return
+        try:
+            with self._lock:
+                self._closed = True
+                if not self._presist_threads and not _is_shared():
+                    self._conn.execute("DELETE FROM threads")
+                self._conn.close()
+            if not at_exit:
+                logger.info("Database closed successfully at %s", self.storage_file)
+        except Exception as e:
+            if not at_exit:
+                logger.error("Failed to close database: %s", str(e))
+
+    def _execute(self, sql: str, params: Tuple = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn.execute(sql, params)
+
+    def _fetch_one(self, sql: str, params: Tuple = ()) -> Optional[Any]:
+        with self._lock:
+            row = self._conn.execute(sql, params).fetchone()
+        return _loads(row[0]) if row else None
+
+    def _fetch_all(self, sql: str, params: Tuple = ()) -> List[Any]:
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        return [_loads(row[0]) for row in rows]
+
+    def _search(
+        self, table: str, columns: Tuple[str, ...], filters: dict
+    ) -> List[Dict[str, Any]]:
+        """Filter on indexed columns in SQL, remaining filters in Python"""
+        clauses = []
+        params = []
+        remaining = {}
+        for key, value in filters.items():
+            if key in columns and not isinstance(value, (dict, list)):
+                if value is None:
+                    clauses.append(f"{key} IS NULL")
+                else:
+                    clauses.append(f"{key} = ?")
+                    params.append(_column_value(value))
+            else:
+                remaining[key] = value
+
+        sql = f"SELECT data FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY rowid"
+
+        results = []
+        for record in self._fetch_all(sql, tuple(params)):
+            if all(
+                key in record and record[key] == value
+                for key, value in remaining.items()
+            ):
+                results.append(record)
+        return results
+
+    def _put_run(self, run: Run, insert: bool) -> None:
+        self._execute(
+            _upsert_sql("runs", "run_id", RUN_COLUMNS, insert),
+            (
+                str(run["run_id"]),
+                *(_column_value(run.get(column)) for column in RUN_COLUMNS),
+                _dumps(run),
+            ),
+        )
+
+    def _put_thread(self, thread: Thread, insert: bool) -> None:
+        self._execute(
+            _upsert_sql("threads", "thread_id", THREAD_COLUMNS, insert),
+            (
+                str(thread["thread_id"]),
+                *(_column_value(thread.get(column)) for column in THREAD_COLUMNS),
+                _dumps(thread),
+            ),
+        )
+
+    def create_run(self, run: Run) -> Run:
+        """Create a new Run"""
+        run_id = str(run["run_id"])
+        try:
+            self._put_run(run, insert=True)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Run with ID {run_id} already exists")
+        return run
+
+    def get_run(self, run_id: str) -> Optional[Run]:
+        """Get a Run by ID"""
+        return self._fetch_one("SELECT data FROM runs WHERE run_id = ?", (run_id,))
+
+    def list_runs(self) -> List[Run]:
+        """List all Runs"""
+        return self._fetch_all("SELECT data FROM runs ORDER BY rowid")
+
+    def count_runs(self) -> int:
+        """Count all Runs"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def update_run(self, run_id: str, updates: dict) -> Optional[Run]:
+        """Update a Run with the given updates"""
+        with self._lock:
+            run = self.get_run(run_id)
+            if run is None:
+                return None
+            updated_run = {**run, **updates, "updated_at": datetime.now()}
+            self._put_run(updated_run, insert=False)
+        return updated_run
+
+    def delete_run(self, run_id: str) -> bool:
+        """Delete a Run and its associated info and output"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                deleted = self._conn.execute(
+                    "DELETE FROM runs WHERE run_id = ?", (run_id,)
+                ).rowcount
+                self._conn.execute("DELETE FROM runs_info WHERE run_id = ?", (run_id,))
+                self._conn.execute(
+                    "DELETE FROM runs_output WHERE run_id = ?", (run_id,)
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return deleted > 0
+
+    def search_run(self, filters: dict) -> List[Run]:
+        """Search Runs by filters"""
+        return self._search("runs", RUN_COLUMNS, filters)
+
+    def search_runs_updated_before(
+        self, status: RunStatus, before: datetime, limit: int
+    ) -> List[Run]:
+        """Runs with the given status not updated since `before`, at most
+        `limit`, least recently updated first"""
+        return self._fetch_all(
+            "SELECT data FROM runs WHERE status = ? AND updated_at <= ? "
+            "ORDER BY updated_at LIMIT ?",
+            (_column_value(status), before.timestamp(), limit),
+        )
+
+    def least_recently_updated_runs(self, limit: int) -> List[Run]:
+        """The `limit` least recently updated runs that are not pending"""
+        return self._fetch_all(
+            "SELECT data FROM runs WHERE status != 'pending' "
+            "ORDER BY updated_at LIMIT ?",
+            (limit,),
+        )
+
+    def get_run_status(self, run_id: str) -> Optional[RunStatus]:
+        """Get the status of a Run"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status FROM runs WHERE run_id = ?", (run_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_run_output(self, run_id: str, output: Any) -> None:
+        """Add the output of a Run"""
+        self._execute(
+            _upsert_sql("runs_output", "run_id", (), insert=False),
+            (run_id, _dumps(output)),
+        )
+
+    def get_run_output(self, run_id: str) -> Optional[Any]:
+        """Get the output of a Run"""
+        return self._fetch_one(
+            "SELECT data FROM runs_output WHERE run_id = ?", (run_id,)
+        )
+
+    def create_run_info(self, run_info: RunInfo) -> RunInfo:
+        """Create a new Run info in the database"""
+        self._execute(
+            _upsert_sql("runs_info", "run_id", (), insert=False),
+            (str(run_info["run_id"]), _dumps(run_info)),
+        )
+        return run_info
+
+    def get_run_info(self, run_id: str) -> Optional[RunInfo]:
+        """Get a Run info by run ID"""
+        return self._fetch_one("SELECT data FROM runs_info WHERE run_id = ?", (run_id,))
+
+    def list_run_info(self) -> List[RunInfo]:
+        """List all Run info"""
+        return self._fetch_all("SELECT data FROM runs_info ORDER BY rowid")
+
+    def delete_run_info(self, run_id: str) -> bool:
+        """Delete a Run info by run ID"""
+        return (
+            self._execute("DELETE FROM runs_info WHERE run_id = ?", (run_id,)).rowcount
+            > 0
+        )
+
+    def update_run_info(self, run_id: str, updates: dict) -> Optional[RunInfo]:
+        """Update a Run info"""
+        with self._lock:
+            run_info = self.get_run_info(run_id)
+            if run_info is None:
+                return None
+            updated_run_info = {**run_info, **updates}
+            self.create_run_info(updated_run_info)
+        return updated_run_info
+
+    def create_thread(self, thread: Thread) -> Thread:
+        """Create a new Thread"""
+        thread_id = str(thread["thread_id"])
+        try:
+            self._put_thread(thread, insert=True)
+        except sqlite3.IntegrityError:
+            raise ValueError(f"Thread with ID {thread_id} already exists")
+        return thread
+
+    def get_thread(self, thread_id: str) -> Optional[Thread]:
+        """Get a Thread by ID"""
+        return self._fetch_one(
+            "SELECT data FROM threads WHERE thread_id = ?", (thread_id,)
+        )
+
+    def list_threads(self) -> List[Thread]:
+        """List all Threads"""
+        return self._fetch_all("SELECT data FROM threads ORDER BY rowid")
+
+    def update_thread(self, thread_id: str, updates: dict) -> Optional[Thread]:
+        """Update a Thread with the given updates"""
+        with self._lock:
+            thread = self.get_thread(thread_id)
+            if thread is None:
+                return None
+            updated_thread = {**thread, **updates, "updated_at": datetime.now()}
+            self._put_thread(updated_thread, insert=False)
+        return updated_thread
+
+    def delete_thread(self, thread_id: str) -> bool:
+        """Delete a Thread"""
+        return (
+            self._execute(
+                "DELETE FROM threads WHERE thread_id = ?", (thread_id,)
+            ).rowcount
+            > 0
+        )
+
+    def search_thread(self, filters: dict) -> List[Thread]:
+        """Search Threads by filters"""
+        return self._search("threads", THREAD_COLUMNS, filters)
@@ -5,12 +5,14 @@ import atexit
 import logging
 import os
 import pickle
-from typing import Any, Dict
+import threading
+from typing import Any, Dict, Optional
 
 from dotenv import load_dotenv
 
 import agent_workflow_server.logging.logger  # noqa: F401
 
+from .journal import Journal, read_journal
 from .models import Run, RunInfo
 from .service import DBOperations
 
@@ -18,9 +20,16 @@ logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+DEFAULT_JOURNAL_FSYNC_INTERVAL = 0.05
+DEFAULT_JOURNAL_COMPACT_INTERVAL = 300
+
 
 class InMemoryDB(DBOperations):
-    """In-memory database with file persistence"""
+    """In-memory database with file persistence.
+
+    Every change is appended to a journal file, periodically compacted into a
+    snapshot of the whole state. On startup the snapshot is loaded and the
+    journal replayed on top of it."""
 
     def __init__(self):
         self._runs: Dict[str, Run] = {}
@@ -28,15 +37,34 @@ class InMemoryDB(DBOperations):
         self._runs_output: Dict[str, Any] = {}
         self._threads: Dict[str, Any] = {}
         self._presist_threads: bool = False
+        self._journal: Optional[Journal] = None
 
         use_fs_storage = os.getenv("AGWS_STORAGE_PERSIST", "True") == "True"
         if use_fs_storage:
             storage_file = os.getenv("AGWS_STORAGE_PATH") or "agws_storage.pkl"
             self.storage_file = storage_file
+            self.journal_file = storage_file + ".journal"
             self._load_from_file()
+            self._replay_journal()
+            self._journal = Journal(
+                self.journal_file,
+                fsync_interval=float(
+                    os.getenv(
+                        "AGWS_JOURNAL_FSYNC_INTERVAL", DEFAULT_JOURNAL_FSYNC_INTERVAL
+                    )
+                ),
+            )
+            self._start_compaction(
+                float(
+                    os.getenv(
+                        "AGWS_JOURNAL_COMPACT_INTERVAL",
+                        DEFAULT_JOURNAL_COMPACT_INTERVAL,
+                    )
+                )
+            )
             # Register save on exit
             logger.debug("Registering database save handler on exit")
-            atexit.register(self._save_to_file)
+            atexit.register(self._close, at_exit=True)
 
         super().__init__(self._runs, self._runs_info, self._runs_output, self._threads)
         logger.debug("InMemoryDB initialization complete")
@@ -46,29 +74,109 @@ class InMemoryDB(DBOperations):
         self._presist_threads = persist
         logger.info("Set persist_threads to %s", persist)
 
-    def _save_to_file(self) -> None:
-        """Save the current state to file"""
+    def _record_change(self, table: str, key: str, value: Optional[Any]) -> None:
+        """Append the change to the journal"""
+        if self._journal is None:
+            return
+        if table == "threads" and not self._presist_threads:
+            return
         try:
-            logger.debug(
-                "Runs: %d, Infos: %d, Outputs: %d, Threads: %d",
-                len(self._runs),
-                len(self._runs_info),
-                len(self._runs_output),
-                len(self._threads),
-            )
+            self._journal.append(table, key, value)
+        except Exception as e:
+            logger.error("Failed to journal change of %s %s: %s", table, key, str(e))
+
+    def _replay_journal(self) -> None:
+        """Apply the journal(s) on top of the loaded snapshot"""
+        tables = {
+            "runs": self._runs,
+            "runs_info": self._runs_info,
+            "runs_output": self._runs_output,
+            "threads": self._threads,
+        }
+        # A rotated journal is left behind if the server stopped during a compaction
+        replayed = 0
+        for path in (self.journal_file + ".old", self.journal_file):
+            for table, key, value in read_journal(path):
+                if value is None:
+                    tables[table].pop(key, None)
+                else:
+                    tables[table][key] = value
+                replayed += 1
+        if replayed:
+            logger.info("Replayed %d journal records", replayed)
+
+    def _start_compaction(self, interval: float) -> None:
+        self._compaction_lock = threading.Lock()
+        self._compaction_stop = threading.Event()
+
+        def compaction_loop():
+            while not self._compaction_stop.wait(interval):
+                self._compact()
+
+        threading.Thread(
+            target=compaction_loop, name="agws-journal-compaction", daemon=True
+        ).start()
+
+    def _compact(self) -> None:
+        """Write a fresh snapshot and truncate the journal"""
+        with self._compaction_lock:
+            if self._journal.size() == 0 and not os.path.exists(
+                self.journal_file + ".old"
+            ):
+                # Nothing changed since the last snapshot
+                return
+            self._write_snapshot()
+
+    def _write_snapshot(self) -> None:
+        with self._journal.lock:
+            # Shallow copies are enough: records are replaced, not changed, on update.
+            # Changes racing with the copy are also in the new journal, and
+            # replaying them on top of the snapshot is idempotent.
             data = {
-                "runs": self._runs,
-                "runs_info": self._runs_info,
-                "runs_output": self._runs_output,
+                "runs": dict(self._runs),
+                "runs_info": dict(self._runs_info),
+                "runs_output": dict(self._runs_output),
             }
             if self._presist_threads:
-                data["threads"] = self._threads
+                data["threads"] = dict(self._threads)
+            rotated_journal = self._journal.rotate()
+
+        if self._save_to_file(data):
+            os.remove(rotated_journal)
+
+    def _close(self, at_exit: bool = False) -> None:
+        """Stop the background threads and sync the journal. The state is not
+        compacted, the journal is replayed on the next start: closing does not
+        take longer with the size of the state. Nothing is logged, at
+        interpreter exit the logging streams may be closed."""
+        if self._compaction_stop.is_set():
+            return
+        self._compaction_stop.set()
+        # Waits for a compaction in progress
+        with self._compaction_lock:
+            self._journal.close()
 
-            with open(self.storage_file, "wb") as f:
+    def _save_to_file(self, data: Dict[str, Dict[str, Any]]) -> bool:
+        """Atomically save a snapshot of the state to file"""
+        try:
+            logger.debug(
+                "Runs: %d, Infos: %d, Outputs: %d, Threads: %d",
+                len(data["runs"]),
+                len(data["runs_info"]),
+                len(data["runs_output"]),
+                len(data.get("threads", {})),
+            )
+            tmp_file = self.storage_file + ".tmp"
+            with open(tmp_file, "wb") as f:
                 pickle.dump(data, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.storage_file)
             logger.info("Database state saved successfully to %s", self.storage_file)
+            return True
         except Exception as e:
             logger.error("Failed to save database state: %s", str(e))
+            return False
 
     def _load_from_file(self) -> None:
         """Load the state from file if it exists"""
@@ -105,6 +213,22 @@ class InMemoryDB(DBOperations):
             self._threads = {}
 
 
+def _create_db() -> DBOperations:
+    """Create the database selected with AGWS_STORAGE_BACKEND"""
+    backend = os.getenv("AGWS_STORAGE_BACKEND", "memory").lower()
+    if backend == "memory":
+        logger.debug("Creating global InMemoryDB instance")
+        return InMemoryDB()
+    elif backend == "sqlite":
+        from .sqlite import SQLiteDB
+
+        logger.debug("Creating global SQLiteDB instance")
+        return SQLiteDB()
+
+    raise ValueError(
+        f'Invalid AGWS_STORAGE_BACKEND "{backend}". Supported values are "memory" and "sqlite".'
+    )
+
+
 # Global instance of the database
-logger.debug("Creating global InMemoryDB instance")
-DB = InMemoryDB()
+DB = _create_db()
@@ -2,9 +2,10 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import importlib
+import itertools
 import uuid
 from enum import Enum
-from typing import Any
+from typing import Any, Callable, Dict
 from urllib.parse import urlparse
 
 from pydantic import BaseModel
@@ -27,21 +28,88 @@ def is_valid_url(val):
         return False
 
 
-def make_serializable(v: Any):
-    if isinstance(v, list):
-        return [make_serializable(vv) for vv in v]
-    elif isinstance(v, dict):
-        return {kk: make_serializable(vv) for kk, vv in v.items()}
-    elif (
-        isinstance(v, BaseModel) and hasattr(v, "model_dump") and callable(v.model_dump)
-    ):
-        return v.model_dump(mode="json")
-    elif isinstance(v, BaseModel) and hasattr(v, "dict") and callable(v.dict):
-        return v.dict()
-    elif isinstance(v, Enum):
-        return v.value
+_JSON_SCALARS = frozenset((str, int, float, bool, type(None)))
+
+
+def _serialize_list(v: list) -> list:
+    serialized = None
+    for i, item in enumerate(v):
+        if type(item) in _JSON_SCALARS:
+            if serialized is not None:
+                serialized.append(item)
+            continue
+        new_item = make_serializable(item)
+        if serialized is None and new_item is not item:
+            # Copy on the first item that changes
+            serialized = v[:i]
+        if serialized is not None:
+            serialized.append(new_item)
+    if serialized is None:
+        return v if type(v) is list else list(v)
+    return serialized
+
+
+def _serialize_dict(v: dict) -> dict:
+    serialized = None
+    for i, (key, item) in enumerate(v.items()):
+        if type(item) in _JSON_SCALARS:
+            if serialized is not None:
+                serialized[key] = item
+            continue
+        new_item = make_serializable(item)
+        if serialized is None and new_item is not item:
+            # Copy on the first item that changes
+            serialized = dict(itertools.islice(v.items(), i))
+        if serialized is not None:
+            serialized[key] = new_item
+    if serialized is None:
+        return v if type(v) is dict else dict(v)
+    return serialized
+
+
+def _serialize_model(v: BaseModel) -> Any:
+    return v.model_dump(mode="json")
+
+
+def _identity(v: Any) -> Any:
+    return v
+
+
+def _resolve_serializer(cls: type) -> Callable[[Any], Any]:
+    if issubclass(cls, list):
+        return _serialize_list
+    elif issubclass(cls, dict):
+        return _serialize_dict
+    elif issubclass(cls, BaseModel) and callable(getattr(cls, "model_dump", None)):
+        return _serialize_model
+    elif issubclass(cls, BaseModel) and callable(getattr(cls, "dict", None)):
+        return lambda v: v.dict()
+    elif issubclass(cls, Enum):
+        return lambda v: v.value
     else:
-        return v
+        return _identity
+
+
+# Serializer per type, filled on first use of each type
+_SERIALIZERS: Dict[type, Callable[[Any], Any]] = {
+    str: _identity,
+    int: _identity,
+    float: _identity,
+    bool: _identity,
+    type(None): _identity,
+    list: _serialize_list,
+    dict: _serialize_dict,
+}
+
+
+def make_serializable(v: Any):
+    """JSON serializable form of v: pydantic models are dumped and enums
+    replaced by their value, in lists and dicts too. The lists and dicts
+    without anything to convert are returned as is, not copied."""
+    serializer = _SERIALIZERS.get(type(v))
+    if serializer is None:
+        serializer = _SERIALIZERS[type(v)] = _resolve_serializer(type(v))
+    return serializer(v)
 
 
 def load_from_module(module: str, obj: str) -> object:
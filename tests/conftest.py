@@ -2,11 +2,23 @@
 # SPDX-License-Identifier: Apache-2.0
 
 import os
+import tempfile
 from pathlib import Path
 
 import pytest
 from dotenv import load_dotenv
 
+ENV_PATH = Path(__file__).parent / ".env.test"
+
+
+def pytest_configure(config):
+    """The global DB is created when the test modules are imported, before the
+    fixtures run: load the test environment first, and keep any storage file
+    out of the repository"""
+    load_dotenv(ENV_PATH, override=True)
+    storage_dir = tempfile.mkdtemp(prefix="agws-tests-")
+    os.environ["AGWS_STORAGE_PATH"] = os.path.join(storage_dir, "agws_storage.pkl")
+
 
 @pytest.fixture(autouse=True)
 def load_test_env():
@@ -15,8 +27,7 @@ def load_test_env():
     original_env = dict(os.environ)
 
     # Load test environment
-    env_path = Path(__file__).parent / ".env.test"
-    load_dotenv(env_path, override=True)
+    load_dotenv(ENV_PATH, override=True)
 
     yield
 
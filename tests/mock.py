@@ -109,6 +109,13 @@ class MockAdapter(BaseAdapter):
 mock_agent = MockAgentImpl()
 
 
+def use_mock_adapter():
+    """Executor process initializer: load the agents with the MockAdapter"""
+    import agent_workflow_server.agents.load
+
+    agent_workflow_server.agents.load.ADAPTERS = [MockAdapter()]
+
+
 MOCK_WEBSERVER_DEFAULT_PORT = 9753
 MOCK_WEBSERVER_DEFAULT_HOST = "127.0.0.1"
 MOCK_WEBSERVER_WEBHOOK_PATH = "webhook"
@@ -0,0 +1,112 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import gzip
+import json
+import os
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+
+from agent_workflow_server.agents.load import AGENTS, load_agents
+from agent_workflow_server.apis import agents
+from agent_workflow_server.apis.prepared import _accepted_codings
+from tests.mock import MOCK_AGENT_ID, MockAdapter
+
+
+@pytest.fixture
+def client(mocker: MockerFixture) -> TestClient:
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    mocker.patch.dict("agent_workflow_server.apis.agents._PREPARED_RESPONSES")
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+
+    app = FastAPI()
+    app.include_router(agents.router)
+    app.include_router(agents.public_router)
+    return TestClient(app)
+
+
+@pytest.mark.parametrize(
+    "accept_encoding, expected",
+    [
+        (None, ["identity"]),
+        ("gzip, deflate, br", ["br", "gzip", "identity"]),
+        ("gzip;q=1.0, br;q=0.5, identity;q=0.1", ["gzip", "br", "identity"]),
+        ("br;q=0, *", ["gzip", "identity"]),
+        ("gzip, identity;q=0", ["gzip"]),
+        ("*;q=0", []),
+    ],
+)
+def test_accepted_codings(accept_encoding, expected):
+    assert _accepted_codings(accept_encoding) == expected
+
+
+def test_descriptor_etag(client: TestClient, mocker: MockerFixture):
+    model_dump_json = mocker.spy(
+        type(AGENTS[MOCK_AGENT_ID].acp_descriptor), "model_dump_json"
+    )
+
+    response = client.get(f"/agents/{MOCK_AGENT_ID}/descriptor")
+    assert response.status_code == 200
+    assert response.json() == json.loads(
+        AGENTS[MOCK_AGENT_ID].acp_descriptor.model_dump_json(by_alias=True)
+    )
+    etag = response.headers["etag"]
+
+    response = client.get(
+        f"/agents/{MOCK_AGENT_ID}/descriptor", headers={"if-none-match": etag}
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+    assert response.headers["etag"] == etag
+
+    response = client.get(
+        f"/agents/{MOCK_AGENT_ID}/descriptor", headers={"if-none-match": '"other"'}
+    )
+    assert response.status_code == 200
+    # Serialized once, plus once above for the expected body
+    assert model_dump_json.call_count == 2
+
+    # Prepared again when the agent is loaded again
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+    client.get(f"/agents/{MOCK_AGENT_ID}/descriptor")
+    assert model_dump_json.call_count == 3
+
+
+def test_openapi_compressed(client: TestClient):
+    expected = json.loads(
+        client.get(
+            f"/agents/{MOCK_AGENT_ID}/openapi",
+            headers={"accept-encoding": "identity"},
+        ).content
+    )
+
+    response = client.get(
+        f"/agents/{MOCK_AGENT_ID}/openapi", headers={"accept-encoding": "gzip"}
+    )
+    assert response.status_code == 200
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.headers["vary"] == "Accept-Encoding"
+    assert response.headers["etag"].endswith('-gzip"')
+    assert response.json() == expected
+
+    prepared = agents._PREPARED_RESPONSES[(MOCK_AGENT_ID, "openapi")][1]
+    assert json.loads(gzip.decompress(prepared.bodies["gzip"])) == expected
+
+    # Any representation validates the others
+    response = client.get(
+        f"/agents/{MOCK_AGENT_ID}/openapi",
+        headers={"accept-encoding": "gzip", "if-none-match": f'W/"{prepared.digest}"'},
+    )
+    assert response.status_code == 304
+
+
+def test_unknown_agent(client: TestClient):
+    for path in (
+        "/agents/unknown",
+        "/agents/unknown/descriptor",
+        "/agents/unknown/openapi",
+    ):
+        assert client.get(path).status_code == 404
@@ -0,0 +1,268 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+from datetime import datetime
+from typing import Optional
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.services.broker import Broker, BrokerClient, start_broker
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.replay import ReplayPolicy
+from agent_workflow_server.services.runs import Runs, StreamManager
+from agent_workflow_server.storage.storage import DB
+
+_RUN = {
+    "agent_id": str(uuid4()),
+    "thread_id": str(uuid4()),
+    "input": {},
+    "config": None,
+    "metadata": None,
+    "webhook": None,
+    "created_at": datetime.now(),
+    "updated_at": datetime.now(),
+    "status": "pending",
+}
+
+
+class _Received:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+        self.statuses = asyncio.Queue()
+
+    async def on_message(self, run_id: str, message: Message):
+        await self.messages.put((run_id, message))
+
+    async def on_status(self, run_id: str):
+        await self.statuses.put(run_id)
+
+
+@pytest.mark.asyncio
+async def test_broker_relays_to_subscribers(tmp_path):
+    path = os.path.join(tmp_path, "broker.sock")
+    broker = Broker(path)
+    server = await broker.serve()
+
+    publisher_received, subscriber_received = _Received(), _Received()
+    publisher = BrokerClient(
+        path, publisher_received.on_message, publisher_received.on_status
+    )
+    subscriber = BrokerClient(
+        path, subscriber_received.on_message, subscriber_received.on_status
+    )
+    await publisher.connect()
+    await subscriber.connect()
+    try:
+        await subscriber.subscribe("run-1")
+
+        publisher.publish("run-2", Message(type="message", data="not subscribed"))
+        publisher.publish("run-1", Message(type="message", data="hello"))
+        publisher.notify_status("run-1")
+
+        run_id, message = await asyncio.wait_for(subscriber_received.messages.get(), 1)
+        assert run_id == "run-1"
+        assert message.data == "hello"
+        assert await asyncio.wait_for(subscriber_received.statuses.get(), 1) == "run-1"
+        assert subscriber_received.messages.empty()
+        # Messages are not sent back to the publisher
+        assert publisher_received.messages.empty()
+
+        # Subscriptions outlive the run stream, e.g. for a resumed run
+        publisher.publish("run-1", Message(type="control", data="done"))
+        _, message = await asyncio.wait_for(subscriber_received.messages.get(), 1)
+        assert message.data == "done"
+        publisher.publish("run-1", Message(type="message", data="resumed"))
+        _, message = await asyncio.wait_for(subscriber_received.messages.get(), 1)
+        assert message.data == "resumed"
+
+        # Until the subscriber is done with the run
+        subscriber.unsubscribe("run-1")
+        await asyncio.wait_for(_unsubscribed(broker, "run-1"), 1)
+        await subscriber.subscribe("run-2")
+        publisher.publish("run-1", Message(type="message", data="unsubscribed"))
+        # Relayed in order: received after the run-1 message if it was relayed
+        publisher.publish("run-2", Message(type="message", data="next"))
+        run_id, _ = await asyncio.wait_for(subscriber_received.messages.get(), 1)
+        assert run_id == "run-2"
+    finally:
+        await publisher.close()
+        await subscriber.close()
+        server.close()
+
+
+async def _unsubscribed(broker: Broker, run_id: str):
+    while run_id in broker._subscribers:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_subscriptions_are_counted(tmp_path):
+    path = os.path.join(tmp_path, "broker.sock")
+    broker = Broker(path)
+    server = await broker.serve()
+    received = _Received()
+    client = BrokerClient(path, received.on_message, received.on_status)
+    await client.connect()
+    try:
+        # e.g. a stream and a waiter of the same run
+        await client.subscribe("run-1")
+        await client.subscribe("run-1")
+        client.unsubscribe("run-1")
+        assert "run-1" in client._subscribed
+        client.unsubscribe("run-1")
+        assert client._subscribed == {} and client._subscriptions == {}
+        await asyncio.wait_for(_unsubscribed(broker, "run-1"), 1)
+    finally:
+        await client.close()
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_requests_reach_the_other_processes(tmp_path):
+    path = os.path.join(tmp_path, "broker.sock")
+    server = await Broker(path).serve()
+    released = asyncio.Event()
+
+    async def held(run_id: str, action: str):
+        return f"{action} {run_id}"
+
+    async def not_held(run_id: str, action: str):
+        return None
+
+    async def failing(run_id: str, action: str):
+        raise ValueError("failed")
+
+    async def stuck(run_id: str, action: str):
+        await released.wait()
+
+    received = _Received()
+    clients = [
+        BrokerClient(path, received.on_message, received.on_status, {"cancel": handler})
+        for handler in (not_held, held, not_held, failing)
+    ]
+    requester = clients[0]
+    for client in clients:
+        await client.connect()
+    try:
+        results = await asyncio.wait_for(
+            requester.request("run-1", "cancel", "interrupt"), 1
+        )
+        # In the order of the replies
+        assert len(results) == 2
+        assert "interrupt run-1" in results
+        assert any(isinstance(result, ValueError) for result in results)
+        # No handler: not held
+        assert await asyncio.wait_for(requester.request("run-1", "replay"), 1) == []
+
+        # A process exiting does not reply
+        stuck_client = BrokerClient(
+            path, received.on_message, received.on_status, {"cancel": stuck}
+        )
+        await stuck_client.connect()
+        await asyncio.sleep(0.01)
+        request = asyncio.create_task(requester.request("run-1", "cancel", "rollback"))
+        await asyncio.sleep(0.05)
+        assert not request.done()
+        await stuck_client.close()
+        results = await asyncio.wait_for(request, 1)
+        assert "rollback run-1" in results
+    finally:
+        for client in clients:
+            await client.close()
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_stream_replayed_from_other_process(tmp_path, mocker):
+    path = os.path.join(tmp_path, "broker.sock")
+    server = await Broker(path).serve()
+    policy = ReplayPolicy(max_messages=10, max_bytes=1000, grace_s=60)
+    executing, joining = StreamManager(policy), StreamManager(policy)
+
+    async def replay(run_id: str, last_seq: Optional[int]):
+        return executing.replay(run_id, last_seq)
+
+    publisher = BrokerClient(
+        path, executing.put_message, _Received().on_status, {"replay": replay}
+    )
+    subscriber = BrokerClient(path, joining.put_message, _Received().on_status)
+    await publisher.connect()
+    await subscriber.connect()
+    # Joined in the process of the subscriber
+    mocker.patch("agent_workflow_server.services.runs.stream_manager", joining)
+    mocker.patch(
+        "agent_workflow_server.services.runs.get_broker_client",
+        return_value=subscriber,
+    )
+
+    async def publish(data, type="message"):
+        message = Message(type=type, data=data)
+        await executing.put_message(run_id, message)
+        publisher.publish(run_id, message)
+
+    run_id = str(uuid4())
+    DB.create_run({**_RUN, "run_id": run_id})
+    try:
+        for i in range(3):
+            await publish(i)
+
+        async def collect():
+            return [
+                message.data
+                async for message in Runs.Stream.join(run_id, 1)
+                if message.type == "message"
+            ]
+
+        resumed = asyncio.create_task(collect())
+        await asyncio.sleep(0.05)
+        await publish(3)
+        await publish("done", type="control")
+        assert await asyncio.wait_for(resumed, 1) == [1, 2, 3]
+        # Unsubscribed once the stream ended
+        assert subscriber._subscribed == {}
+    finally:
+        await publisher.close()
+        await subscriber.close()
+        server.close()
+
+
+def test_start_broker_removes_socket_dir(mocker):
+    register = mocker.patch("agent_workflow_server.services.broker.atexit.register")
+    path = start_broker()
+    assert os.path.exists(path)
+
+    cleanup, *args = register.call_args.args
+    cleanup(*args, **register.call_args.kwargs)
+    assert not os.path.exists(os.path.dirname(path))
+
+
+class _Writer:
+    def __init__(self):
+        self.data = b""
+
+    def write(self, data: bytes):
+        self.data += data
+
+
+@pytest.mark.asyncio
+async def test_subscribe_waits_for_pending_ack():
+    received = _Received()
+    client = BrokerClient("unused", received.on_message, received.on_status)
+    client._writer = _Writer()
+
+    first = asyncio.create_task(client.subscribe("run-1"))
+    await asyncio.sleep(0)
+    second = asyncio.create_task(client.subscribe("run-1"))
+    await asyncio.sleep(0.01)
+    # One subscription, waited on by both until the broker acks it
+    assert len(client._acks) == 1
+    assert not first.done() and not second.done()
+
+    # A cancelled waiter does not cancel the subscription of the others
+    first.cancel()
+    await asyncio.sleep(0)
+    client._acks.pop(0).set_result(None)
+    await asyncio.wait_for(second, 1)
@@ -0,0 +1,207 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+
+import pytest
+from fastapi import FastAPI
+from pytest_mock import MockerFixture
+
+from agent_workflow_server.agents.load import load_agents
+from agent_workflow_server.apis import stateless_runs, threads_runs
+from agent_workflow_server.services.queue import (
+    RUN_CANCELLED_MESSAGE,
+    RUN_HANDLES,
+    RunNotCancellableError,
+    RunNotFoundError,
+    _cancelled_queued_runs,
+    cancel_held_run,
+    cancel_run,
+    start_workers,
+)
+from agent_workflow_server.services.retry import DelayedRetryQueue
+from agent_workflow_server.services.runs import ApiRunCreate, Runs
+from agent_workflow_server.services.scheduler import FifoScheduler
+from agent_workflow_server.storage.storage import DB
+from tests.mock import (
+    MOCK_AGENT_ID,
+    MOCK_RUN_INPUT,
+    MOCK_RUN_INPUT_INTERRUPT,
+    MockAdapter,
+)
+
+
+@pytest.fixture(autouse=True)
+def mock_agent(mocker: MockerFixture):
+    # The queues are bound to the event loop of the test
+    scheduler = FifoScheduler()
+    mocker.patch("agent_workflow_server.services.runs.RUNS_QUEUE", scheduler)
+    mocker.patch("agent_workflow_server.services.queue.RUNS_QUEUE", scheduler)
+    mocker.patch(
+        "agent_workflow_server.services.queue.RETRY_QUEUE", DelayedRetryQueue()
+    )
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(
+        agents_ref=os.getenv("AGENTS_REF"),
+        add_manifest_paths=[os.getenv("AGENT_MANIFEST_PATH")],
+    )
+
+
+async def _stop(worker_task: asyncio.Task):
+    worker_task.cancel()
+    try:
+        await worker_task
+    except asyncio.CancelledError:
+        pass
+
+
+async def _wait_started(run_id: str):
+    while run_id not in RUN_HANDLES:
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_cancel_running_run():
+    worker_task = asyncio.create_task(start_workers(1))
+    try:
+        new_run = await Runs.put(
+            ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT)
+        )
+        await asyncio.wait_for(_wait_started(new_run.run_id), 1)
+
+        # The mock agent takes 3s to answer
+        await asyncio.wait_for(cancel_run(new_run.run_id, "interrupt", wait=True), 1)
+        assert new_run.run_id not in RUN_HANDLES
+
+        run, output = await Runs.wait_for_output(new_run.run_id)
+        assert run.status == "error"
+        assert output == RUN_CANCELLED_MESSAGE
+
+        with pytest.raises(RunNotCancellableError):
+            await cancel_run(new_run.run_id, "interrupt")
+    finally:
+        await _stop(worker_task)
+
+
+@pytest.mark.asyncio
+async def test_run_timeout(monkeypatch):
+    monkeypatch.setenv("AGWS_RUN_TIMEOUT", "0.5")
+    worker_task = asyncio.create_task(start_workers(1))
+    try:
+        new_run = await Runs.put(
+            ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT)
+        )
+        run, _ = await asyncio.wait_for(Runs.wait_for_output(new_run.run_id), 2)
+        assert run.status == "timeout"
+        assert DB.get_run_info(new_run.run_id)["attempts"] == 1
+    finally:
+        await _stop(worker_task)
+
+
+@pytest.mark.asyncio
+async def test_cancel_queued_runs():
+    # No worker is running: the runs stay queued
+    interrupted = await Runs.put(
+        ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT)
+    )
+    rolled_back = await Runs.put(
+        ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT)
+    )
+    await cancel_run(interrupted.run_id, "interrupt")
+    await cancel_run(rolled_back.run_id, "rollback")
+
+    run, output = await Runs.wait_for_output(interrupted.run_id)
+    assert run.status == "error"
+    assert output == RUN_CANCELLED_MESSAGE
+    assert DB.get_run(rolled_back.run_id) is None
+
+    with pytest.raises(RunNotFoundError):
+        await cancel_run(rolled_back.run_id, "interrupt")
+    with pytest.raises(ValueError):
+        await cancel_run(interrupted.run_id, "stop")
+
+    # Workers skip the cancelled runs
+    worker_task = asyncio.create_task(start_workers(1))
+    try:
+        while interrupted.run_id in _cancelled_queued_runs:
+            await asyncio.sleep(0.01)
+        assert DB.get_run(interrupted.run_id)["status"] == "error"
+    finally:
+        await _stop(worker_task)
+
+
+@pytest.mark.asyncio
+async def test_rollback_interrupted_run():
+    worker_task = asyncio.create_task(start_workers(1))
+    try:
+        new_run = await Runs.put(
+            ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT_INTERRUPT)
+        )
+        run, _ = await Runs.wait_for_output(new_run.run_id)
+        assert run.status == "interrupted"
+
+        # An interrupted run can only be abandoned
+        with pytest.raises(RunNotCancellableError):
+            await cancel_run(new_run.run_id, "interrupt")
+        await cancel_run(new_run.run_id, "rollback")
+        assert DB.get_run(new_run.run_id) is None
+    finally:
+        await _stop(worker_task)
+
+
+def test_cancel_routes_declare_conflict():
+    app = FastAPI()
+    app.include_router(stateless_runs.router)
+    app.include_router(threads_runs.router)
+    paths = app.openapi()["paths"]
+    for path in ("/runs/{run_id}/cancel", "/threads/{thread_id}/runs/{run_id}/cancel"):
+        assert "409" in paths[path]["post"]["responses"]
+
+
+class _Broker:
+    """Broker client of a process, with the replies of the other processes"""
+
+    def __init__(self, results: list):
+        self.results = results
+        self.requests = []
+
+    async def request(self, run_id: str, kind: str, *args):
+        self.requests.append((run_id, kind, *args))
+        return self.results
+
+
+@pytest.mark.asyncio
+async def test_cancel_run_of_another_process(mocker: MockerFixture):
+    new_run = await Runs.put(ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT))
+    # Queued by another process
+    mocker.patch("agent_workflow_server.services.queue.RUNS_QUEUE", FifoScheduler())
+    broker = _Broker([True])
+    mocker.patch(
+        "agent_workflow_server.services.queue.get_broker_client", return_value=broker
+    )
+
+    await cancel_run(new_run.run_id, "interrupt", wait=True)
+    assert broker.requests == [(new_run.run_id, "cancel", "interrupt", True)]
+    # Finished by the process holding it
+    assert DB.get_run(new_run.run_id)["status"] == "pending"
+    assert new_run.run_id not in _cancelled_queued_runs
+
+    broker.results = [RunNotCancellableError("Run is done")]
+    with pytest.raises(RunNotCancellableError):
+        await cancel_run(new_run.run_id, "interrupt")
+
+    # Held by no process: nothing will execute it
+    broker.results = []
+    await cancel_run(new_run.run_id, "interrupt")
+    assert DB.get_run(new_run.run_id)["status"] == "error"
+
+
+@pytest.mark.asyncio
+async def test_cancel_held_run():
+    new_run = await Runs.put(ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT))
+    assert await cancel_held_run(new_run.run_id, "interrupt", False)
+    assert DB.get_run(new_run.run_id)["status"] == "error"
+    # Already cancelled, or not held by this process
+    assert await cancel_held_run(new_run.run_id, "interrupt", False) is None
+    assert await cancel_held_run("unknown", "interrupt", False) is None
@@ -0,0 +1,133 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.services.completion import CompletionRegistry
+from agent_workflow_server.services.runs import Runs, run_completions
+from agent_workflow_server.storage.storage import DB
+
+
+@pytest.mark.asyncio
+async def test_waiters_share_one_future():
+    registry = CompletionRegistry()
+    waiters = [asyncio.create_task(registry.wait("run")) for _ in range(3)]
+    await asyncio.sleep(0)
+    assert len(registry) == 1
+
+    assert registry.resolve("run", {"run_id": "run"}, {"answer": 42})
+    assert not registry.resolve("run", None, None)
+    results = await asyncio.wait_for(asyncio.gather(*waiters), 1)
+    assert results == [({"run_id": "run"}, {"answer": 42})] * 3
+    assert len(registry) == 0
+
+
+@pytest.mark.asyncio
+async def test_last_waiter_leaving_releases_the_future():
+    registry = CompletionRegistry()
+    patient = asyncio.create_task(registry.wait("run"))
+    with pytest.raises(asyncio.TimeoutError):
+        await registry.wait("run", timeout=0.01)
+    # Still awaited by the other waiter
+    assert "run" in registry
+    assert not patient.done()
+
+    patient.cancel()
+    await asyncio.gather(patient, return_exceptions=True)
+    assert "run" not in registry
+
+
+@pytest.mark.asyncio
+async def test_set_status_resolves_wait_for_output():
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "pending",
+        }
+    )
+
+    with pytest.raises(TimeoutError):
+        await Runs.wait_for_output(run_id, timeout=0.01)
+    assert run_id not in run_completions
+
+    waiter = asyncio.create_task(Runs.wait_for_output(run_id))
+    await asyncio.sleep(0)
+    DB.add_run_output(run_id, {"answer": 42})
+    await Runs.set_status(run_id, "success")
+
+    run, output = await asyncio.wait_for(waiter, 1)
+    assert run.status == "success"
+    assert output == {"answer": 42}
+    assert run_id not in run_completions
+
+
+class _Broker:
+    def __init__(self):
+        self.subscriptions = 0
+        self.subscribed = asyncio.Event()
+
+    async def subscribe(self, run_id: str):
+        self.subscriptions += 1
+        self.subscribed.set()
+
+    def unsubscribe(self, run_id: str):
+        self.subscriptions -= 1
+
+    def notify_status(self, run_id: str):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_wait_for_output_subscribes_while_waiting(mocker):
+    broker = _Broker()
+    subscribe = mocker.spy(broker, "subscribe")
+    mocker.patch(
+        "agent_workflow_server.services.runs.get_broker_client", return_value=broker
+    )
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "pending",
+        }
+    )
+
+    with pytest.raises(TimeoutError):
+        await Runs.wait_for_output(run_id, timeout=0.01)
+    assert broker.subscriptions == 0
+
+    broker.subscribed.clear()
+    waiter = asyncio.create_task(Runs.wait_for_output(run_id))
+    await asyncio.wait_for(broker.subscribed.wait(), 1)
+    assert broker.subscriptions == 1
+    await Runs.set_status(run_id, "success")
+    run, _ = await asyncio.wait_for(waiter, 1)
+    assert run.status == "success"
+    assert broker.subscriptions == 0
+
+    # Completed runs are not subscribed to
+    subscribe.reset_mock()
+    run, _ = await Runs.wait_for_output(run_id)
+    assert run.status == "success"
+    subscribe.assert_not_called()
@@ -0,0 +1,68 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import os
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.services.executor import (
+    ProcessExecutor,
+    RunExecutionError,
+)
+from agent_workflow_server.services.metrics import VALIDATION_SECONDS
+from agent_workflow_server.storage.models import Run
+from tests.mock import (
+    MOCK_AGENT_ID,
+    MOCK_RUN_EVENT_INTERRUPT,
+    MOCK_RUN_INPUT_ERROR,
+    MOCK_RUN_INPUT_INTERRUPT,
+    MOCK_RUN_OUTPUT_INTERRUPT,
+    use_mock_adapter,
+)
+
+
+def _run(input: dict) -> Run:
+    return Run(
+        run_id=str(uuid4()),
+        agent_id=MOCK_AGENT_ID,
+        thread_id=None,
+        input=input,
+        config=None,
+        metadata=None,
+        webhook=None,
+        created_at=datetime.now(),
+        updated_at=datetime.now(),
+        status="pending",
+    )
+
+
+@pytest.mark.asyncio
+async def test_process_executor():
+    executor = ProcessExecutor(
+        1,
+        os.getenv("AGENTS_REF"),
+        [os.getenv("AGENT_MANIFEST_PATH")],
+        initializer=use_mock_adapter,
+    )
+    await executor.start()
+    try:
+        validations = VALIDATION_SECONDS.count("interrupt")
+        messages = [m async for m in executor.stream(_run(MOCK_RUN_INPUT_INTERRUPT))]
+        assert len(messages) == 1
+        assert messages[0].type == "interrupt"
+        assert messages[0].event == MOCK_RUN_EVENT_INTERRUPT
+        assert messages[0].data == MOCK_RUN_OUTPUT_INTERRUPT
+        # Recorded in the executor process
+        assert VALIDATION_SECONDS.count("interrupt") == validations + 1
+
+        with pytest.raises(RunExecutionError, match="error input"):
+            async for _ in executor.stream(_run(MOCK_RUN_INPUT_ERROR)):
+                pass
+
+        # The process is reused after an error
+        messages = [m async for m in executor.stream(_run(MOCK_RUN_INPUT_INTERRUPT))]
+        assert len(messages) == 1
+    finally:
+        await executor.stop()
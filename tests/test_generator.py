@@ -5,7 +5,9 @@
 import uuid
 
 import pytest
+from pytest_mock import MockerFixture
 
+from agent_workflow_server.agents import oas_generator
 from agent_workflow_server.agents.oas_generator import (
     generate_agent_oapi,
 )
@@ -219,3 +221,31 @@ def test_generate_full_spec(full_descriptor):
 
     # Verify callback capabilities
     assert "webhook" in result["components"]["schemas"]["RunCreate"]["properties"]
+
+
+def test_generated_specs_are_cached(
+    mocker: MockerFixture, tmp_path, basic_descriptor, full_descriptor
+):
+    mocker.patch.dict("os.environ", {"AGWS_OAPI_CACHE_DIR": str(tmp_path)})
+    mocker.patch("agent_workflow_server.agents.oas_generator._base_spec", None)
+    read = mocker.spy(oas_generator, "read_from_filename")
+    validate = mocker.spy(oas_generator, "validate")
+
+    basic_id, full_id = str(uuid.uuid4()), str(uuid.uuid4())
+    basic = generate_agent_oapi(basic_descriptor, basic_id)
+    full = generate_agent_oapi(full_descriptor, full_id)
+    # The ACP spec is read and validated once, then each generated spec
+    assert read.call_count == 1
+    assert validate.call_count == 3
+    # Generating a spec does not modify the base spec
+    assert full["paths"].keys() > basic["paths"].keys()
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+    assert generate_agent_oapi(basic_descriptor, basic_id) == basic
+    assert generate_agent_oapi(full_descriptor, full_id) == full
+    assert validate.call_count == 3
+
+    # Another descriptor is not served the cached spec
+    basic_descriptor.metadata.ref.version = "1.0.1"
+    assert generate_agent_oapi(basic_descriptor, basic_id) != basic
+    assert validate.call_count == 4
@@ -0,0 +1,77 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+from typing import TypedDict
+
+import pytest
+from pytest_mock import MockerFixture
+
+pytest.importorskip("langgraph")
+
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import StateGraph
+
+from agent_workflow_server.agents.adapters.langgraph import LangGraphAgent
+
+
+class State(TypedDict):
+    count: int
+
+
+def _agent(checkpointer=MemorySaver) -> LangGraphAgent:
+    builder = StateGraph(State)
+    builder.add_node("increment", lambda state: {"count": state["count"] + 1})
+    builder.set_entry_point("increment")
+    builder.set_finish_point("increment")
+    return LangGraphAgent(
+        builder.compile(checkpointer=checkpointer() if checkpointer else None)
+    )
+
+
+def _run(run_id: str, thread_id: str, count: int) -> dict:
+    return {
+        "run_id": run_id,
+        "thread_id": thread_id,
+        "input": {"count": count},
+        "config": {"tags": None, "recursion_limit": 10},
+    }
+
+
+async def _execute(agent: LangGraphAgent, run: dict):
+    async for _ in agent.astream(run):
+        pass
+
+
+@pytest.mark.asyncio
+async def test_rollback_forks_thread():
+    agent = _agent()
+    await _execute(agent, _run("run-1", "thread", 1))
+    second = _run("run-2", "thread", 10)
+    await _execute(agent, second)
+    assert (await agent.get_agent_state("thread"))["values"] == {"count": 11}
+
+    await agent.rollback(second)
+
+    state = await agent.get_agent_state("thread")
+    assert state["values"] == {"count": 2}
+    assert state["metadata"].get("run_id") != "run-2"
+
+
+@pytest.mark.asyncio
+async def test_rollback_deletes_thread_created_by_run(mocker: MockerFixture):
+    agent = _agent()
+    delete_thread = mocker.spy(agent.agent.checkpointer, "adelete_thread")
+    await _execute(agent, _run("run-1", "other", 5))
+    run = _run("run-1", "thread", 1)
+    await _execute(agent, run)
+
+    await agent.rollback(run)
+
+    delete_thread.assert_called_once_with("thread")
+    assert await agent.get_agent_state("thread") is None
+    assert (await agent.get_agent_state("other"))["values"] == {"count": 6}
+
+
+def test_memory_checkpoints_are_volatile():
+    assert _agent().has_volatile_state()
+    assert not _agent(checkpointer=None).has_volatile_state()
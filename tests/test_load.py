@@ -1,24 +1,33 @@
 # Copyright AGNTCY Contributors (https://github.com/agntcy)
 # SPDX-License-Identifier: Apache-2.0
+import json
 import os
+import uuid
+from datetime import datetime
 
 import pytest
 from pytest_mock import MockerFixture
 
+from agent_workflow_server.agents import load
+from agent_workflow_server.agents.lazy import LazyAgent, unload_idle_agents
 from agent_workflow_server.agents.load import (
     AGENTS,
     get_agent,
     get_agent_info,
+    get_agent_openapi_schema,
     load_agents,
     search_for_agents,
 )
 from agent_workflow_server.generated.models.agent_search_request import (
     AgentSearchRequest,
 )
+from agent_workflow_server.storage.storage import DB
 from tests.mock import (
     MOCK_AGENT_ID,
+    MOCK_RUN_INPUT_INTERRUPT,
     MockAdapter,
     MockAgent,
+    MockAgentImpl,
 )
 
 
@@ -28,6 +37,107 @@ def _env_load_agents():
     load_agents(agents_ref=agent_ref, add_manifest_paths=[manifest_path])
 
 
+def test_adapters_are_imported_when_needed(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", None)
+    mocker.patch("agent_workflow_server.agents.load._IMPORTED_ADAPTERS", {})
+    import_module = mocker.spy(load.importlib, "import_module")
+    mocker.patch.dict(
+        "agent_workflow_server.agents.load.ADAPTER_REGISTRY",
+        {
+            "llamaindex": "tests.missing_framework:Adapter",
+            "langgraph": "tests.mock:MockAdapter",
+        },
+        clear=True,
+    )
+
+    # The manifest framework_type is "langgraph"
+    _env_load_agents()
+
+    assert isinstance(AGENTS[MOCK_AGENT_ID].agent, MockAgent)
+    assert "tests.missing_framework" not in [
+        call.args[0] for call in import_module.call_args_list
+    ]
+
+
+def test_load_agents_concurrently(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    mocker.patch.dict("agent_workflow_server.agents.load.AGENTS", clear=True)
+    agent_ids = [str(uuid.uuid4()) for _ in range(10)]
+
+    load_agents(
+        agents_ref=json.dumps(
+            {agent_id: "tests.mock:mock_agent" for agent_id in agent_ids}
+        ),
+        add_manifest_paths=[os.getenv("AGENT_MANIFEST_PATH")],
+    )
+
+    # Registered in the AGENTS_REF order
+    assert list(AGENTS) == agent_ids
+    assert all(isinstance(info.agent, MockAgent) for info in AGENTS.values())
+
+
+def test_load_agents_error(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    mocker.patch.dict("agent_workflow_server.agents.load.AGENTS", clear=True)
+
+    with pytest.raises(Exception, match="missing_symbol not found"):
+        load_agents(
+            agents_ref=json.dumps(
+                {
+                    str(uuid.uuid4()): "tests.mock:mock_agent",
+                    str(uuid.uuid4()): "tests.mock:missing_symbol",
+                }
+            ),
+            add_manifest_paths=[os.getenv("AGENT_MANIFEST_PATH")],
+        )
+
+
+@pytest.mark.asyncio
+async def test_lazy_loading(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    mocker.patch.dict("agent_workflow_server.agents.load.AGENTS", clear=True)
+    mocker.patch.dict(os.environ, {"AGWS_AGENTS_LAZY": "True"})
+    import_module = mocker.spy(load.importlib, "import_module")
+    generate_agent_oapi = mocker.spy(load, "generate_agent_oapi")
+
+    _env_load_agents()
+
+    # Only the manifest is read at startup
+    agent = AGENTS[MOCK_AGENT_ID].agent
+    assert isinstance(agent, LazyAgent)
+    assert not agent.loaded
+    assert AGENTS[MOCK_AGENT_ID].schema is None
+    assert import_module.call_count == 0
+    assert generate_agent_oapi.call_count == 0
+    assert AGENTS[MOCK_AGENT_ID].validators.input is not None
+
+    assert await agent.get_agent_state("unknown thread") is None
+    assert agent.loaded
+    assert import_module.call_args_list[0].args == ("tests.mock",)
+    assert "ACP Spec" in get_agent_openapi_schema(MOCK_AGENT_ID)
+    # Generated once
+    assert get_agent_openapi_schema(MOCK_AGENT_ID) == get_agent_openapi_schema(
+        MOCK_AGENT_ID
+    )
+    assert generate_agent_oapi.call_count == 1
+
+    # Not unloaded while in use
+    stream = agent.astream({"input": MOCK_RUN_INPUT_INTERRUPT})
+    message = await anext(stream)
+    assert message.type == "interrupt"
+    assert unload_idle_agents([agent], idle_ttl=0) == 0
+    await stream.aclose()
+
+    assert unload_idle_agents([agent], idle_ttl=60) == 0
+    assert unload_idle_agents([agent], idle_ttl=0) == 1
+    assert not agent.loaded
+
+    # Loaded again on next use
+    assert await agent.get_agent_state("unknown thread") is None
+    assert agent.to_dict()["loads"] == 2
+    assert agent.to_dict()["unloads"] == 1
+
+
 def test_load_agents(mocker: MockerFixture):
     mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
 
@@ -104,3 +214,51 @@ def test_search_agents(
         assert len(agents) == expected
     except Exception:
         assert exception
+
+
+@pytest.mark.asyncio
+async def test_unload_does_not_wait_for_loading():
+    agent = LazyAgent(MOCK_AGENT_ID, lambda: MockAgent(MockAgentImpl()))
+    assert await agent.get_agent_state("unknown thread") is None
+
+    # Held by a load in progress in another thread
+    agent._lock.acquire()
+    try:
+        assert unload_idle_agents([agent], idle_ttl=0) == 0
+    finally:
+        agent._lock.release()
+    assert agent.loaded
+    assert unload_idle_agents([agent], idle_ttl=0) == 1
+
+
+@pytest.mark.asyncio
+async def test_agents_with_state_are_not_unloaded(mocker: MockerFixture):
+    agent = LazyAgent(MOCK_AGENT_ID, lambda: MockAgent(MockAgentImpl()))
+    assert await agent.get_agent_state("unknown thread") is None
+
+    # The state of its threads is kept in memory
+    volatile = mocker.patch.object(MockAgent, "has_volatile_state", return_value=True)
+    assert unload_idle_agents([agent], idle_ttl=0) == 0
+    volatile.return_value = False
+
+    run_id = str(uuid.uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": MOCK_AGENT_ID,
+            "thread_id": None,
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "interrupted",
+        }
+    )
+    try:
+        # Waiting to be resumed
+        assert unload_idle_agents([agent], idle_ttl=0) == 0
+    finally:
+        DB.delete_run(run_id)
+    assert unload_idle_agents([agent], idle_ttl=0) == 1
@@ -0,0 +1,118 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+
+import pytest
+from pytest_mock import MockerFixture
+
+from agent_workflow_server.agents.load import load_agents
+from agent_workflow_server.apis.metrics import CONTENT_TYPE, get_metrics
+from agent_workflow_server.generated.models.run_create_stateless import (
+    RunCreateStateless as ApiRunCreate,
+)
+from agent_workflow_server.services.metrics import (
+    RUN_EXEC_SECONDS,
+    RUN_QUEUE_SECONDS,
+    VALIDATION_SECONDS,
+    Counter,
+    Histogram,
+    MetricsRegistry,
+)
+from agent_workflow_server.services.queue import start_workers
+from agent_workflow_server.services.runs import Runs
+from agent_workflow_server.services.validation import validate_against_schema
+from tests.mock import MOCK_AGENT_ID, MOCK_RUN_INPUT_INTERRUPT, MockAdapter
+
+
+def test_render():
+    registry = MetricsRegistry()
+    counter = registry.register(Counter("retries_total", "Retries", ("agent_id",)))
+    histogram = registry.register(
+        Histogram("exec_seconds", "Execution\ntime", ("status",), buckets=(0.1, 1))
+    )
+    counter.inc('agent "a"')
+    counter.inc('agent "a"', value=2)
+    for value in (0.05, 0.5, 0.5, 3):
+        histogram.observe(value, "success")
+
+    assert registry.render() == (
+        "# HELP retries_total Retries\n"
+        "# TYPE retries_total counter\n"
+        'retries_total{agent_id="agent \\"a\\""} 3\n'
+        "# HELP exec_seconds Execution\\ntime\n"
+        "# TYPE exec_seconds histogram\n"
+        'exec_seconds_bucket{status="success",le="0.1"} 1\n'
+        'exec_seconds_bucket{status="success",le="1"} 3\n'
+        'exec_seconds_bucket{status="success",le="+Inf"} 4\n'
+        'exec_seconds_sum{status="success"} 4.05\n'
+        'exec_seconds_count{status="success"} 4\n'
+    )
+
+    with pytest.raises(ValueError):
+        registry.register(Counter("retries_total", "Retries"))
+
+
+def test_merge_updates():
+    def make_registry():
+        registry = MetricsRegistry()
+        registry.register(Counter("retries_total", "Retries", ("agent_id",)))
+        registry.register(Histogram("exec_seconds", "Execution", buckets=(0.1, 1)))
+        return registry
+
+    server, executor = make_registry(), make_registry()
+    server.metrics["retries_total"].inc("a")
+    executor.metrics["retries_total"].inc("a", value=2)
+    executor.metrics["exec_seconds"].observe(0.5)
+
+    server.merge(executor.take_updates())
+    assert executor.take_updates() == {}
+    assert server.metrics["retries_total"].value("a") == 3
+    assert server.metrics["exec_seconds"].count() == 1
+    assert 'exec_seconds_bucket{le="1"} 1' in server.render()
+
+
+@pytest.mark.asyncio
+async def test_run_metrics(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+    labels = (MOCK_AGENT_ID, "interrupted")
+    exec_count = RUN_EXEC_SECONDS.count(*labels)
+    queue_count = RUN_QUEUE_SECONDS.count(*labels)
+    validation_count = VALIDATION_SECONDS.count("input")
+    validate_against_schema(MOCK_RUN_INPUT_INTERRUPT, {"type": "object"}, kind="input")
+    assert VALIDATION_SECONDS.count("input") == validation_count + 1
+
+    worker_task = asyncio.get_event_loop().create_task(start_workers(1))
+    try:
+        new_run = await Runs.put(
+            ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT_INTERRUPT)
+        )
+        await Runs.wait_for_output(run_id=new_run.run_id)
+        # Recorded once the worker is done with the run
+        async with asyncio.timeout(5):
+            while RUN_EXEC_SECONDS.count(*labels) == exec_count:
+                await asyncio.sleep(0.01)
+
+        assert RUN_QUEUE_SECONDS.count(*labels) == queue_count + 1
+        assert VALIDATION_SECONDS.count("interrupt") > 0
+
+        response = await get_metrics()
+        assert response.media_type == CONTENT_TYPE
+        body = response.body.decode()
+        assert "agws_runs_queued 0\n" in body
+        assert 'agws_workers{state="busy"} 0\n' in body
+        assert 'agws_workers{state="idle"} 1\n' in body
+        assert "agws_stream_subscribers " in body
+        assert 'agws_webhook_deliveries_total{outcome="delivered"} ' in body
+        assert (
+            f'agws_run_exec_seconds_count{{agent_id="{MOCK_AGENT_ID}",status="interrupted"}} {exec_count + 1}\n'
+            in body
+        )
+    finally:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
@@ -0,0 +1,131 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import os
+
+import pytest
+from pytest_mock import MockerFixture
+
+from agent_workflow_server.agents.load import load_agents
+from agent_workflow_server.generated.models.run_create_stateless import (
+    RunCreateStateless as ApiRunCreate,
+)
+from agent_workflow_server.services.queue import (
+    AutoscalePolicy,
+    WorkerPool,
+    load_autoscale_policy,
+    start_workers,
+)
+from agent_workflow_server.services.runs import Runs
+from agent_workflow_server.services.scheduler import FairScheduler, QueuedRun
+from agent_workflow_server.storage.storage import DB
+from tests.mock import MOCK_AGENT_ID, MOCK_RUN_INPUT, MockAdapter
+
+
+def test_load_autoscale_policy(monkeypatch):
+    policy = load_autoscale_policy(5)
+    assert policy.min_workers == policy.max_workers == 5
+
+    monkeypatch.setenv("AGWS_WORKERS_MIN", "2")
+    monkeypatch.setenv("AGWS_WORKERS_MAX", "10")
+    policy = load_autoscale_policy(5)
+    assert (policy.min_workers, policy.max_workers) == (2, 10)
+
+    monkeypatch.setenv("AGWS_WORKERS_MAX", "1")
+    with pytest.raises(ValueError):
+        load_autoscale_policy(5)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_scaling(mocker: MockerFixture):
+    scheduler = FairScheduler(concurrency_limits={"capped": 1})
+    mocker.patch("agent_workflow_server.services.queue.RUNS_QUEUE", scheduler)
+
+    started = asyncio.Event()
+
+    async def busy_worker(worker_id: int, pool: WorkerPool):
+        pool.busy.add(worker_id)
+        started.set()
+        await asyncio.Event().wait()
+
+    mocker.patch("agent_workflow_server.services.queue.worker", busy_worker)
+
+    pool = WorkerPool(
+        AutoscalePolicy(min_workers=1, max_workers=4, interval=1, target_queue_s=1)
+    )
+    pool._add_worker()
+    await started.wait()
+
+    for i in range(10):
+        scheduler.put_nowait(QueuedRun(run_id=f"run{i}", agent_id="a"))
+    # Grow up to the max while runs are waiting longer than the target
+    pool.observe({"queue_s": 5.0, "exec_s": 1.0})
+    assert pool.desired_size() == 4
+
+    # Runs waiting for an agent concurrency slot do not need more workers
+    for _ in range(10):
+        scheduler._pop_runnable()
+    for i in range(5):
+        scheduler.put_nowait(QueuedRun(run_id=f"capped{i}", agent_id="capped"))
+    scheduler._pop_runnable()
+    assert scheduler.runnable_size() == 0
+    assert pool.desired_size() == 1
+
+    # No growth while the runs start quickly
+    scheduler.put_nowait(QueuedRun(run_id="quick", agent_id="a"))
+    for _ in range(20):
+        pool.observe({"queue_s": 0.01, "exec_s": 1.0})
+    assert pool.desired_size() == 1
+
+    for task in pool.tasks.values():
+        task.cancel()
+    await asyncio.gather(*pool.tasks.values(), return_exceptions=True)
+
+
+@pytest.mark.asyncio
+async def test_worker_pool_shrinks_idle_workers():
+    pool = WorkerPool(
+        AutoscalePolicy(min_workers=1, max_workers=4, interval=1, target_queue_s=1)
+    )
+    for worker_id in range(1, 4):
+        pool.tasks[worker_id] = asyncio.create_task(asyncio.Event().wait())
+    pool.busy.add(1)
+
+    pool.scale()
+    assert pool.size == 2
+    pool.scale()
+    assert pool.size == 1
+    # The busy worker is never removed
+    assert list(pool.tasks) == [1]
+    pool.scale()
+    assert pool.size == 1
+
+    pool.tasks[1].cancel()
+
+
+@pytest.mark.asyncio
+async def test_run_info_records_are_replaced(mocker: MockerFixture):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+
+    worker_task = asyncio.get_event_loop().create_task(start_workers(1))
+    try:
+        new_run = await Runs.put(
+            ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT)
+        )
+        queued_info = DB.get_run_info(new_run.run_id)
+        snapshot = dict(queued_info)
+        await Runs.wait_for_output(run_id=new_run.run_id)
+    finally:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+
+    # A snapshot of the storage may be pickling the stored record meanwhile
+    assert queued_info == snapshot
+    run_info = DB.get_run_info(new_run.run_id)
+    assert run_info["attempts"] == 1
+    assert "ended_at" in run_info
@@ -0,0 +1,120 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.replay import ReplayBuffer, ReplayPolicy
+from agent_workflow_server.services.runs import Runs, StreamManager
+from agent_workflow_server.storage.storage import DB
+
+
+def _message(seq: int, data="x") -> Message:
+    return Message(type="message", data=data, seq=seq)
+
+
+def test_replay_buffer_caps():
+    buffer = ReplayBuffer(max_messages=3, max_bytes=1000)
+    for seq in range(1, 6):
+        buffer.append(_message(seq))
+    assert [m.seq for m in buffer.since(None)] == [3, 4, 5]
+    assert [m.seq for m in buffer.since(3)] == [4, 5]
+
+    buffer = ReplayBuffer(max_messages=100, max_bytes=10)
+    buffer.append(_message(1, "a" * 4))
+    buffer.append(_message(2, "b" * 4))
+    # Each message is 6 bytes JSON encoded
+    assert [m.seq for m in buffer.since(None)] == [2]
+    buffer.append(_message(3, "c" * 100))
+    assert [m.seq for m in buffer.since(None)] == [3]
+
+
+def test_replay_buffer_size_of_encoded_frames():
+    buffer = ReplayBuffer(max_messages=100, max_bytes=1000)
+    message = _message(1, "a" * 10_000)
+    message.frame = b"data: x\n\n"
+    buffer.append(message)
+    assert buffer.size_bytes == len(message.frame)
+
+
+def test_replay_buffer_new_stream_after_done():
+    buffer = ReplayBuffer(max_messages=100, max_bytes=1000)
+    buffer.append(_message(1))
+    buffer.append(Message(type="control", data="done", seq=2))
+    assert buffer.done
+    buffer.append(_message(3))
+    assert not buffer.done
+    assert [m.seq for m in buffer.since(None)] == [3]
+    assert buffer.next_seq() == 4
+
+
+def _create_run() -> str:
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "pending",
+        }
+    )
+    return run_id
+
+
+async def _collect(run_id: str, last_seq=None) -> list:
+    return [
+        message.data
+        async for message in Runs.Stream.join(run_id, last_seq)
+        if message.type == "message"
+    ]
+
+
+@pytest.mark.asyncio
+async def test_join_replays_buffered_messages(mocker):
+    manager = StreamManager(ReplayPolicy(max_messages=10, max_bytes=1000, grace_s=60))
+    mocker.patch("agent_workflow_server.services.runs.stream_manager", manager)
+    run_id = _create_run()
+
+    for i in range(3):
+        await Runs.Stream.publish(run_id, Message(type="message", data=i))
+    assert manager.buffers[run_id].last_seq == 3
+
+    # A late subscriber gets the history then the live messages
+    late = asyncio.create_task(_collect(run_id))
+    # A reconnecting client resumes after the last event it got
+    resumed = asyncio.create_task(_collect(run_id, last_seq=2))
+    await asyncio.sleep(0.01)
+    await Runs.Stream.publish(run_id, Message(type="message", data=3))
+    await Runs.Stream.publish(run_id, Message(type="control", data="done"))
+
+    assert await asyncio.wait_for(late, 1) == [0, 1, 2, 3]
+    assert await asyncio.wait_for(resumed, 1) == [2, 3]
+    # Subscribers remove their queue when they are done
+    assert run_id not in manager.queues
+
+    # Completed streams are replayed during the grace period
+    DB.update_run_status(run_id, "success")
+    assert await _collect(run_id, last_seq=3) == [3]
+
+
+@pytest.mark.asyncio
+async def test_replay_buffer_released_after_grace_period(mocker):
+    manager = StreamManager(ReplayPolicy(max_messages=10, max_bytes=1000, grace_s=0.1))
+    mocker.patch("agent_workflow_server.services.runs.stream_manager", manager)
+    run_id = _create_run()
+
+    await Runs.Stream.publish(run_id, Message(type="message", data=0))
+    await Runs.Stream.publish(run_id, Message(type="control", data="done"))
+    assert run_id in manager.buffers
+    await asyncio.sleep(0.2)
+    assert run_id not in manager.buffers
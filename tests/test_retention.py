@@ -0,0 +1,156 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import json
+import os
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.services.retention import (
+    RETENTION_STATS,
+    RetentionPolicy,
+    load_retention_policy,
+    sweep,
+)
+from agent_workflow_server.services.retry import DelayedRetryQueue
+from agent_workflow_server.services.runs import stream_manager
+from agent_workflow_server.services.scheduler import QueuedRun
+from agent_workflow_server.storage.storage import DB
+
+
+@pytest.fixture(autouse=True)
+def clean_db():
+    for run in DB.list_runs():
+        DB.delete_run(run["run_id"])
+    yield
+    for run in DB.list_runs():
+        DB.delete_run(run["run_id"])
+
+
+def _create_run(status: str, age_s: float) -> str:
+    updated_at = datetime.now() - timedelta(seconds=age_s)
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": updated_at,
+            "updated_at": updated_at,
+            "status": status,
+        }
+    )
+    DB.add_run_output(run_id, {"message": status})
+    return run_id
+
+
+def test_load_retention_policy(monkeypatch):
+    monkeypatch.setenv("AGWS_RETENTION_TTL", '{"success": 3600, "error": 86400}')
+    monkeypatch.setenv("AGWS_RETENTION_MAX_RUNS", "10")
+    policy = load_retention_policy()
+    assert policy.enabled
+    assert policy.ttls == {"success": 3600.0, "error": 86400.0}
+    assert policy.max_runs == 10
+
+    monkeypatch.setenv("AGWS_RETENTION_TTL", '{"pending": 10}')
+    with pytest.raises(ValueError):
+        load_retention_policy()
+
+
+def test_sweep_ttl():
+    expired_success = _create_run("success", 7200)
+    recent_success = _create_run("success", 60)
+    error = _create_run("error", 7200)
+    pending = _create_run("pending", 7200)
+
+    evicted_before = RETENTION_STATS.runs_evicted_ttl.get("success", 0)
+    sweep(
+        RetentionPolicy(
+            ttls={"success": 3600}, max_runs=None, spill_dir=None, interval=1
+        )
+    )
+
+    assert DB.get_run(expired_success) is None
+    assert DB.get_run_output(expired_success) is None
+    assert DB.get_run(recent_success) is not None
+    assert DB.get_run(error) is not None
+    assert DB.get_run(pending) is not None
+    assert RETENTION_STATS.runs_evicted_ttl["success"] == evicted_before + 1
+
+
+def test_sweep_max_runs():
+    oldest = _create_run("success", 300)
+    pending = _create_run("pending", 400)
+    older = _create_run("error", 200)
+    newest = _create_run("interrupted", 100)
+
+    sweep(RetentionPolicy(ttls={}, max_runs=2, spill_dir=None, interval=1))
+
+    # Pending runs are never evicted
+    assert DB.get_run(pending) is not None
+    assert DB.get_run(newest) is not None
+    assert DB.get_run(oldest) is None
+    assert DB.get_run(older) is None
+
+
+def test_sweep_spill(tmp_path):
+    run_id = _create_run("success", 7200)
+
+    sweep(
+        RetentionPolicy(
+            ttls={"success": 3600}, max_runs=None, spill_dir=str(tmp_path), interval=1
+        )
+    )
+
+    with open(os.path.join(tmp_path, f"{run_id}.json")) as f:
+        spilled = json.load(f)
+    assert spilled["run"]["run_id"] == run_id
+    assert spilled["output"] == {"message": "success"}
+
+
+@pytest.mark.asyncio
+async def test_sweep_releases_run_resources():
+    deleted = _create_run("success", 0)
+    stream_manager._buffer(deleted)
+    DB.delete_run(deleted)
+    finished = _create_run("error", 0)
+    queue = await stream_manager.add_queue(finished)
+
+    sweep(RetentionPolicy(ttls={}, max_runs=None, spill_dir=None, interval=1))
+
+    assert deleted not in stream_manager.buffers
+    # Removed by the subscriber, a failed run may still be retried
+    assert stream_manager.get_queues(finished) == [queue]
+    await stream_manager.remove_queue(finished, queue)
+
+
+@pytest.mark.asyncio
+async def test_sweep_skips_runs_waiting_for_retry(mocker):
+    retry_queue = DelayedRetryQueue()
+    mocker.patch("agent_workflow_server.services.retention.RETRY_QUEUE", retry_queue)
+    retrying = _create_run("error", 7200)
+    failed = _create_run("error", 7200)
+    retry_queue.schedule(QueuedRun(run_id=retrying, agent_id=str(uuid4())), 60)
+
+    sweep(RetentionPolicy(ttls={"error": 3600}, max_runs=0, spill_dir=None, interval=1))
+
+    assert DB.get_run(retrying) is not None
+    assert DB.get_run(failed) is None
+
+
+def test_sweep_batches():
+    expired = [_create_run("success", 7200 + i) for i in range(3)]
+    policy = RetentionPolicy(
+        ttls={"success": 3600}, max_runs=None, spill_dir=None, interval=1
+    )
+
+    assert sweep(policy, batch_size=2)
+    assert [DB.get_run(run_id) is None for run_id in expired] == [False, True, True]
+    assert not sweep(policy, batch_size=2)
+    assert DB.count_runs() == 0
@@ -0,0 +1,80 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from agent_workflow_server.services.retry import (
+    DeadLetter,
+    DeadLetterStore,
+    DelayedRetryQueue,
+    RetryPolicy,
+    load_retry_policies,
+)
+from agent_workflow_server.services.scheduler import FifoScheduler, QueuedRun
+
+
+def test_retry_policy_delay():
+    policy = RetryPolicy(base_delay=1, max_delay=10, multiplier=2, jitter=0)
+    assert [policy.delay(attempt) for attempt in range(1, 6)] == [1, 2, 4, 8, 10]
+
+    policy = policy._replace(jitter=0.5)
+    for _ in range(100):
+        assert 2 <= policy.delay(3) <= 4
+
+
+def test_load_retry_policies(monkeypatch):
+    monkeypatch.setenv("AGWS_RETRY_POLICY", '{"max_attempts": 5}')
+    monkeypatch.setenv("AGWS_AGENT_RETRY_POLICIES", '{"slow": {"base_delay": 10}}')
+    default, per_agent = load_retry_policies()
+    assert default.max_attempts == 5
+    assert per_agent["slow"].max_attempts == 5
+    assert per_agent["slow"].base_delay == 10
+
+    monkeypatch.setenv("AGWS_RETRY_POLICY", '{"unknown": 5}')
+    with pytest.raises(ValueError):
+        load_retry_policies()
+
+
+@pytest.mark.asyncio
+async def test_delayed_retry_queue():
+    queue = FifoScheduler()
+    retries = DelayedRetryQueue()
+    task = asyncio.create_task(retries.run(queue))
+    try:
+        retries.schedule(QueuedRun(run_id="later", agent_id="a"), 0.3)
+        retries.schedule(QueuedRun(run_id="sooner", agent_id="a"), 0.1)
+        assert len(retries) == 2
+
+        await asyncio.sleep(0.05)
+        assert queue.empty()
+
+        run = await asyncio.wait_for(queue.get(), 1)
+        assert run.run_id == "sooner"
+        assert len(retries) == 1
+        run = await asyncio.wait_for(queue.get(), 1)
+        assert run.run_id == "later"
+    finally:
+        task.cancel()
+
+
+def test_dead_letter_store():
+    store = DeadLetterStore(max_size=2)
+    for i, agent_id in enumerate(["a", "b", "a"]):
+        store.add(
+            DeadLetter(
+                run_id=str(i),
+                agent_id=agent_id,
+                attempts=3,
+                error="error",
+                failed_at=datetime.now(),
+            )
+        )
+    assert len(store) == 2
+    assert store.get("0") is None
+    assert [letter["run_id"] for letter in store.list()] == ["2", "1"]
+    assert [letter["run_id"] for letter in store.list(agent_id="a")] == ["2"]
+    assert store.remove("1")["agent_id"] == "b"
+    assert store.list(offset=1) == []
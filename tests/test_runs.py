@@ -14,8 +14,13 @@ from agent_workflow_server.generated.models.config import Config
 from agent_workflow_server.generated.models.run_search_request import (
     RunSearchRequest,
 )
+from agent_workflow_server.generated.models.stream_event_payload import (
+    StreamEventPayload,
+)
 from agent_workflow_server.services.queue import start_workers
 from agent_workflow_server.services.runs import ApiRun, ApiRunCreate, Runs
+from agent_workflow_server.services.sse import KEEPALIVE_FRAME
+from agent_workflow_server.services.webhooks import webhook_dispatcher
 from agent_workflow_server.storage.models import RunStatus
 from agent_workflow_server.storage.storage import DB
 from tests.mock import (
@@ -36,6 +41,13 @@ from tests.mock import (
 )
 
 
+def _stream_event(frame: bytes) -> StreamEventPayload | None:
+    if frame == KEEPALIVE_FRAME:
+        return None
+    data = frame.decode("utf-8").split("\n")[-3]
+    return StreamEventPayload.from_json(data.removeprefix("data: "))
+
+
 @pytest.mark.asyncio
 @pytest.mark.parametrize(
     "run_create_mock, expected_status, expected_output",
@@ -118,6 +130,7 @@ async def test_invoke(
 
         # Check if the webhook was called with the expected payload
         if run_create_mock.webhook:
+            await webhook_dispatcher.flush()
             assert mock_server.webhook_payload.decode("utf-8") == run.model_dump_json(
                 by_alias=True, exclude_unset=True
             )
@@ -342,14 +355,15 @@ async def test_invoke_stream(
         assert new_run.creation.config == run_create_mock.config
 
         try:
-            async for event in Runs.stream_events(run_id=new_run.run_id):
+            async for frame in Runs.stream_frames(run_id=new_run.run_id):
+                event = _stream_event(frame)
                 if isinstance(expected_output, list):
                     exp_output = expected_output.pop(0)
                 else:
                     exp_output = expected_output
 
                 if event is None:
-                    break  # Errors can generate None at the moment
+                    break  # Errors can generate keepalives at the moment
                 elif event.actual_instance.type == "custom":
                     assert False, (
                         f"unsupported stream event payload type: {event.actual_instance.type}"
@@ -0,0 +1,147 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+
+import pytest
+
+from agent_workflow_server.services.scheduler import (
+    FairScheduler,
+    FifoScheduler,
+    QueuedRun,
+    RunScheduling,
+)
+
+
+def _drain(scheduler) -> list:
+    return [scheduler._pop_runnable().run_id for _ in range(scheduler.qsize())]
+
+
+def test_fifo_scheduler():
+    scheduler = FifoScheduler()
+    for i in range(5):
+        scheduler.put_nowait(QueuedRun(run_id=str(i), agent_id="a"))
+    assert _drain(scheduler) == ["0", "1", "2", "3", "4"]
+
+
+def test_fair_scheduler_single_flow_is_fifo():
+    scheduler = FairScheduler()
+    for i in range(5):
+        scheduler.put_nowait(QueuedRun(run_id=str(i), agent_id="a"))
+    assert _drain(scheduler) == ["0", "1", "2", "3", "4"]
+
+
+def test_fair_scheduler_interleaves_agents():
+    scheduler = FairScheduler()
+    for i in range(100):
+        scheduler.put_nowait(QueuedRun(run_id=f"a{i}", agent_id="a"))
+    scheduler.put_nowait(QueuedRun(run_id="b0", agent_id="b"))
+    scheduler.put_nowait(QueuedRun(run_id="b1", agent_id="b"))
+
+    order = _drain(scheduler)
+    # The burst of agent "a" does not delay agent "b" runs
+    assert order.index("b0") <= 1
+    assert order.index("b1") <= 3
+
+
+def test_fair_scheduler_interleaves_tenants():
+    scheduler = FairScheduler()
+    for i in range(100):
+        scheduler.put_nowait(QueuedRun(run_id=f"t1-{i}", agent_id="a", tenant="t1"))
+    scheduler.put_nowait(QueuedRun(run_id="t2-0", agent_id="a", tenant="t2"))
+    assert _drain(scheduler).index("t2-0") <= 1
+
+
+def test_fair_scheduler_priorities():
+    scheduler = FairScheduler()
+    for i in range(100):
+        scheduler.put_nowait(
+            QueuedRun(run_id=f"batch{i}", agent_id="a", priority="batch")
+        )
+    for i in range(10):
+        scheduler.put_nowait(QueuedRun(run_id=f"normal{i}", agent_id="a"))
+    scheduler.put_nowait(
+        QueuedRun(run_id="interactive", agent_id="a", priority="interactive")
+    )
+    scheduler.put_nowait(QueuedRun(run_id="resume", agent_id="a", resumed=True))
+
+    order = _drain(scheduler)
+    assert order[:2] == ["resume", "interactive"]
+    # Higher priority classes get a larger share but batch runs are not starved
+    assert all(order.index(f"normal{i}") < 20 for i in range(10))
+    assert order.index("batch0") < 8
+
+
+def test_fair_scheduler_agent_weights():
+    scheduler = FairScheduler(agent_weights={"heavy": 3})
+    for i in range(40):
+        scheduler.put_nowait(QueuedRun(run_id=f"heavy{i}", agent_id="heavy"))
+        scheduler.put_nowait(QueuedRun(run_id=f"light{i}", agent_id="light"))
+
+    first = _drain(scheduler)[:40]
+    assert sum(run_id.startswith("heavy") for run_id in first) == 30
+
+
+def test_run_scheduling_priority():
+    assert RunScheduling().resolve_priority(None) == "normal"
+    assert (
+        RunScheduling(default_priority="interactive").resolve_priority(
+            {"priority": "batch"}
+        )
+        == "batch"
+    )
+    assert (
+        RunScheduling(priority="interactive").resolve_priority({"priority": "batch"})
+        == "interactive"
+    )
+    assert RunScheduling().resolve_priority({"priority": "urgent"}) == "normal"
+
+
+@pytest.mark.asyncio
+async def test_scheduler_queue_interface():
+    scheduler = FairScheduler()
+    getter = asyncio.create_task(scheduler.get())
+    await asyncio.sleep(0)
+    assert not getter.done()
+
+    await scheduler.put(QueuedRun(run_id="0", agent_id="a"))
+    assert (await asyncio.wait_for(getter, 1)).run_id == "0"
+
+    scheduler.task_done()
+    await asyncio.wait_for(scheduler.join(), 1)
+
+
+@pytest.mark.parametrize("scheduler_type", [FifoScheduler, FairScheduler])
+def test_scheduler_concurrency_limits(scheduler_type):
+    scheduler = scheduler_type(concurrency_limits={"slow": 2})
+    for i in range(5):
+        scheduler.put_nowait(QueuedRun(run_id=f"slow{i}", agent_id="slow"))
+    scheduler.put_nowait(QueuedRun(run_id="fast0", agent_id="fast"))
+    assert scheduler.runnable_size() == 3
+
+    started = [scheduler._pop_runnable() for _ in range(4)]
+    assert {run.run_id for run in started[:3]} == {"slow0", "slow1", "fast0"}
+    # "slow" is at its limit
+    assert started[3] is None
+    assert scheduler.running("slow") == 2
+    assert scheduler.runnable_size() == 0
+
+    scheduler.release(next(run for run in started if run.run_id == "slow0"))
+    assert scheduler.runnable_size() == 1
+    assert scheduler._pop_runnable().run_id == "slow2"
+    assert scheduler._pop_runnable() is None
+
+
+@pytest.mark.asyncio
+async def test_scheduler_get_waits_for_release():
+    scheduler = FairScheduler(concurrency_limits={"a": 1})
+    scheduler.put_nowait(QueuedRun(run_id="0", agent_id="a"))
+    scheduler.put_nowait(QueuedRun(run_id="1", agent_id="a"))
+    first = await scheduler.get()
+
+    getter = asyncio.create_task(scheduler.get())
+    await asyncio.sleep(0)
+    assert not getter.done()
+
+    scheduler.release(first)
+    assert (await asyncio.wait_for(getter, 1)).run_id == "1"
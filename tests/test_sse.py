@@ -0,0 +1,115 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.generated.models.stream_event_payload import (
+    StreamEventPayload,
+)
+from agent_workflow_server.generated.models.value_run_error_update import (
+    ValueRunErrorUpdate,
+)
+from agent_workflow_server.generated.models.value_run_interrupt_update import (
+    ValueRunInterruptUpdate,
+)
+from agent_workflow_server.generated.models.value_run_result_update import (
+    ValueRunResultUpdate,
+)
+from agent_workflow_server.services import sse
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.runs import Runs
+from agent_workflow_server.storage.storage import DB
+
+
+def _data(frame: bytes) -> dict:
+    *_, event, data, end, _ = frame.decode("utf-8").split("\n")
+    assert event == "event: agent_event"
+    assert end == ""
+    return json.loads(data.removeprefix("data: "))
+
+
+@pytest.mark.parametrize(
+    "status, message, expected",
+    [
+        (
+            "pending",
+            Message(type="message", data={"answer": [1, 2]}, seq=1),
+            ValueRunResultUpdate(
+                type="values", run_id="run", status="pending", values={"answer": [1, 2]}
+            ),
+        ),
+        (
+            "interrupted",
+            Message(type="interrupt", data={"question": "?"}, seq=2),
+            ValueRunInterruptUpdate(
+                type="interrupt",
+                run_id="run",
+                status="interrupted",
+                interrupt={"question": "?"},
+            ),
+        ),
+        (
+            "timeout",
+            Message(type="message", data="deadline", seq=3),
+            ValueRunErrorUpdate(
+                type="error",
+                run_id="run",
+                status="timeout",
+                description="deadline",
+                errcode=0,
+            ),
+        ),
+    ],
+)
+def test_encode_frame_matches_stream_event_payload(status, message, expected):
+    frame = sse.encode_frame("run", status, message)
+    assert frame.startswith(b"id: %d\n" % message.seq)
+    assert _data(frame) == json.loads(StreamEventPayload(expected).to_json())
+
+
+def test_encode_frame_without_orjson(monkeypatch):
+    monkeypatch.setattr(sse, "orjson", None)
+    frame = sse.encode_frame("run", "pending", Message(type="message", data="é"))
+    assert not frame.startswith(b"id:")
+    assert _data(frame)["values"] == "é"
+    assert (
+        sse.encode_frame("run", "pending", Message(type="control", data="done")) is None
+    )
+
+
+@pytest.mark.asyncio
+async def test_frames_are_shared_by_subscribers():
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "pending",
+        }
+    )
+
+    async def collect():
+        return [frame async for frame in Runs.stream_frames(run_id)]
+
+    subscribers = [asyncio.create_task(collect()) for _ in range(2)]
+    await asyncio.sleep(0.01)
+    await Runs.Stream.publish(run_id, Message(type="message", data={"n": 1}))
+    await Runs.Stream.publish(run_id, Message(type="control", data="done"))
+
+    first, second = await asyncio.wait_for(asyncio.gather(*subscribers), 1)
+    assert len(first) == 1
+    # Encoded once at publish time
+    assert first[0] is second[0]
+    assert _data(first[0])["values"] == {"n": 1}
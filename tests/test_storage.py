@@ -0,0 +1,406 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import base64
+import os
+import pickle
+from datetime import datetime, timedelta
+from uuid import uuid4
+
+import pytest
+
+from agent_workflow_server.generated.models.run_status import RunStatus
+from agent_workflow_server.storage.service import DBOperations
+from agent_workflow_server.storage.sqlite import SQLiteDB
+from agent_workflow_server.storage.storage import InMemoryDB
+
+
+def _make_run(agent_id: str, thread_id: str, status: str = "pending"):
+    return {
+        "run_id": str(uuid4()),
+        "agent_id": agent_id,
+        "thread_id": thread_id,
+        "input": {"message": "hello"},
+        "config": None,
+        "metadata": {"key": "value"},
+        "webhook": None,
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+        "status": status,
+    }
+
+
+@pytest.fixture
+def sqlite_db(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+    db = SQLiteDB()
+    yield db
+    db._close()
+
+
+def test_sqlite_wal_mode(sqlite_db: SQLiteDB):
+    mode = sqlite_db._conn.execute("PRAGMA journal_mode").fetchone()[0]
+    assert mode == "wal"
+    # NORMAL: commits do not wait for the disk
+    assert sqlite_db._conn.execute("PRAGMA synchronous").fetchone()[0] == 1
+
+
+def test_sqlite_synchronous(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+    monkeypatch.setenv("AGWS_SQLITE_SYNCHRONOUS", "full")
+    db = SQLiteDB()
+    assert db._conn.execute("PRAGMA synchronous").fetchone()[0] == 2
+    db._close()
+
+    monkeypatch.setenv("AGWS_SQLITE_SYNCHRONOUS", "NORMAL; DROP TABLE runs")
+    with pytest.raises(ValueError):
+        SQLiteDB()
+
+
+def test_sqlite_rejects_other_files(tmp_path, monkeypatch):
+    path = tmp_path / "agws_storage.pkl"
+    path.write_bytes(pickle.dumps({"runs": {}}))
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(path))
+    with pytest.raises(ValueError, match="not a SQLite database"):
+        SQLiteDB()
+    assert path.read_bytes() == pickle.dumps({"runs": {}})
+
+
+def test_sqlite_runs_crud(sqlite_db: SQLiteDB):
+    run = _make_run("agent-1", "thread-1")
+    sqlite_db.create_run(run)
+
+    with pytest.raises(ValueError):
+        sqlite_db.create_run(run)
+
+    assert sqlite_db.get_run(run["run_id"]) == run
+    assert sqlite_db.get_run_status(run["run_id"]) == "pending"
+
+    updated = sqlite_db.update_run_status(run["run_id"], "success")
+    assert updated["status"] == "success"
+    assert sqlite_db.get_run(run["run_id"])["status"] == "success"
+    assert sqlite_db.update_run("non-existent", {"status": "error"}) is None
+
+    sqlite_db.create_run_info(
+        {"run_id": run["run_id"], "queued_at": datetime.now(), "attempts": 0}
+    )
+    sqlite_db.update_run_info(run["run_id"], {"attempts": 1})
+    assert sqlite_db.get_run_info(run["run_id"])["attempts"] == 1
+
+    sqlite_db.add_run_output(run["run_id"], {"message": "world"})
+    assert sqlite_db.get_run_output(run["run_id"]) == {"message": "world"}
+
+    assert sqlite_db.delete_run(run["run_id"])
+    assert not sqlite_db.delete_run(run["run_id"])
+    assert sqlite_db.get_run(run["run_id"]) is None
+    assert sqlite_db.get_run_info(run["run_id"]) is None
+    assert sqlite_db.get_run_output(run["run_id"]) is None
+
+
+def test_sqlite_search_run(sqlite_db: SQLiteDB):
+    runs = [
+        _make_run("agent-1", "thread-1", "pending"),
+        _make_run("agent-1", "thread-1", "success"),
+        _make_run("agent-1", "thread-2", "pending"),
+        _make_run("agent-2", "thread-3", "error"),
+    ]
+    for run in runs:
+        sqlite_db.create_run(run)
+    # Updates must not change the insertion order
+    sqlite_db.update_run(runs[0]["run_id"], {"metadata": {"key": "other"}})
+
+    assert len(sqlite_db.search_run({"agent_id": "agent-1"})) == 3
+    assert (
+        len(sqlite_db.search_run({"thread_id": "thread-1", "status": "pending"})) == 1
+    )
+    assert len(sqlite_db.search_run({"status": "error"})) == 1
+    assert len(sqlite_db.search_run({"metadata": {"key": "value"}})) == 3
+    assert [run["run_id"] for run in sqlite_db.search_run({})] == [
+        run["run_id"] for run in runs
+    ]
+
+
+@pytest.mark.parametrize("db_type", ["memory", "sqlite"])
+def test_retention_queries(db_type, tmp_path, monkeypatch):
+    if db_type == "sqlite":
+        monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+        monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+        db = SQLiteDB()
+    else:
+        db = DBOperations(runs={}, runs_info={}, runs_output={}, threads={})
+    now = datetime.now()
+    runs = []
+    for age, status in ((300, "success"), (400, "pending"), (200, "error")):
+        run = _make_run("agent-1", "thread-1", status)
+        run["updated_at"] = now - timedelta(seconds=age)
+        db.create_run(run)
+        runs.append(run)
+    oldest, pending, newest = runs
+
+    assert db.least_recently_updated_runs(1) == [oldest]
+    assert db.least_recently_updated_runs(5) == [oldest, newest]
+    before = now - timedelta(seconds=250)
+    assert db.search_runs_updated_before("success", before, 5) == [oldest]
+    assert db.search_runs_updated_before("error", before, 5) == []
+    assert db.search_runs_updated_before(RunStatus.PENDING, before, 5) == [pending]
+    assert db.search_runs_updated_before("pending", before, 0) == []
+
+
+def test_sqlite_threads_crud(sqlite_db: SQLiteDB):
+    thread = {
+        "thread_id": str(uuid4()),
+        "metadata": {"key": "value"},
+        "status": "idle",
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+    }
+    sqlite_db.create_thread(thread)
+    with pytest.raises(ValueError):
+        sqlite_db.create_thread(thread)
+
+    assert sqlite_db.get_thread(thread["thread_id"]) == thread
+    assert sqlite_db.search_thread({"status": "idle"}) == [thread]
+    updated = sqlite_db.update_thread(thread["thread_id"], {"status": "busy"})
+    assert updated["status"] == "busy"
+    assert sqlite_db.search_thread({"status": "idle"}) == []
+    assert sqlite_db.delete_thread(thread["thread_id"])
+    assert sqlite_db.list_threads() == []
+
+
+def test_sqlite_persistence(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+
+    db = SQLiteDB()
+    run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+    db.add_run_output(run["run_id"], {"message": "world"})
+    db._close()
+
+    reopened = SQLiteDB()
+    assert reopened.get_run(run["run_id"]) == run
+    assert reopened.get_run_output(run["run_id"]) == {"message": "world"}
+    reopened._close()
+
+
+def test_sqlite_shared_threads_kept(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+    thread = {"thread_id": str(uuid4()), "status": "idle", "metadata": None}
+
+    db = SQLiteDB()
+    db.create_thread(thread)
+    db._close()
+    # Non persistent threads are dropped on exit
+    reopened = SQLiteDB()
+    assert reopened.get_thread(thread["thread_id"]) is None
+
+    # Unless other API processes share the database
+    monkeypatch.setenv("AGWS_API_WORKERS", "2")
+    reopened.create_thread(thread)
+    reopened._close()
+    shared = SQLiteDB()
+    assert shared.get_thread(thread["thread_id"]) == thread
+    shared._close()
+
+
+def test_indexed_search_run():
+    db = DBOperations(runs={}, runs_info={}, runs_output={}, threads={})
+    runs = [
+        _make_run("agent-1", "thread-1", "pending"),
+        _make_run("agent-1", "thread-1", "success"),
+        _make_run("agent-1", "thread-2", "pending"),
+        _make_run("agent-2", "thread-3", "error"),
+    ]
+    for run in runs:
+        db.create_run(run)
+
+    assert db.search_run({"thread_id": "thread-1", "status": "pending"}) == [runs[0]]
+    assert db.search_run({"status": RunStatus.PENDING}) == [runs[0], runs[2]]
+    assert db.search_run({"agent_id": "agent-1", "status": "error"}) == []
+
+    # Status changes move the run to the new postings
+    db.update_run_status(runs[0]["run_id"], "success")
+    assert db.search_run({"thread_id": "thread-1", "status": "pending"}) == []
+    assert [run["run_id"] for run in db.search_run({"status": "success"})] == [
+        runs[0]["run_id"],
+        runs[1]["run_id"],
+    ]
+
+    db.delete_run(runs[1]["run_id"])
+    assert len(db.search_run({"thread_id": "thread-1"})) == 1
+
+    # Non indexed filters are checked on the candidates
+    assert (
+        len(db.search_run({"agent_id": "agent-1", "metadata": {"key": "value"}})) == 2
+    )
+    assert len(db.search_run({"metadata": {"key": "other"}})) == 0
+
+
+def test_indexed_search_run_direct_changes():
+    db = DBOperations(runs={}, runs_info={}, runs_output={}, threads={})
+    run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+
+    # Records changed bypassing the CRUD operations are found once re-indexed
+    db._runs.clear()
+    db.reindex()
+    assert db.search_run({"agent_id": "agent-1"}) == []
+    other = _make_run("agent-1", "thread-1")
+    db._runs[other["run_id"]] = other
+    db.reindex()
+    assert db.search_run({"agent_id": "agent-1"}) == [other]
+
+    # Replaced in place, the number of records does not change
+    replaced = {**other, "agent_id": "agent-2"}
+    db._runs[other["run_id"]] = replaced
+    db.reindex()
+    assert db.search_run({"agent_id": "agent-1"}) == []
+    assert db.search_run({"agent_id": "agent-2"}) == [replaced]
+
+
+def test_indexed_search_thread():
+    db = DBOperations(runs={}, runs_info={}, runs_output={}, threads={})
+    thread = {
+        "thread_id": str(uuid4()),
+        "metadata": {"key": "value"},
+        "status": "idle",
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+    }
+    db.create_thread(thread)
+
+    assert db.search_thread({"status": "idle"}) == [thread]
+    db.update_thread(thread["thread_id"], {"status": "busy"})
+    assert db.search_thread({"status": "idle"}) == []
+    assert len(db.search_thread({"status": "busy", "metadata": {"key": "value"}})) == 1
+    db.delete_thread(thread["thread_id"])
+    assert db.search_thread({"status": "busy"}) == []
+
+
+@pytest.fixture
+def journal_env(tmp_path, monkeypatch):
+    monkeypatch.setenv("AGWS_STORAGE_PERSIST", "True")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.pkl"))
+    monkeypatch.setenv("AGWS_JOURNAL_COMPACT_INTERVAL", "3600")
+    return tmp_path
+
+
+def test_journal_recovery_without_snapshot(journal_env):
+    db = InMemoryDB()
+    run = _make_run("agent-1", "thread-1")
+    deleted_run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+    db.create_run(deleted_run)
+    db.update_run_status(run["run_id"], "success")
+    db.add_run_output(run["run_id"], {"message": "world"})
+    db.delete_run(deleted_run["run_id"])
+    db._journal.sync()
+
+    # Simulate a crash: the snapshot is never written
+    assert not os.path.exists(journal_env / "agws_storage.pkl")
+
+    recovered = InMemoryDB()
+    assert recovered.get_run(run["run_id"])["status"] == "success"
+    assert recovered.get_run(run["run_id"])["created_at"] == run["created_at"]
+    assert recovered.get_run_output(run["run_id"]) == {"message": "world"}
+    assert recovered.get_run(deleted_run["run_id"]) is None
+    assert recovered.search_run({"status": "success"}) == [
+        recovered.get_run(run["run_id"])
+    ]
+
+    db._close()
+    recovered._close()
+
+
+def test_journal_compaction(journal_env):
+    db = InMemoryDB()
+    run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+    db._compact()
+
+    assert os.path.getsize(journal_env / "agws_storage.pkl.journal") == 0
+    assert not os.path.exists(journal_env / "agws_storage.pkl.journal.old")
+
+    # Changes after the compaction go to the new journal
+    db.update_run_status(run["run_id"], "error")
+    db._journal.sync()
+
+    recovered = InMemoryDB()
+    assert recovered.get_run(run["run_id"])["status"] == "error"
+
+    db._close()
+    recovered._close()
+
+
+def test_journal_threads_persistence(journal_env):
+    thread = {
+        "thread_id": str(uuid4()),
+        "metadata": None,
+        "status": "idle",
+        "created_at": datetime.now(),
+        "updated_at": datetime.now(),
+    }
+
+    db = InMemoryDB()
+    db.create_thread(thread)
+    db._close()
+
+    # Threads are not persisted by default
+    recovered = InMemoryDB()
+    assert recovered.get_thread(thread["thread_id"]) is None
+    recovered.set_persist_threads(True)
+    recovered.create_thread(thread)
+    recovered._journal.sync()
+
+    persisted = InMemoryDB()
+    assert persisted.get_thread(thread["thread_id"]) == thread
+
+    recovered._close()
+    persisted._close()
+
+
+def test_journal_user_keys_are_not_tags(journal_env, mocker):
+    loads = mocker.spy(pickle, "loads")
+    payload = pickle.dumps(datetime.now())
+    output = {
+        "$pickle": base64.b64encode(payload).decode("ascii"),
+        "$dt": "not-a-date",
+        "$$key": [{"$dt": 1}],
+    }
+    db = InMemoryDB()
+    run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+    db.add_run_output(run["run_id"], output)
+    db._journal.sync()
+
+    recovered = InMemoryDB()
+    assert recovered.get_run_output(run["run_id"]) == output
+    assert recovered.get_run(run["run_id"])["created_at"] == run["created_at"]
+    loads.assert_not_called()
+
+    db._close()
+    recovered._close()
+
+
+def test_close_at_exit_does_not_log(journal_env, tmp_path, monkeypatch, caplog):
+    db = InMemoryDB()
+    run = _make_run("agent-1", "thread-1")
+    db.create_run(run)
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(tmp_path / "agws_storage.db"))
+    sqlite_db = SQLiteDB()
+
+    caplog.set_level("DEBUG")
+    caplog.clear()
+    db._close(at_exit=True)
+    sqlite_db._close(at_exit=True)
+    assert caplog.records == []
+    # The state is not compacted on close, it is recovered from the journal
+    assert not os.path.exists(journal_env / "agws_storage.pkl")
+    monkeypatch.setenv("AGWS_STORAGE_PATH", str(journal_env / "agws_storage.pkl"))
+    recovered = InMemoryDB()
+    assert recovered.get_run(run["run_id"]) == run
+    recovered._close()
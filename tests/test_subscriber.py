@@ -0,0 +1,97 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+
+import pytest
+
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.subscriber import (
+    SlowConsumerError,
+    SubscriberPolicy,
+    SubscriberQueue,
+    load_subscriber_policy,
+)
+
+
+def _values(seq: int) -> Message:
+    return Message(type="message", data={"step": seq}, seq=seq)
+
+
+def _snapshot(seq: int) -> Message:
+    return Message(type="message", data={"step": seq}, seq=seq, snapshot=True)
+
+
+def _drain(queue: SubscriberQueue) -> list:
+    messages = []
+    while not queue.empty():
+        messages.append(queue._messages.popleft())
+    return messages
+
+
+def test_load_subscriber_policy(monkeypatch):
+    assert load_subscriber_policy() == SubscriberPolicy()
+    monkeypatch.setenv("AGWS_STREAM_OVERFLOW_POLICY", "block")
+    with pytest.raises(ValueError):
+        load_subscriber_policy()
+
+
+def test_drop_oldest():
+    queue = SubscriberQueue("run", SubscriberPolicy(max_size=3, overflow="drop_oldest"))
+    queue.put_nowait(Message(type="interrupt", data="interrupt", seq=0))
+    for seq in range(1, 6):
+        queue.put_nowait(_values(seq))
+
+    assert [m.seq for m in _drain(queue)] == [0, 4, 5]
+    assert queue.dropped == 3
+    assert queue.max_lag == 3
+
+
+def test_coalesce():
+    queue = SubscriberQueue("run", SubscriberPolicy(max_size=3, overflow="coalesce"))
+    for seq in range(1, 4):
+        queue.put_nowait(_snapshot(seq))
+    queue.put_nowait(_snapshot(4))
+    queue.put_nowait(Message(type="control", data="done", seq=5))
+
+    # The waiting snapshots are replaced by the latest one
+    assert [m.seq for m in _drain(queue)] == [4, 5]
+    assert queue.coalesced == 3
+
+
+def test_coalesce_disconnects_on_updates():
+    queue = SubscriberQueue("run", SubscriberPolicy(max_size=3, overflow="coalesce"))
+    for seq in range(1, 5):
+        queue.put_nowait(_values(seq))
+
+    # Node updates cannot be merged: none is dropped
+    assert queue.disconnected
+    assert queue.coalesced == 0
+
+
+@pytest.mark.asyncio
+async def test_disconnect():
+    queue = SubscriberQueue("run", SubscriberPolicy(max_size=2, overflow="disconnect"))
+    queue.put_nowait(_values(1))
+    assert (await queue.get()).seq == 1
+
+    for seq in range(2, 5):
+        queue.put_nowait(_values(seq))
+    assert queue.disconnected
+    with pytest.raises(SlowConsumerError):
+        await queue.get()
+    stats = queue.to_dict()
+    assert stats["disconnected"]
+    assert stats["lag_seq"] == 3
+
+
+@pytest.mark.asyncio
+async def test_get_waits_for_messages():
+    queue = SubscriberQueue("run", SubscriberPolicy())
+    getter = asyncio.create_task(queue.get())
+    await asyncio.sleep(0)
+    assert not getter.done()
+
+    queue.put_nowait(_values(1))
+    assert (await asyncio.wait_for(getter, 1)).seq == 1
+    assert queue.to_dict()["lag"] == 0
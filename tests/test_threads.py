@@ -29,6 +29,7 @@ def clean_db():
     DB._runs_info.clear()
     DB._runs_output.clear()
     DB._threads.clear()
+    DB.reindex()
 
     # Run the test
     yield
@@ -45,6 +46,7 @@ def clean_db():
     DB._runs_info.update(original_runs_info)
     DB._runs_output.update(original_runs_output)
     DB._threads.update(original_threads)
+    DB.reindex()
 
 
 @pytest.fixture
@@ -0,0 +1,75 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+from collections import OrderedDict
+from enum import Enum
+from typing import List
+
+import pytest
+from pydantic import BaseModel, ConfigDict
+
+from agent_workflow_server.utils.tools import make_serializable
+
+
+class Color(Enum):
+    RED = "red"
+
+
+class Message(BaseModel):
+    role: str
+    content: str
+
+
+class FrozenMessage(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
+    role: str
+    content: str
+    tags: List[int]
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("text", "text"),
+        (Color.RED, "red"),
+        (
+            {"messages": [Message(role="user", content="hi")], "color": Color.RED},
+            {"messages": [{"role": "user", "content": "hi"}], "color": "red"},
+        ),
+        (OrderedDict(a=[1, Color.RED]), {"a": [1, "red"]}),
+        # Tuples are left as is
+        ((Color.RED,), (Color.RED,)),
+    ],
+)
+def test_make_serializable(value, expected):
+    serialized = make_serializable(value)
+    assert serialized == expected
+    assert type(serialized) is type(expected)
+
+
+def test_json_native_containers_are_not_copied():
+    state = {"messages": [{"role": "user", "content": "hi"}] * 3, "step": 1}
+    assert make_serializable(state) is state
+
+    state["messages"] = state["messages"] + [Message(role="ai", content="hello")]
+    serialized = make_serializable(state)
+    assert serialized is not state
+    # Only the containers holding something to convert are copied
+    assert serialized["messages"] is not state["messages"]
+    assert serialized["messages"][0] is state["messages"][0]
+    assert serialized["messages"][-1] == {"role": "ai", "content": "hello"}
+    assert isinstance(state["messages"][-1], Message)
+
+
+def test_frozen_model_dumps_are_not_shared():
+    message = FrozenMessage(role="user", content="hi", tags=[1])
+    first = make_serializable(message)
+    first["role"] = "ai"
+    # Frozen models can hold mutable containers
+    message.tags.append(2)
+    assert make_serializable(message) == {
+        "role": "user",
+        "content": "hi",
+        "tags": [1, 2],
+    }
@@ -0,0 +1,266 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+import os
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+
+pytest.importorskip("opentelemetry.sdk")
+
+from opentelemetry import trace
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from agent_workflow_server.agents.load import load_agents
+from agent_workflow_server.generated.models.run_create_stateful import (
+    RunCreateStateful,
+)
+from agent_workflow_server.generated.models.run_create_stateless import (
+    RunCreateStateless as ApiRunCreate,
+)
+from agent_workflow_server.generated.models.thread_create import ThreadCreate
+from agent_workflow_server.services import tracing
+from agent_workflow_server.services.executor import ProcessExecutor
+from agent_workflow_server.services.otlp_file import OTLPFileSpanExporter
+from agent_workflow_server.services.queue import start_workers
+from agent_workflow_server.services.runs import Runs
+from agent_workflow_server.services.stream import stream_run
+from agent_workflow_server.services.thread_runs import ThreadRuns
+from agent_workflow_server.services.threads import Threads
+from agent_workflow_server.services.webhooks import WebhookDispatcher, WebhookPolicy
+from tests.mock import (
+    MOCK_AGENT_ID,
+    MOCK_RUN_INPUT_INTERRUPT,
+    MockAdapter,
+    use_mock_adapter,
+)
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+_EXPORTER = InMemorySpanExporter()
+
+
+@pytest.fixture(scope="module", autouse=True)
+def provider():
+    # The global tracer provider can only be set once
+    provider = TracerProvider()
+    provider.add_span_processor(SimpleSpanProcessor(_EXPORTER))
+    trace.set_tracer_provider(provider)
+    return provider
+
+
+@pytest.fixture
+def exporter() -> InMemorySpanExporter:
+    _EXPORTER.clear()
+    return _EXPORTER
+
+
+def _by_name(exporter: InMemorySpanExporter):
+    return {span.name: span for span in exporter.get_finished_spans()}
+
+
+def test_inject():
+    assert tracing.inject() is None
+    with tracing.span("parent") as span:
+        carrier = tracing.inject()
+    trace_id = format(span.get_span_context().trace_id, "032x")
+    assert carrier["traceparent"].split("-")[1] == trace_id
+
+
+@pytest.mark.asyncio
+async def test_run_spans(mocker: MockerFixture, exporter: InMemorySpanExporter):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+
+    worker_task = asyncio.get_event_loop().create_task(start_workers(1))
+    try:
+        with tracing.span("request") as request_span:
+            new_run = await Runs.put(
+                ApiRunCreate(agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT_INTERRUPT)
+            )
+        await Runs.wait_for_output(run_id=new_run.run_id)
+        # Ended once the worker is done with the run
+        async with asyncio.timeout(5):
+            while "run.execute" not in _by_name(exporter):
+                await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+
+    spans = _by_name(exporter)
+    request_id = request_span.get_span_context().span_id
+    queued, execute = spans["run.queued"], spans["run.execute"]
+    assert queued.parent.span_id == execute.parent.span_id == request_id
+    assert queued.end_time <= execute.start_time
+    assert execute.attributes["run.id"] == new_run.run_id
+    assert execute.attributes["run.status"] == "interrupted"
+    astream = spans["agent.astream"]
+    assert astream.parent.span_id == execute.context.span_id
+    assert spans["validate interrupt"].parent.span_id == astream.context.span_id
+
+
+@pytest.mark.asyncio
+async def test_thread_run_spans(mocker: MockerFixture, exporter: InMemorySpanExporter):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+    thread = await Threads.create_thread(ThreadCreate(metadata={}), False)
+
+    worker_task = asyncio.get_event_loop().create_task(start_workers(1))
+    try:
+        with tracing.span("request") as request_span:
+            new_run = await ThreadRuns.put(
+                RunCreateStateful(
+                    agent_id=MOCK_AGENT_ID, input=MOCK_RUN_INPUT_INTERRUPT
+                ),
+                thread.thread_id,
+            )
+        await ThreadRuns.wait_for_output(run_id=new_run.run_id)
+        async with asyncio.timeout(5):
+            while "run.execute" not in _by_name(exporter):
+                await asyncio.sleep(0.01)
+    finally:
+        worker_task.cancel()
+        try:
+            await worker_task
+        except asyncio.CancelledError:
+            pass
+
+    spans = _by_name(exporter)
+    request_id = request_span.get_span_context().span_id
+    assert spans["run.queued"].parent.span_id == request_id
+    assert spans["run.execute"].parent.span_id == request_id
+
+
+@pytest.mark.asyncio
+async def test_agent_span_not_current_in_consumer(
+    mocker: MockerFixture, exporter: InMemorySpanExporter, caplog
+):
+    mocker.patch("agent_workflow_server.agents.load.ADAPTERS", [MockAdapter()])
+    load_agents(os.getenv("AGENTS_REF"), [os.getenv("AGENT_MANIFEST_PATH")])
+
+    stream = stream_run(
+        {"run_id": "run", "agent_id": MOCK_AGENT_ID, "input": MOCK_RUN_INPUT_INTERRUPT}
+    )
+    message = await anext(stream)
+    assert message.type == "interrupt"
+    assert not trace.get_current_span().get_span_context().is_valid
+
+    # Closed from another task, e.g. on cancellation or timeout
+    await asyncio.create_task(stream.aclose())
+    assert "agent.astream" in _by_name(exporter)
+    assert "Failed to detach context" not in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_process_executor_spans(monkeypatch, tmp_path):
+    path = tmp_path / "traces.jsonl"
+    monkeypatch.setenv("AGWS_TRACING_EXPORTER", "file")
+    monkeypatch.setenv("AGWS_TRACING_FILE", str(path))
+    executor = ProcessExecutor(
+        1,
+        os.getenv("AGENTS_REF"),
+        [os.getenv("AGENT_MANIFEST_PATH")],
+        initializer=use_mock_adapter,
+    )
+    await executor.start()
+    try:
+        run = {"run_id": "run", "agent_id": MOCK_AGENT_ID}
+        with tracing.span("run.execute") as run_span:
+            async for _ in executor.stream({**run, "input": MOCK_RUN_INPUT_INTERRUPT}):
+                pass
+        # Exported by the executor process once the run is done
+        async with asyncio.timeout(10):
+            while not path.exists() or "agent.astream" not in path.read_text():
+                await asyncio.sleep(0.05)
+    finally:
+        await executor.stop()
+
+    spans = {
+        span["name"]: span
+        for line in path.read_text().splitlines()
+        for span in json.loads(line)["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    }
+    astream = spans["agent.astream"]
+    assert astream["traceId"] == format(run_span.get_span_context().trace_id, "032x")
+    assert astream["parentSpanId"] == format(
+        run_span.get_span_context().span_id, "016x"
+    )
+    assert spans["validate interrupt"]["parentSpanId"] == astream["spanId"]
+
+
+@pytest.mark.asyncio
+async def test_webhook_span(exporter: InMemorySpanExporter):
+    headers = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        headers.append(request.headers)
+        return httpx.Response(200)
+
+    dispatcher = WebhookDispatcher(
+        WebhookPolicy(), transport=httpx.MockTransport(handle)
+    )
+    with tracing.span("run.execute") as run_span:
+        dispatcher.submit("run", "http://receiver/webhook", b"{}")
+    await asyncio.wait_for(dispatcher.flush(), 1)
+
+    deliver = _by_name(exporter)["webhook.deliver"]
+    assert deliver.parent.span_id == run_span.get_span_context().span_id
+    assert deliver.attributes["server.address"] == "receiver"
+    # The receiver gets the context of the delivery span
+    trace_id = format(deliver.context.trace_id, "032x")
+    span_id = format(deliver.context.span_id, "016x")
+    assert headers[0]["traceparent"].startswith(f"00-{trace_id}-{span_id}-")
+
+
+def test_middleware(exporter: InMemorySpanExporter):
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def get_item(item_id: str):
+        return {"item_id": item_id}
+
+    app.add_middleware(tracing.TracingMiddleware)
+    response = TestClient(app).get(
+        "/items/1", headers={"traceparent": f"00-{TRACE_ID}-00f067aa0ba902b7-01"}
+    )
+    assert response.status_code == 200
+
+    span = _by_name(exporter)["GET /items/{item_id}"]
+    assert format(span.context.trace_id, "032x") == TRACE_ID
+    assert format(span.parent.span_id, "016x") == "00f067aa0ba902b7"
+    assert span.attributes["http.route"] == "/items/{item_id}"
+    assert span.attributes["http.response.status_code"] == 200
+
+
+def test_otlp_file_exporter(tmp_path, exporter: InMemorySpanExporter):
+    with tracing.span("parent", {"run.id": "run"}):
+        tracing.record_span("child", 1.0, 2.5)
+    spans = exporter.get_finished_spans()
+
+    path = tmp_path / "traces.jsonl"
+    file_exporter = OTLPFileSpanExporter(str(path))
+    file_exporter.export(spans)
+    file_exporter.export(spans[:1])
+    file_exporter.shutdown()
+
+    lines = path.read_text().splitlines()
+    assert len(lines) == 2
+    exported = json.loads(lines[0])["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    child, parent = sorted(exported, key=lambda span: span["name"])
+    assert parent["traceId"] == format(spans[1].context.trace_id, "032x")
+    assert child["parentSpanId"] == parent["spanId"]
+    assert child["startTimeUnixNano"] == "1000000000"
+    assert child["endTimeUnixNano"] == "2500000000"
+    assert parent["attributes"] == [{"key": "run.id", "value": {"stringValue": "run"}}]
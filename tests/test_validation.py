@@ -3,14 +3,21 @@
 
 from unittest import mock
 
+import jsonschema
 import pytest
 
+from agent_workflow_server.agents.validators import (
+    SchemaValidator,
+    compile_agent_validators,
+)
+from agent_workflow_server.generated.models.agent_acp_spec import AgentACPSpec
 from agent_workflow_server.generated.models.run_create_stateful import RunCreateStateful
 from agent_workflow_server.generated.models.run_create_stateless import (
     RunCreateStateless,
 )
 from agent_workflow_server.services.validation import (
     InvalidFormatException,
+    validate_against_schema,
     validate_output,
     validate_run_create,
 )
@@ -467,3 +474,152 @@ def test_validate_run_create_complex_schema_additional_properties_fail():
         # Should fail validation
         with pytest.raises(InvalidFormatException):
             validate_run_create(run_create)
+
+
+MESSAGE_SCHEMA = {
+    "type": "object",
+    "required": ["message"],
+    "properties": {"message": {"type": "string", "minLength": 3}},
+}
+
+
+@pytest.mark.parametrize(
+    "instance", [{"message": "hello"}, {"message": "hi"}, {}, {"message": 1}, []]
+)
+def test_schema_validator_matches_jsonschema(instance):
+    validator = SchemaValidator(MESSAGE_SCHEMA)
+    try:
+        jsonschema.validate(instance, MESSAGE_SCHEMA)
+        expected = None
+    except jsonschema.ValidationError as e:
+        expected = str(e)
+
+    assert validator.is_valid(instance) == (expected is None)
+    if expected is None:
+        validate_against_schema(instance, validator)
+    else:
+        with pytest.raises(InvalidFormatException) as exc:
+            validate_against_schema(instance, validator, "Invalid")
+        assert str(exc.value) == f"Invalid: {expected}"
+
+
+def test_schema_validator_checks_schema_once():
+    with pytest.raises(jsonschema.SchemaError):
+        SchemaValidator({"type": "unknown"})
+
+    validator = SchemaValidator(MESSAGE_SCHEMA)
+    with mock.patch.object(
+        jsonschema.validators.validator_for(MESSAGE_SCHEMA), "check_schema"
+    ) as check_schema:
+        for _ in range(3):
+            validator.validate({"message": "hello"})
+    check_schema.assert_not_called()
+
+
+def test_compile_agent_validators():
+    specs = AgentACPSpec.model_validate(
+        {
+            "capabilities": {},
+            "input": MESSAGE_SCHEMA,
+            "output": MESSAGE_SCHEMA,
+            "config": {},
+            "interrupts": [
+                {
+                    "interrupt_type": "approval",
+                    "interrupt_payload": MESSAGE_SCHEMA,
+                    "resume_payload": {"type": "boolean"},
+                }
+            ],
+        }
+    )
+    validators = compile_agent_validators(specs)
+    assert validators.input.is_valid({"message": "hello"})
+    assert validators.config is None
+    [interrupt] = validators.interrupts
+    assert interrupt.interrupt_type == "approval"
+    assert interrupt.resume_payload.is_valid(True)
+    assert not interrupt.resume_payload.is_valid("yes")
+
+
+def _interrupt(interrupt_type: str, payload_schema: dict) -> dict:
+    return {
+        "interrupt_type": interrupt_type,
+        "interrupt_payload": payload_schema,
+        "resume_payload": {"type": "object"},
+    }
+
+
+def _kind_schema(kind: str) -> dict:
+    return {
+        "type": "object",
+        "required": ["kind", "question"],
+        "properties": {"kind": {"const": kind}, "question": {"type": "string"}},
+    }
+
+
+INTERRUPT_SPECS = AgentACPSpec.model_validate(
+    {
+        "capabilities": {},
+        "input": {},
+        "output": {},
+        "config": {},
+        "interrupts": [
+            *(_interrupt(f"step_{i}", _kind_schema(f"step_{i}")) for i in range(40)),
+            # "required" only applies to objects: any other payload is valid
+            _interrupt(
+                "untyped",
+                {"required": ["kind"], "properties": {"kind": {"const": "step_3"}}},
+            ),
+            _interrupt(
+                "approval",
+                {
+                    "$ref": "#/$defs/Approval",
+                    "$defs": {
+                        "Approval": {
+                            "type": "object",
+                            "required": ["approve"],
+                            "properties": {"approve": {"type": "boolean"}},
+                            "additionalProperties": False,
+                        }
+                    },
+                },
+            ),
+            _interrupt("anything", {}),
+        ],
+    }
+)
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"kind": "step_7", "question": "?"},
+        {"kind": "step_7", "question": 1},
+        {"kind": "step_41", "question": "?"},
+        {"approve": True},
+        {"approve": True, "extra": 1},
+        ["not", "an", "object"],
+        "text",
+    ],
+)
+def test_interrupt_classifier_matches_first_valid_schema(payload):
+    validators = compile_agent_validators(INTERRUPT_SPECS)
+    expected = next(
+        i.interrupt_type
+        for i in validators.interrupts
+        if jsonschema.validators.validator_for(i.interrupt_payload.schema)(
+            i.interrupt_payload.schema
+        ).is_valid(payload)
+    )
+    assert validators.interrupt_classifier.classify(payload) == expected
+
+
+def test_interrupt_classifier_validates_only_the_candidates():
+    classifier = compile_agent_validators(INTERRUPT_SPECS).interrupt_classifier
+    assert classifier.discriminator == "kind"
+    with mock.patch.object(
+        SchemaValidator, "is_valid", autospec=True, side_effect=lambda v, i: True
+    ) as is_valid:
+        assert classifier.classify({"kind": "step_30", "question": "?"}) == "step_30"
+        assert classifier.classify({"approve": False}) == "approval"
+    assert is_valid.call_count == 2
@@ -0,0 +1,158 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from agent_workflow_server.services.retry import RetryPolicy
+from agent_workflow_server.services.webhooks import (
+    WebhookDispatcher,
+    WebhookPolicy,
+    load_webhook_policy,
+)
+
+URL = "http://receiver/webhook"
+FAST_RETRY = RetryPolicy(max_attempts=3, base_delay=0.001, max_delay=0.001, jitter=0)
+
+
+class Receiver:
+    """Records the requests and answers with the given status codes"""
+
+    def __init__(self, statuses=(), gate: asyncio.Event = None):
+        self.statuses = list(statuses)
+        self.gate = gate
+        self.payloads = []
+        self.concurrent = 0
+        self.max_concurrent = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.concurrent += 1
+        self.max_concurrent = max(self.max_concurrent, self.concurrent)
+        try:
+            if self.gate is not None:
+                await self.gate.wait()
+            else:
+                await asyncio.sleep(0.01)
+            self.payloads.append(json.loads(request.content))
+            return httpx.Response(self.statuses.pop(0) if self.statuses else 200)
+        finally:
+            self.concurrent -= 1
+
+
+def _dispatcher(receiver: Receiver, **policy) -> WebhookDispatcher:
+    return WebhookDispatcher(
+        WebhookPolicy(**{"retry": FAST_RETRY, **policy}),
+        transport=httpx.MockTransport(receiver.handle),
+    )
+
+
+def _status(run_id: str, status: str) -> bytes:
+    return json.dumps({"run_id": run_id, "status": status}).encode()
+
+
+def test_load_webhook_policy(monkeypatch):
+    monkeypatch.setenv("AGWS_WEBHOOK_RETRY_POLICY", '{"max_attempts": 2}')
+    policy = load_webhook_policy()
+    assert policy.retry.max_attempts == 2
+    assert policy.max_per_host == WebhookPolicy().max_per_host
+
+    monkeypatch.setenv("AGWS_WEBHOOK_RETRY_POLICY", '{"attempts": 2}')
+    with pytest.raises(ValueError):
+        load_webhook_policy()
+
+
+@pytest.mark.asyncio
+async def test_status_changes_of_a_run_are_coalesced():
+    gate = asyncio.Event()
+    receiver = Receiver(gate=gate)
+    dispatcher = _dispatcher(receiver)
+
+    # Submitting does not wait for the receiver
+    dispatcher.submit("run", URL, _status("run", "pending"))
+    await asyncio.sleep(0.01)
+    dispatcher.submit("run", URL, _status("run", "interrupted"))
+    dispatcher.submit("run", URL, _status("run", "success"))
+    gate.set()
+    await asyncio.wait_for(dispatcher.flush(), 1)
+
+    assert [p["status"] for p in receiver.payloads] == ["pending", "success"]
+    stats = dispatcher.to_dict()
+    assert stats["delivered"] == 2
+    assert stats["coalesced"] == 1
+    assert stats["in_flight"] == stats["pending"] == 0
+
+
+@pytest.mark.asyncio
+async def test_failed_deliveries_are_retried():
+    receiver = Receiver(statuses=[503, 429])
+    dispatcher = _dispatcher(receiver)
+    dispatcher.submit("run", URL, _status("run", "success"))
+    await asyncio.wait_for(dispatcher.flush(), 1)
+    assert len(receiver.payloads) == 3
+    assert dispatcher.delivered == 1
+    assert dispatcher.retried == 2
+
+    # Not retried
+    receiver = Receiver(statuses=[400])
+    dispatcher = _dispatcher(receiver)
+    dispatcher.submit("run", URL, _status("run", "success"))
+    await asyncio.wait_for(dispatcher.flush(), 1)
+    assert dispatcher.failed == 1
+    assert dispatcher.retried == 0
+
+    receiver = Receiver(statuses=[500] * 3)
+    dispatcher = _dispatcher(receiver)
+    dispatcher.submit("run", URL, _status("run", "success"))
+    await asyncio.wait_for(dispatcher.flush(), 1)
+    assert len(receiver.payloads) == 3
+    assert dispatcher.failed == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_per_host_and_queue_size():
+    receiver = Receiver()
+    dispatcher = _dispatcher(receiver, max_per_host=2, queue_size=5)
+    for i in range(4):
+        dispatcher.submit(f"run-{i}", URL, _status(f"run-{i}", "success"))
+    dispatcher.submit("other", "http://other/webhook", _status("other", "success"))
+    dispatcher.submit("run-4", URL, _status("run-4", "success"))
+    await asyncio.wait_for(dispatcher.flush(), 1)
+
+    assert receiver.max_concurrent == 3
+    assert dispatcher.delivered == 5
+    assert dispatcher.dropped == 1
+
+
+def test_client_closed_when_bound_to_another_loop():
+    dispatcher = _dispatcher(Receiver())
+
+    async def deliver():
+        dispatcher.submit("run", URL, _status("run", "success"))
+        await dispatcher.flush()
+        if dispatcher._closing is not None:
+            await dispatcher._closing
+        return dispatcher._client
+
+    first = asyncio.run(deliver())
+    second = asyncio.run(deliver())
+    assert second is not first
+    assert first.is_closed
+    assert not second.is_closed
+
+
+@pytest.mark.asyncio
+async def test_aclose():
+    gate = asyncio.Event()
+    dispatcher = _dispatcher(Receiver(gate=gate), timeout=0.05)
+    dispatcher.submit("run", URL, _status("run", "pending"))
+    dispatcher.submit("run", URL, _status("run", "success"))
+    client = dispatcher._client
+
+    # The receiver never answers: the delivery is cancelled after the timeout
+    await asyncio.wait_for(dispatcher.aclose(), 1)
+    assert client.is_closed
+    assert dispatcher.to_dict()["in_flight"] == dispatcher.to_dict()["pending"] == 0
+    assert dispatcher.delivered == 0
@@ -0,0 +1,176 @@
+# Copyright AGNTCY Contributors (https://github.com/agntcy)
+# SPDX-License-Identifier: Apache-2.0
+
+import asyncio
+import json
+from datetime import datetime
+from uuid import uuid4
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from pytest_mock import MockerFixture
+from starlette.websockets import WebSocketDisconnect
+
+from agent_workflow_server.apis.websocket import (
+    FRAME_CONTROL,
+    FRAME_EVENT,
+    RunStreamsConnection,
+    decode_ws_frame,
+    router,
+)
+from agent_workflow_server.services.message import Message
+from agent_workflow_server.services.runs import Runs, stream_manager
+from agent_workflow_server.storage.storage import DB
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.frames = []
+
+    async def send_bytes(self, data: bytes):
+        self.frames.append(decode_ws_frame(bytes(data)))
+
+
+def _create_run(thread_id=None) -> str:
+    run_id = str(uuid4())
+    DB.create_run(
+        {
+            "run_id": run_id,
+            "agent_id": str(uuid4()),
+            "thread_id": thread_id or str(uuid4()),
+            "input": {},
+            "config": None,
+            "metadata": None,
+            "webhook": None,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "status": "pending",
+        }
+    )
+    return run_id
+
+
+def _events(websocket: FakeWebSocket) -> list:
+    return [
+        (run_id, seq, json.loads(payload)["values"])
+        for kind, run_id, seq, payload in websocket.frames
+        if kind == FRAME_EVENT
+    ]
+
+
+@pytest.mark.asyncio
+async def test_multiplexed_runs_with_credit():
+    websocket = FakeWebSocket()
+    connection = RunStreamsConnection(websocket, initial_credit=1, max_subscriptions=10)
+    first, second = _create_run(), _create_run()
+    await connection.handle({"op": "subscribe", "run_id": first})
+    await connection.handle({"op": "subscribe", "run_id": second})
+    await asyncio.sleep(0.01)
+
+    await Runs.Stream.publish(first, Message(type="message", data={"n": 1}))
+    await Runs.Stream.publish(second, Message(type="message", data={"n": 2}))
+    await asyncio.sleep(0.01)
+    # Only one event sent until the client grants more credit
+    assert len(_events(websocket)) == 1
+
+    await connection.handle({"op": "credit", "n": 5})
+    await Runs.Stream.publish(first, Message(type="control", data="done"))
+    await asyncio.sleep(0.01)
+    assert sorted(_events(websocket)) == sorted(
+        [(first, 1, {"n": 1}), (second, 1, {"n": 2})]
+    )
+    assert (FRAME_CONTROL, first, 0, b'{"type":"done"}') in websocket.frames
+    assert list(connection.runs) == [second]
+
+    await connection.close()
+    assert not connection.runs
+
+
+@pytest.mark.asyncio
+async def test_thread_subscription_follows_new_runs():
+    websocket = FakeWebSocket()
+    connection = RunStreamsConnection(
+        websocket, initial_credit=10, max_subscriptions=10
+    )
+    thread_id = str(uuid4())
+    DB.create_thread(
+        {
+            "thread_id": thread_id,
+            "created_at": datetime.now(),
+            "updated_at": datetime.now(),
+            "metadata": None,
+            "status": "idle",
+        }
+    )
+    await connection.handle({"op": "subscribe", "thread_id": thread_id})
+
+    run_id = _create_run(thread_id)
+    stream_manager.announce_run(thread_id, run_id)
+    await asyncio.sleep(0.01)
+    assert connection._run_threads == {run_id: thread_id}
+
+    await Runs.Stream.publish(run_id, Message(type="message", data={"n": 1}))
+    await asyncio.sleep(0.01)
+    assert _events(websocket) == [(run_id, 1, {"n": 1})]
+
+    await connection.handle({"op": "unsubscribe", "thread_id": thread_id})
+    await asyncio.sleep(0.01)
+    assert not connection.runs
+    assert thread_id not in stream_manager.thread_watchers
+
+
+def test_websocket_endpoint(mocker: MockerFixture):
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+
+    mocker.patch("agent_workflow_server.apis.authentication.API_KEY", "secret")
+    with pytest.raises(WebSocketDisconnect) as exc:
+        with client.websocket_connect("/ws") as websocket:
+            websocket.receive_bytes()
+    assert exc.value.code == 1008
+
+    with client.websocket_connect("/ws", headers={"x-api-key": "secret"}) as websocket:
+        websocket.send_text(json.dumps({"op": "subscribe", "run_id": "unknown"}))
+        kind, run_id, _, payload = decode_ws_frame(websocket.receive_bytes())
+        assert (kind, run_id, json.loads(payload)["type"]) == (
+            FRAME_CONTROL,
+            "unknown",
+            "subscribed",
+        )
+        kind, run_id, _, payload = decode_ws_frame(websocket.receive_bytes())
+        assert (kind, run_id) == (FRAME_CONTROL, "unknown")
+        assert json.loads(payload) == {
+            "type": "error",
+            "detail": "Run unknown not found",
+        }
+
+        websocket.send_bytes(b"[]")
+        _, _, _, payload = decode_ws_frame(websocket.receive_bytes())
+        assert json.loads(payload)["type"] == "error"
+
+
+def test_websocket_invalid_messages(mocker: MockerFixture):
+    app = FastAPI()
+    app.include_router(router)
+    client = TestClient(app)
+    mocker.patch("agent_workflow_server.apis.authentication.API_KEY", "secret")
+
+    with client.websocket_connect("/ws", headers={"x-api-key": "secret"}) as websocket:
+        # Neither bytes nor text
+        websocket.send({"type": "websocket.receive"})
+        _, _, _, payload = decode_ws_frame(websocket.receive_bytes())
+        assert json.loads(payload)["type"] == "error"
+
+        for op in ("subscribe", "unsubscribe"):
+            websocket.send_text(json.dumps({"op": op, "run_id": "x" * 0x10000}))
+            kind, run_id, _, payload = decode_ws_frame(websocket.receive_bytes())
+            assert (kind, run_id) == (FRAME_CONTROL, "")
+            assert "longer than" in json.loads(payload)["detail"]
+
+        # Still usable
+        websocket.send_text(json.dumps({"op": "credit", "n": 1}))
+        websocket.send_bytes(b"{")
+        _, _, _, payload = decode_ws_frame(websocket.receive_bytes())
+        assert json.loads(payload)["type"] == "error"